@@ -8,14 +8,21 @@ import msgq
 import os
 import capnp
 import time
+import weakref
+import numpy as np
 
-from typing import Optional, List, Union, Dict, Deque
+from typing import Optional, List, Union, Dict, Deque, Iterator, Tuple
 from collections import deque
+from collections.abc import Mapping
 
 from cereal import log
 from cereal.services import SERVICE_LIST
 
 NO_TRAVERSAL_LIMIT = 2**64-1
+# published messages record the logMonoTimes of the SubMaster inputs they were derived from
+TRACE_LINEAGE = bool(int(os.getenv("TRACE_LINEAGE", "0")))
+# first segment of a pooled builder before its service has been sent once, same as capnp's default
+DEFAULT_ARENA_WORDS = 1024
 
 
 def reset_context():
@@ -27,13 +34,20 @@ def log_from_bytes(dat: bytes, struct: capnp.lib.capnp._StructModule = log.Event
     return msg
 
 
-def new_message(service: Optional[str], size: Optional[int] = None, **kwargs) -> capnp.lib.capnp._DynamicStructBuilder:
+def new_message(service: Optional[str], size: Optional[int] = None, arena_words: Optional[int] = None,
+                **kwargs) -> capnp.lib.capnp._DynamicStructBuilder:
   args = {
     'valid': False,
     'logMonoTime': int(time.monotonic() * 1e9),
     **kwargs
   }
-  dat = log.Event.new_message(**args)
+  if arena_words is None:
+    dat = log.Event.new_message(**args)
+  else:
+    # the whole message fits in one preallocated segment, capnp doesn't grow the arena while it's being built
+    dat = capnp._MallocMessageBuilder(arena_words).init_root(log.Event)
+    for k, v in args.items():
+      setattr(dat, k, v)
   if service is not None:
     if size is None:
       dat.init(service)
@@ -92,6 +106,19 @@ def recv_one_retry(sock: SubSocket) -> capnp.lib.capnp._DynamicStructReader:
       return log_from_bytes(dat)
 
 
+_lineage_sources: "weakref.WeakSet[SubMaster]" = weakref.WeakSet()
+
+
+def get_lineage() -> Dict[str, int]:
+  """logMonoTime of the latest message of each service received by the SubMasters of this process"""
+  inputs: Dict[str, int] = {}
+  for sm in list(_lineage_sources):
+    for s, t in zip(sm.services, sm._log_mono_time.tolist(), strict=True):
+      if t > inputs.get(s, 0):
+        inputs[s] = t
+  return inputs
+
+
 class FrequencyTracker:
   def __init__(self, service_freq: float, update_freq: float, is_poll: bool):
     freq = max(min(service_freq, update_freq), 1.)
@@ -144,22 +171,66 @@ class FrequencyTracker:
     return self.min_freq <= avg_freq_recent <= self.max_freq
 
 
+class ServiceArray(Mapping):
+  """Mapping view of one per-service state array of a SubMaster, values are returned as Python scalars"""
+  __slots__ = ('index', 'arr')
+
+  def __init__(self, index: Dict[str, int], arr: np.ndarray):
+    self.index = index
+    self.arr = arr
+
+  def __getitem__(self, s: str):
+    return self.arr.item(self.index[s])
+
+  def __setitem__(self, s: str, v) -> None:
+    self.arr[self.index[s]] = v
+
+  def __iter__(self) -> Iterator[str]:
+    return iter(self.index)
+
+  def __len__(self) -> int:
+    return len(self.index)
+
+  def __repr__(self) -> str:
+    return repr(dict(zip(self.index, self.arr.tolist(), strict=True)))
+
+
 class SubMaster:
   def __init__(self, services: List[str], poll: Optional[str] = None,
                ignore_alive: Optional[List[str]] = None, ignore_avg_freq: Optional[List[str]] = None,
                ignore_valid: Optional[List[str]] = None, addr: str = "127.0.0.1", frequency: Optional[float] = None):
     self.frame = -1
     self.services = services
-    self.seen = {s: False for s in services}
-    self.updated = {s: False for s in services}
-    self.recv_time = {s: 0. for s in services}
-    self.recv_frame = {s: 0 for s in services}
-    self.alive = {s: False for s in services}
-    self.freq_ok = {s: False for s in services}
+    self.index = {s: i for i, s in enumerate(services)}
+
+    # per-service state lives in preallocated arrays, exposed through mapping views
+    n = len(services)
+    self._seen = np.zeros(n, dtype=bool)
+    self._updated = np.zeros(n, dtype=bool)
+    self._recv_time = np.zeros(n, dtype=np.float64)
+    self._recv_frame = np.zeros(n, dtype=np.int64)
+    self._alive = np.zeros(n, dtype=bool)
+    self._freq_ok = np.zeros(n, dtype=bool)
+    self._valid = np.zeros(n, dtype=bool)
+    self._log_mono_time = np.zeros(n, dtype=np.uint64)
+    self.seen = ServiceArray(self.index, self._seen)
+    self.updated = ServiceArray(self.index, self._updated)
+    self.recv_time = ServiceArray(self.index, self._recv_time)
+    self.recv_frame = ServiceArray(self.index, self._recv_frame)
+    self.alive = ServiceArray(self.index, self._alive)
+    self.freq_ok = ServiceArray(self.index, self._freq_ok)
+    self.valid = ServiceArray(self.index, self._valid)
+    self.logMonoTime = ServiceArray(self.index, self._log_mono_time)
     self.sock = {}
     self.data = {}
-    self.valid = {}
-    self.logMonoTime = {}
+
+    # alive if delay is within 10x the expected frequency, services without a frequency are always alive and freq_ok
+    freqs = np.array([SERVICE_LIST[s].frequency for s in services], dtype=np.float64)
+    self._no_freq = freqs <= 1e-5
+    self._alive_window = np.divide(10., freqs, out=np.full(n, np.inf), where=~self._no_freq)
+    self._dt = np.zeros(n, dtype=np.float64)
+    self._failed = np.zeros(n, dtype=bool)
+    self._check_masks: Dict[Tuple, np.ndarray] = {}
 
     self.freq_tracker: Dict[str, FrequencyTracker] = {}
     self.poller = Poller()
@@ -171,6 +242,8 @@ class SubMaster:
     self.ignore_valid = [] if ignore_valid is None else ignore_valid
 
     self.simulation = bool(int(os.getenv("SIMULATION", "0")))
+    if TRACE_LINEAGE:
+      _lineage_sources.add(self)
 
     # if freq and poll aren't specified, assume the max to be conservative
     assert frequency is None or poll is None, "Do not specify 'frequency' - frequency of the polled service will be used."
@@ -186,8 +259,6 @@ class SubMaster:
         data = new_message(s, 0) # lists
 
       self.data[s] = getattr(data.as_reader(), s)
-      self.logMonoTime[s] = 0
-      self.valid[s] = False
       self.freq_tracker[s] = FrequencyTracker(SERVICE_LIST[s].frequency, self.update_freq, s == poll)
 
   def __getitem__(self, s: str) -> capnp.lib.capnp._DynamicStructReader:
@@ -208,39 +279,64 @@ class SubMaster:
 
   def update_msgs(self, cur_time: float, msgs: List[capnp.lib.capnp._DynamicStructReader]) -> None:
     self.frame += 1
-    self.updated = dict.fromkeys(self.services, False)
+    self._updated.fill(False)
     for msg in msgs:
       if msg is None:
         continue
 
       s = msg.which()
-      self.seen[s] = True
-      self.updated[s] = True
-
-      self.freq_tracker[s].record_recv_time(cur_time)
-      self.recv_time[s] = cur_time
-      self.recv_frame[s] = self.frame
+      i = self.index[s]
+      self._seen[i] = True
+      self._updated[i] = True
+
+      tracker = self.freq_tracker[s]
+      tracker.record_recv_time(cur_time)
+      self._recv_time[i] = cur_time
+      self._recv_frame[i] = self.frame
       self.data[s] = getattr(msg, s)
-      self.logMonoTime[s] = msg.logMonoTime
-      self.valid[s] = msg.valid
-
-    for s in self.services:
-      if SERVICE_LIST[s].frequency > 1e-5 and not self.simulation:
-        # alive if delay is within 10x the expected frequency
-        self.alive[s] = (cur_time - self.recv_time[s]) < (10. / SERVICE_LIST[s].frequency)
-        self.freq_ok[s] = self.freq_tracker[s].valid
-      else:
-        self.freq_ok[s] = True
-        self.alive[s] = self.seen[s] if self.simulation else True
+      self._log_mono_time[i] = msg.logMonoTime
+      self._valid[i] = msg.valid
+
+      # the average frequency only changes when a message is received
+      if not self.simulation:
+        self._freq_ok[i] = tracker.valid
+
+    if self.simulation:
+      np.copyto(self._alive, self._seen)
+      self._freq_ok.fill(True)
+    else:
+      np.subtract(cur_time, self._recv_time, out=self._dt)
+      np.less(self._dt, self._alive_window, out=self._alive)
+      np.logical_or(self._freq_ok, self._no_freq, out=self._freq_ok)
+
+  def _check_mask(self, check: str, service_list: Optional[List[str]]) -> np.ndarray:
+    # ignore lists can still be appended to after init
+    key = (check, tuple(service_list or ()), tuple(self.ignore_alive), tuple(self.ignore_average_freq), tuple(self.ignore_valid))
+    mask = self._check_masks.get(key)
+    if mask is None:
+      mask = np.zeros(len(self.services), dtype=bool)
+      for s in (service_list or self.services):
+        if check == "alive":
+          mask[self.index[s]] = s not in self.ignore_alive
+        elif check == "freq_ok":
+          mask[self.index[s]] = self._check_avg_freq(s)
+        else:
+          mask[self.index[s]] = s not in self.ignore_valid
+      self._check_masks[key] = mask
+    return mask
+
+  def _all(self, arr: np.ndarray, mask: np.ndarray) -> bool:
+    # a check fails where the service is checked but its state is False
+    return not np.count_nonzero(np.greater(mask, arr, out=self._failed))
 
   def all_alive(self, service_list: Optional[List[str]] = None) -> bool:
-    return all(self.alive[s] for s in (service_list or self.services) if s not in self.ignore_alive)
+    return self._all(self._alive, self._check_mask("alive", service_list))
 
   def all_freq_ok(self, service_list: Optional[List[str]] = None) -> bool:
-    return all(self.freq_ok[s] for s in (service_list or self.services) if self._check_avg_freq(s))
+    return self._all(self._freq_ok, self._check_mask("freq_ok", service_list))
 
   def all_valid(self, service_list: Optional[List[str]] = None) -> bool:
-    return all(self.valid[s] for s in (service_list or self.services) if s not in self.ignore_valid)
+    return self._all(self._valid, self._check_mask("valid", service_list))
 
   def all_checks(self, service_list: Optional[List[str]] = None) -> bool:
     return self.all_alive(service_list) and self.all_freq_ok(service_list) and self.all_valid(service_list)
@@ -249,13 +345,28 @@ class SubMaster:
 class PubMaster:
   def __init__(self, services: List[str]):
     self.sock = {}
+    self.arena_words: Dict[str, int] = {}
     for s in services:
       self.sock[s] = pub_sock(s)
 
-  def send(self, s: str, dat: Union[bytes, capnp.lib.capnp._DynamicStructBuilder]) -> None:
+  def new_message(self, s: str, size: Optional[int] = None, **kwargs) -> capnp.lib.capnp._DynamicStructBuilder:
+    """
+    Same as messaging.new_message, but the builder's arena is sized from the largest message sent on this service so far.
+    High-rate publishers build every message in a single segment allocation, and serialize it without joining segments.
+    """
+    return new_message(s, size, arena_words=self.arena_words.get(s, DEFAULT_ARENA_WORDS), **kwargs)
+
+  def serialize(self, s: str, dat: Union[bytes, capnp.lib.capnp._DynamicStructBuilder]) -> bytes:
     if not isinstance(dat, bytes):
+      if TRACE_LINEAGE:
+        dat.lineage = [{'service': k, 'logMonoTime': t} for k, t in get_lineage().items()]
       dat = dat.to_bytes()
-    self.sock[s].send(dat)
+      if len(dat) > self.arena_words.get(s, 0) * 8:
+        self.arena_words[s] = len(dat) // 8
+    return dat
+
+  def send(self, s: str, dat: Union[bytes, capnp.lib.capnp._DynamicStructBuilder]) -> None:
+    self.sock[s].send(self.serialize(s, dat))
 
   def wait_for_readers_to_update(self, s: str, timeout: int, dt: float = 0.05) -> bool:
     for _ in range(int(timeout*(1./dt))):
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+import argparse
+import time
+from typing import Callable, Dict, List
+
+import capnp
+
+import cereal.messaging as messaging
+from cereal import log
+
+# the 100Hz publishers of controlsd, card and selfdrived, and a large 20Hz one
+SERVICES = ['controlsState', 'carControl', 'carState', 'selfdriveState', 'modelV2']
+
+
+class NullPubMaster(messaging.PubMaster):
+  """Serializes like PubMaster, without sockets"""
+  def __init__(self, services: List[str]):
+    self.arena_words: Dict[str, int] = {}
+
+  def send(self, s: str, dat) -> None:
+    self.serialize(s, dat)
+
+
+def get_template(s: str) -> capnp.lib.capnp._DynamicStructReader:
+  """A filled in message, about as large as the ones seen onroad"""
+  msg = messaging.new_message(s)
+  if s == 'modelV2':
+    for field in ('position', 'velocity', 'acceleration', 'orientation', 'orientationRate'):
+      xyzt = getattr(msg.modelV2, field)
+      for k in ('x', 'y', 'z', 't', 'xStd', 'yStd', 'zStd'):
+        setattr(xyzt, k, [0.1] * 33)
+    msg.modelV2.laneLines = [{'x': [0.1] * 33, 'y': [0.1] * 33, 'z': [0.1] * 33, 't': [0.1] * 33} for _ in range(4)]
+    msg.modelV2.roadEdges = [{'x': [0.1] * 33, 'y': [0.1] * 33, 'z': [0.1] * 33, 't': [0.1] * 33} for _ in range(2)]
+  elif s == 'selfdriveState':
+    msg.selfdriveState.alertText1 = "TAKE CONTROL IMMEDIATELY"
+    msg.selfdriveState.alertText2 = "Cruise Fault: Restart the Car"
+  return getattr(msg.as_reader(), s)
+
+
+def run(new_message: Callable[[str], capnp.lib.capnp._DynamicStructBuilder], pm: messaging.PubMaster, s: str,
+        template: capnp.lib.capnp._DynamicStructReader, n: int) -> Dict[str, float]:
+  """Time per message in us to build and serialize, and the number of arena segments capnp allocated for it"""
+  dat = new_message(s)
+  setattr(dat, s, template)
+  segments = len(dat.to_segments())
+
+  st = time.perf_counter()
+  for _ in range(n):
+    dat = new_message(s)
+    dat.valid = True
+    setattr(dat, s, template)
+    pm.send(s, dat)
+  return {"time": (time.perf_counter() - st) / n * 1e6, "segments": segments}
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Per-message cost of fresh and pooled builders, build and serialize")
+  parser.add_argument("--count", type=int, default=20000)
+  args = parser.parse_args()
+
+  for s in SERVICES:
+    template = get_template(s)
+    pm = NullPubMaster(SERVICES)
+    # the fresh builders run first, so the pooled arena is already sized
+    res = {
+      "new_message": run(messaging.new_message, pm, s, template, args.count),
+      "pm.new_message": run(pm.new_message, pm, s, template, args.count),
+    }
+    size = len(log.Event.new_message(**{s: template}).to_bytes())
+    print(f"{s} ({size} bytes)")
+    for name, r in res.items():
+      print(f"  {name:<16} {r['time']:.2f} us, {r['segments']} segments")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import argparse
+import time
+from typing import Dict, List
+
+import capnp
+
+import cereal.messaging as messaging
+from cereal.services import SERVICE_LIST
+
+# controlsd's SubMaster
+SERVICES = ['liveParameters', 'liveTorqueParameters', 'modelV2', 'selfdriveState', 'liveCalibration', 'livePose',
+            'longitudinalPlan', 'carState', 'carOutput', 'driverMonitoringState', 'onroadEvents', 'driverAssistance']
+POLL = 'selfdriveState'
+UPDATE_FREQ = 100.
+
+
+def get_cycle_msgs(services: List[str], n_cycles: int) -> List[List[capnp.lib.capnp._DynamicStructReader]]:
+  """Messages received in each update, every service at its own frequency"""
+  templates = {}
+  for s in services:
+    try:
+      msg = messaging.new_message(s, valid=True)
+    except capnp.lib.capnp.KjException:
+      msg = messaging.new_message(s, 0, valid=True)
+    templates[s] = msg.as_reader()
+
+  cycle_msgs = []
+  for i in range(n_cycles):
+    cycle_msgs.append([templates[s] for s in services if SERVICE_LIST[s].frequency > 0 and
+                       i % max(1, round(UPDATE_FREQ / SERVICE_LIST[s].frequency)) == 0])
+  return cycle_msgs
+
+
+def run(sm: messaging.SubMaster, cycle_msgs: List[List[capnp.lib.capnp._DynamicStructReader]]) -> Dict[str, float]:
+  """Time per cycle in us of the update and of what a daemon typically reads afterwards"""
+  cur_time = 1.
+  update_time, checks_time = 0., 0.
+  for msgs in cycle_msgs:
+    cur_time += 1. / UPDATE_FREQ
+
+    st = time.perf_counter()
+    sm.update_msgs(cur_time, msgs)
+    update_time += time.perf_counter() - st
+
+    st = time.perf_counter()
+    sm.all_checks()
+    sm.all_checks(['carState', 'modelV2'])
+    sum(sm.updated[s] for s in sm.services)
+    checks_time += time.perf_counter() - st
+
+  return {"update": update_time / len(cycle_msgs) * 1e6, "checks": checks_time / len(cycle_msgs) * 1e6}
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Per-cycle cost of SubMaster with controlsd's services")
+  parser.add_argument("--cycles", type=int, default=100000)
+  args = parser.parse_args()
+
+  cycle_msgs = get_cycle_msgs(SERVICES, args.cycles)
+  res = run(messaging.SubMaster(SERVICES, poll=POLL), cycle_msgs)
+  print(f"SubMaster update: {res['update']:.2f} us, checks: {res['checks']:.2f} us")
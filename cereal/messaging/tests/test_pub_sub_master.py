@@ -93,6 +93,65 @@ class TestSubMaster:
         else:
           assert not sm._check_avg_freq(service)
 
+  def test_update_msgs(self):
+    # carState at 100 Hz, deviceState at 2 Hz and userFlag without a frequency, updated at 100 Hz
+    services = ["carState", "deviceState", "userFlag"]
+    sm = messaging.SubMaster(services, ignore_valid=["userFlag"])
+
+    def update(k, socks, valid=True):
+      sm.update_msgs(1. + 0.01 * k, [messaging.new_message(s, valid=valid).as_reader() for s in socks])
+
+    update(0, ["carState", "deviceState"])
+    assert sm.frame == 0
+    assert dict(sm.seen) == dict(sm.updated) == {"carState": True, "deviceState": True, "userFlag": False}
+    assert dict(sm.recv_time) == {"carState": 1., "deviceState": 1., "userFlag": 0.}
+    assert dict(sm.recv_frame) == {"carState": 0, "deviceState": 0, "userFlag": 0}
+    assert type(sm.recv_frame["carState"]) is int and type(sm.alive["carState"]) is bool
+    # services without a frequency are always alive and freq_ok, the others need a few messages to tell the frequency
+    assert dict(sm.alive) == {"carState": True, "deviceState": True, "userFlag": True}
+    assert dict(sm.freq_ok) == {"carState": False, "deviceState": False, "userFlag": True}
+    assert dict(sm.valid) == {"carState": True, "deviceState": True, "userFlag": False}
+    assert sm.all_alive() and sm.all_valid() and not sm.all_freq_ok() and not sm.all_checks()
+
+    for k in range(1, 11):
+      update(k, ["carState", "userFlag"] if k == 3 else ["carState"])
+    assert dict(sm.updated) == {"carState": True, "deviceState": False, "userFlag": False}
+    assert dict(sm.recv_frame) == {"carState": 10, "deviceState": 0, "userFlag": 3}
+    assert dict(sm.freq_ok) == {"carState": True, "deviceState": False, "userFlag": True}
+    assert sm.all_freq_ok(["carState", "userFlag"]) and not sm.all_freq_ok()
+
+    for k in range(11, 51):
+      update(k, ["carState", "deviceState"] if k == 50 else ["carState"])
+    assert sm.frame == 50
+    assert sm.freq_ok["deviceState"]
+    assert sm.all_checks()
+
+    # 0.2 s without carState, more than 10 of its periods
+    update(70, [])
+    assert not any(sm.updated.values())
+    assert dict(sm.alive) == {"carState": False, "deviceState": True, "userFlag": True}
+    assert not sm.all_alive() and sm.all_alive(["deviceState", "userFlag"])
+    assert not sm.all_checks()
+
+    update(71, ["carState"], valid=False)
+    assert sm.alive["carState"] and not sm.valid["carState"]
+    assert not sm.all_valid() and sm.all_valid(["deviceState"])
+    # ignore lists can change after init
+    sm.ignore_valid.append("carState")
+    assert sm.all_valid()
+
+  def test_update_msgs_simulation(self, monkeypatch):
+    # in simulation a service is alive once it has been seen, and all frequencies are ok
+    monkeypatch.setenv("SIMULATION", "1")
+    sm = messaging.SubMaster(["carState", "userFlag"])
+    sm.update_msgs(1., [])
+    assert dict(sm.alive) == {"carState": False, "userFlag": False}
+    assert dict(sm.freq_ok) == {"carState": True, "userFlag": True}
+
+    sm.update_msgs(100., [messaging.new_message("carState", valid=True).as_reader()])
+    assert dict(sm.alive) == {"carState": True, "userFlag": False}
+    assert sm.all_checks(["carState"]) and not sm.all_alive()
+
   def test_alive(self):
     pass
 
@@ -154,3 +213,44 @@ class TestPubMaster:
           msg.clear_write_flag()
           msg = msg.to_bytes()
         assert msg == recvd, i
+
+  def test_pooled_builders(self, monkeypatch):
+    sock = "carState"
+    pm = messaging.PubMaster([sock])
+    sub_sock = messaging.sub_sock(sock, conflate=True, timeout=1000)
+    zmq_sleep()
+
+    arenas = []
+    malloc_message_builder = messaging.capnp._MallocMessageBuilder
+    def record_arena(first_segment_words):
+      arenas.append(first_segment_words)
+      return malloc_message_builder(first_segment_words)
+    monkeypatch.setattr(messaging.capnp, "_MallocMessageBuilder", record_arena)
+
+    sizes = []
+    for i in range(10):
+      msg = pm.new_message(sock, valid=True)
+      expected = messaging.new_message(sock, valid=True, logMonoTime=msg.logMonoTime)
+      for m in (msg, expected):
+        m.carState.vEgo = float(i)
+        m.carState.buttonEvents = [{'pressed': True}] * i
+      pm.send(sock, msg)
+
+      # the arena is sized from the largest message sent before
+      assert arenas == [messaging.DEFAULT_ARENA_WORDS] + [max(sizes[:n + 1]) // 8 for n in range(i)]
+
+      dat = sub_sock.receive()
+      sizes.append(len(dat))
+      assert messaging.log_from_bytes(dat).to_dict() == expected.to_dict()
+
+  def test_lineage(self, monkeypatch):
+    monkeypatch.setattr(messaging, "TRACE_LINEAGE", True)
+    sm = messaging.SubMaster(["carState", "modelV2"])
+    pm = messaging.PubMaster(["carControl"])
+    sub_sock = messaging.sub_sock("carControl", conflate=True, timeout=1000)
+    zmq_sleep()
+
+    sm.update_msgs(1., [messaging.new_message("carState", logMonoTime=123)])
+    pm.send("carControl", messaging.new_message("carControl"))
+    recvd = messaging.log_from_bytes(sub_sock.receive())
+    assert [(i.service, i.logMonoTime) for i in recvd.lineage] == [("carState", 123)]
@@ -78,6 +78,9 @@ _services: dict[str, tuple] = {
   "uiDebug": (True, 0., 1),
   "testJoystick": (True, 0.),
   "alertDebug": (True, 20., 5),
+  "controlsdTimings": (True, 0.2, 1),
+  "selfdrivedTimings": (True, 0.2, 1),
+  "cardTimings": (True, 0.2, 1),
   "roadEncodeData": (False, 20.),
   "driverEncodeData": (False, 20.),
   "wideRoadEncodeData": (False, 20.),
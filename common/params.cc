@@ -1,15 +1,22 @@
 #include "common/params.h"
 
 #include <dirent.h>
+#include <poll.h>
 #include <sys/file.h>
+#ifdef __linux__
+#include <sys/inotify.h>
+#endif
 
 #include <algorithm>
 #include <cassert>
+#include <cmath>
 #include <csignal>
+#include <sstream>
 #include <unordered_map>
 
 #include "common/queue.h"
 #include "common/swaglog.h"
+#include "common/timing.h"
 #include "common/util.h"
 #include "system/hardware/hw.h"
 
@@ -87,6 +94,73 @@ private:
   int fd_ = -1;
 };
 
+// writes a value to a temp file in the params path and fsyncs it, returns its path or an empty string on failure
+std::string write_tmp_file(const std::string &params_path, const std::string &value) {
+  std::string tmp_path = params_path + "/.tmp_value_XXXXXX";
+  int tmp_fd = mkstemp((char*)tmp_path.c_str());
+  if (tmp_fd < 0) return {};
+
+  ssize_t bytes_written = HANDLE_EINTR(write(tmp_fd, value.data(), value.size()));
+  int result = (bytes_written >= 0 && (size_t)bytes_written == value.size()) ? fsync(tmp_fd) : -1;
+  close(tmp_fd);
+  if (result != 0) {
+    ::unlink(tmp_path.c_str());
+    return {};
+  }
+  return tmp_path;
+}
+
+std::string read_file_at(int dir_fd, const std::string &name) {
+  std::string value;
+  int fd = HANDLE_EINTR(openat(dir_fd, name.c_str(), O_RDONLY | O_CLOEXEC));
+  if (fd < 0) return value;
+
+  struct stat st;
+  if (fstat(fd, &st) == 0 && st.st_size > 0) {
+    value.resize(st.st_size);
+    ssize_t n = HANDLE_EINTR(read(fd, value.data(), value.size()));
+    value.resize(std::max<ssize_t>(n, 0));
+  }
+  close(fd);
+  return value;
+}
+
+// A transaction is journaled as lines of "put <temp file> <key>" and "remove <temp file> <key>". The temp file
+// of a removal is empty and deleted with the key. Entries whose temp file is gone are done, so a journal can be
+// applied again after a crash.
+struct JournalEntry {
+  std::string tmp_path;
+  std::string key;
+  bool remove;
+};
+
+int apply_journal(const std::vector<JournalEntry> &journal, const std::string &key_path) {
+  int result = 0;
+  for (const auto &e : journal) {
+    if (!e.remove) {
+      if (rename(e.tmp_path.c_str(), (key_path + "/" + e.key).c_str()) != 0 && errno != ENOENT) result = -1;
+    } else if (util::file_exists(e.tmp_path)) {
+      ::unlink((key_path + "/" + e.key).c_str());
+      ::unlink(e.tmp_path.c_str());
+    }
+  }
+  return result;
+}
+
+// finishes a transaction interrupted by a crash, with the params locked
+void recover_journal(const std::string &params_path, const std::string &key_path) {
+  const std::string journal_path = params_path + "/.transaction";
+  std::istringstream stream(util::read_file(journal_path));
+  std::vector<JournalEntry> journal;
+  std::string op, tmp_name, key;
+  while (stream >> op >> tmp_name >> key) {
+    journal.push_back({params_path + "/" + tmp_name, key, op == "remove"});
+  }
+  if (apply_journal(journal, key_path) == 0 && fsync_dir(key_path) == 0) {
+    ::unlink(journal_path.c_str());
+  }
+}
+
 std::unordered_map<std::string, uint32_t> keys = {
     {"AccessToken", CLEAR_ON_MANAGER_START | DONT_LOG},
     {"AdbEnabled", PERSISTENT},
@@ -122,6 +196,7 @@ std::unordered_map<std::string, uint32_t> keys = {
     {"ExperimentalModeConfirmed", PERSISTENT},
     {"FirehoseMode", CLEAR_ON_MANAGER_START | CLEAR_ON_ONROAD_TRANSITION},
     {"FirmwareQueryDone", CLEAR_ON_MANAGER_START | CLEAR_ON_ONROAD_TRANSITION},
+    {"FlightRecorderEnabled", PERSISTENT},
     {"ForcePowerDown", PERSISTENT},
     {"GitBranch", PERSISTENT},
     {"GitCommit", PERSISTENT},
@@ -209,6 +284,11 @@ std::unordered_map<std::string, uint32_t> keys = {
 Params::Params(const std::string &path) {
   params_prefix = "/" + util::getenv("OPENPILOT_PREFIX", "d");
   params_path = ensure_params_path(params_prefix, path);
+
+  if (util::file_exists(params_path + "/.transaction")) {
+    FileLock file_lock(params_path + "/.lock");
+    recover_journal(params_path, getParamPath());
+  }
 }
 
 Params::~Params() {
@@ -292,11 +372,13 @@ std::string Params::get(const std::string &key, bool block) {
     void (*prev_handler_sigterm)(int) = std::signal(SIGTERM, params_sig_handler);
 
     std::string value;
+    ParamWatcher watcher({key}, params_path);
     while (!params_do_exit) {
       if (value = util::read_file(getParamPath(key)); !value.empty()) {
         break;
       }
-      util::sleep_for(100);  // 0.1 s
+      // a signal ends the wait, the timeout covers one arriving just before it
+      watcher.wait(1000);
     }
 
     std::signal(SIGINT, prev_handler_sigint);
@@ -310,6 +392,83 @@ std::map<std::string, std::string> Params::readAll() {
   return util::read_files_in_dir(getParamPath());
 }
 
+std::map<std::string, std::string> Params::getMany(const std::vector<std::string> &keys) {
+  std::map<std::string, std::string> ret;
+  FileLock file_lock(params_path + "/.lock");
+  int dir_fd = HANDLE_EINTR(open(getParamPath().c_str(), O_RDONLY | O_DIRECTORY | O_CLOEXEC));
+  if (dir_fd < 0) return ret;
+
+  for (const auto &key : keys) {
+    if (std::string value = read_file_at(dir_fd, key); !value.empty()) {
+      ret[key] = std::move(value);
+    }
+  }
+  close(dir_fd);
+  return ret;
+}
+
+int Params::putMany(const std::map<std::string, std::string> &values) {
+  return writeMany(values, {}, false);
+}
+
+int Params::commit(const std::map<std::string, std::string> &values, const std::vector<std::string> &removed) {
+  return writeMany(values, removed, true);
+}
+
+int Params::writeMany(const std::map<std::string, std::string> &values, const std::vector<std::string> &removed, bool atomic) {
+  // 1) Write every value to a temp file and fsync it
+  // 2) For a transaction, write the journal of the renames and removals and fsync it
+  // 3) Move the temp files into place and remove the keys
+  // 4) fsync() the containing directory once
+  // 5) Delete the journal, a stale one has nothing left to do
+  if (values.empty() && removed.empty()) return 0;
+
+  std::vector<JournalEntry> journal;
+  for (const auto &[key, value] : values) {
+    journal.push_back({write_tmp_file(params_path, value), key, false});
+  }
+  for (const auto &key : removed) {
+    journal.push_back({write_tmp_file(params_path, ""), key, true});
+  }
+
+  int result = -1;
+  if (std::none_of(journal.begin(), journal.end(), [](auto &e) { return e.tmp_path.empty(); })) {
+    FileLock file_lock(params_path + "/.lock");
+
+    const std::string journal_path = params_path + "/.transaction";
+    result = 0;
+    bool journaled = false;
+    if (atomic) {
+      std::string dat;
+      for (const auto &e : journal) {
+        dat += (e.remove ? "remove " : "put ") + e.tmp_path.substr(params_path.size() + 1) + " " + e.key + "\n";
+      }
+      std::string tmp_path = write_tmp_file(params_path, dat);
+      journaled = !tmp_path.empty() && rename(tmp_path.c_str(), journal_path.c_str()) == 0;
+      if (!journaled || fsync_dir(params_path) != 0) {
+        result = -1;
+      }
+    }
+
+    if (result == 0 && (result = apply_journal(journal, getParamPath())) == 0) {
+      result = fsync_dir(getParamPath());
+    }
+    if (journaled && result == 0) {
+      ::unlink(journal_path.c_str());
+    } else if (journaled) {
+      // left for the next Params to finish
+      return result;
+    }
+  }
+
+  if (result != 0) {
+    for (const auto &e : journal) {
+      if (!e.tmp_path.empty()) ::unlink(e.tmp_path.c_str());
+    }
+  }
+  return result;
+}
+
 void Params::clearAll(ParamKeyType key_type) {
   FileLock file_lock(params_path + "/.lock");
 
@@ -347,3 +506,92 @@ void Params::asyncWriteThread() {
     put(p.first, p.second);
   }
 }
+
+ParamWatcher::ParamWatcher(const std::vector<std::string> &keys, const std::string &path) : keys(keys.begin(), keys.end()) {
+  params_dir = Params(path).getParamPath();
+  if (pipe(interrupt_fds) != 0) {
+    throw std::runtime_error(util::string_format("Failed to create pipe, errno=%d", errno));
+  }
+
+#ifdef __linux__
+  // put() renames into the directory, remove() and clearAll() unlink
+  inotify_fd = inotify_init1(IN_NONBLOCK | IN_CLOEXEC);
+  if (inotify_fd >= 0 && inotify_add_watch(inotify_fd, params_dir.c_str(), IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE) < 0) {
+    close(inotify_fd);
+    inotify_fd = -1;
+  }
+#endif
+  if (inotify_fd < 0) {
+    LOGW("inotify unavailable, polling params in %s", params_dir.c_str());
+    for (const auto &key : keys) {
+      values[key] = util::read_file(params_dir + "/" + key);
+    }
+  }
+}
+
+ParamWatcher::~ParamWatcher() {
+  if (inotify_fd >= 0) close(inotify_fd);
+  close(interrupt_fds[0]);
+  close(interrupt_fds[1]);
+}
+
+std::vector<std::string> ParamWatcher::wait(int timeout_ms) {
+  const double deadline = millis_since_boot() + timeout_ms;
+  std::vector<std::string> changed;
+  while (changed.empty()) {
+    int remaining = timeout_ms < 0 ? -1 : std::max(0, (int)std::ceil(deadline - millis_since_boot()));
+    if (inotify_fd < 0) {
+      remaining = remaining < 0 ? 100 : std::min(remaining, 100);  // 0.1 s
+    }
+
+    struct pollfd fds[] = {{interrupt_fds[0], POLLIN, 0}, {inotify_fd, POLLIN, 0}};
+    int ret = poll(fds, inotify_fd >= 0 ? 2 : 1, remaining);
+    if (ret < 0 || (fds[0].revents & POLLIN)) {
+      break;
+    }
+
+    changed = inotify_fd >= 0 ? readEvents() : pollValues();
+    if (timeout_ms >= 0 && millis_since_boot() >= deadline) {
+      break;
+    }
+  }
+  return changed;
+}
+
+void ParamWatcher::interrupt() {
+  // the pipe is never drained, every wait() from now on returns at once
+  HANDLE_EINTR(write(interrupt_fds[1], "1", 1));
+}
+
+std::vector<std::string> ParamWatcher::readEvents() {
+  std::vector<std::string> changed;
+#ifdef __linux__
+  alignas(struct inotify_event) char buf[4096];
+  ssize_t len;
+  while ((len = HANDLE_EINTR(read(inotify_fd, buf, sizeof(buf)))) > 0) {
+    for (char *ptr = buf; ptr < buf + len;) {
+      auto event = (const struct inotify_event *)ptr;
+      ptr += sizeof(struct inotify_event) + event->len;
+      if (event->mask & IN_Q_OVERFLOW) {
+        // events were dropped, any key might have changed
+        changed.assign(keys.begin(), keys.end());
+      } else if (event->len > 0 && keys.count(event->name) &&
+                 std::find(changed.begin(), changed.end(), event->name) == changed.end()) {
+        changed.push_back(event->name);
+      }
+    }
+  }
+#endif
+  return changed;
+}
+
+std::vector<std::string> ParamWatcher::pollValues() {
+  std::vector<std::string> changed;
+  for (auto &[key, value] : values) {
+    if (std::string v = util::read_file(params_dir + "/" + key); v != value) {
+      value = v;
+      changed.push_back(key);
+    }
+  }
+  return changed;
+}
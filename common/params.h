@@ -2,6 +2,7 @@
 
 #include <future>
 #include <map>
+#include <set>
 #include <string>
 #include <tuple>
 #include <utility>
@@ -44,6 +45,8 @@ public:
     return get(key, block) == "1";
   }
   std::map<std::string, std::string> readAll();
+  // the values of the keys that are set, without a putMany() or commit() halfway through
+  std::map<std::string, std::string> getMany(const std::vector<std::string> &keys);
 
   // helpers for writing values
   int put(const char *key, const char *val, size_t value_size);
@@ -58,8 +61,14 @@ public:
     putNonBlocking(key, val ? "1" : "0");
   }
 
+  // helpers for writing many values at once, with a single fsync of the directory
+  int putMany(const std::map<std::string, std::string> &values);
+  // like putMany, and after a crash either all or none of the values are put and keys removed
+  int commit(const std::map<std::string, std::string> &values, const std::vector<std::string> &removed);
+
 private:
   void asyncWriteThread();
+  int writeMany(const std::map<std::string, std::string> &values, const std::vector<std::string> &removed, bool atomic);
 
   std::string params_path;
   std::string params_prefix;
@@ -68,3 +77,30 @@ private:
   std::future<void> future;
   SafeQueue<std::pair<std::string, std::string>> queue;
 };
+
+// Waits for params to be put or removed, with inotify on the params directory
+class ParamWatcher {
+public:
+  explicit ParamWatcher(const std::vector<std::string> &keys, const std::string &path = {});
+  ~ParamWatcher();
+  // Not copyable.
+  ParamWatcher(const ParamWatcher&) = delete;
+  ParamWatcher& operator=(const ParamWatcher&) = delete;
+
+  // Blocks until some of the keys change, timeout_ms passes (-1 to wait forever) or a signal arrives.
+  // Returns the keys that changed, none on timeout, on a signal and from the moment interrupt() is called.
+  std::vector<std::string> wait(int timeout_ms = -1);
+  void interrupt();
+
+private:
+  std::vector<std::string> readEvents();
+  std::vector<std::string> pollValues();
+
+  std::set<std::string> keys;
+  std::string params_dir;
+  int inotify_fd = -1;
+  int interrupt_fds[2] = {-1, -1};
+
+  // without inotify the values are polled instead
+  std::map<std::string, std::string> values;
+};
@@ -1,8 +1,34 @@
-from openpilot.common.params_pyx import Params, ParamKeyType, UnknownKeyName
+import threading
+from collections.abc import Callable
+
+from openpilot.common.params_pyx import Params, ParamKeyType, ParamWatcher, UnknownKeyName
 assert Params
 assert ParamKeyType
+assert ParamWatcher
 assert UnknownKeyName
 
+
+class ParamCallbackThread(threading.Thread):
+  """Calls callback with all the keys at start, then with the changed ones whenever some are put or removed"""
+  def __init__(self, keys: list[str], callback: Callable[[list[str]], None], d: str = ""):
+    super().__init__(daemon=True)
+    self.keys = list(keys)
+    self.callback = callback
+    self.watcher = ParamWatcher(self.keys, d)
+    self.exit_event = threading.Event()
+
+  def run(self):
+    changed = self.keys
+    while not self.exit_event.is_set():
+      if changed:
+        self.callback(changed)
+      changed = self.watcher.wait()
+
+  def stop(self):
+    self.exit_event.set()
+    self.watcher.interrupt()
+    self.join()
+
 if __name__ == "__main__":
   import sys
 
@@ -1,6 +1,8 @@
 # distutils: language = c++
 # cython: language_level = 3
+from cpython.exc cimport PyErr_CheckSignals
 from libcpp cimport bool
+from libcpp.map cimport map
 from libcpp.string cimport string
 from libcpp.vector cimport vector
 
@@ -26,6 +28,14 @@ cdef extern from "common/params.h":
     string getParamPath(string) nogil
     void clearAll(ParamKeyType)
     vector[string] allKeys()
+    map[string, string] getMany(vector[string]) nogil
+    int putMany(map[string, string]) nogil
+    int commit(map[string, string], vector[string]) nogil
+
+  cdef cppclass c_ParamWatcher "ParamWatcher":
+    c_ParamWatcher(vector[string], string) except + nogil
+    vector[string] wait(int) nogil
+    void interrupt() nogil
 
 
 def ensure_bytes(v):
@@ -121,3 +131,116 @@ cdef class Params:
 
   def all_keys(self):
     return self.p.allKeys()
+
+  def get_many(self, keys, encoding=None):
+    """
+    Reads many params at once and returns a dict of their values, None for the ones that aren't set.
+    Never sees a put_many or transaction halfway through.
+    """
+    cdef vector[string] k = [self.check_key(key) for key in keys]
+    cdef map[string, string] values
+    with nogil:
+      values = self.p.getMany(k)
+
+    ret = {}
+    for key, key_bytes in zip(keys, k, strict=True):
+      val = values[key_bytes] if values.count(key_bytes) else None
+      ret[key] = val if val is None or encoding is None else val.decode(encoding)
+    return ret
+
+  def put_many(self, values):
+    """
+    Writes a dict of params. Blocks like put, with one fsync of the directory in total.
+    """
+    cdef map[string, string] v
+    for key, dat in values.items():
+      v[self.check_key(key)] = ensure_bytes(dat)
+    with nogil:
+      self.p.putMany(v)
+
+  def transaction(self):
+    """
+    Puts and removals that are written all at once when the with block ends, after a crash either all or none of
+    them have happened.
+
+      with params.transaction() as tx:
+        tx.put("CarParams", cp)
+        tx.remove("CarParamsCache")
+    """
+    return ParamsTransaction(self)
+
+  def wait_for_change(self, keys, timeout=None):
+    """
+    Blocks until some of the keys are put or removed, or timeout seconds pass, and returns the keys that changed.
+    Changes from before the call are missed, keep a ParamWatcher to not miss any between two waits.
+    """
+    return ParamWatcher(keys, self.d).wait(timeout)
+
+
+cdef class ParamsTransaction:
+  cdef Params params
+  cdef map[string, string] values
+  cdef dict removed
+
+  def __cinit__(self, Params params):
+    self.params = params
+    self.removed = {}
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if exc_type is None:
+      self.commit()
+
+  def put(self, key, dat):
+    cdef string k = self.params.check_key(key)
+    self.values[k] = ensure_bytes(dat)
+    self.removed.pop(k, None)
+
+  def put_bool(self, key, bool val):
+    self.put(key, b"1" if val else b"0")
+
+  def remove(self, key):
+    cdef string k = self.params.check_key(key)
+    self.values.erase(k)
+    self.removed[k] = None
+
+  def commit(self):
+    cdef vector[string] removed = list(self.removed)
+    with nogil:
+      self.params.p.commit(self.values, removed)
+    self.values.clear()
+    self.removed.clear()
+
+
+cdef class ParamWatcher:
+  cdef c_ParamWatcher* w
+
+  def __cinit__(self, keys, d=""):
+    params = Params(d)
+    cdef vector[string] k = [params.check_key(key) for key in keys]
+    cdef string path = <string>d.encode()
+    with nogil:
+      self.w = new c_ParamWatcher(k, path)
+
+  def __dealloc__(self):
+    del self.w
+
+  def wait(self, timeout=None):
+    """
+    Blocks until some of the keys are put or removed, or timeout seconds pass, and returns the keys that changed.
+    Returns no keys at once after interrupt().
+    """
+    cdef int timeout_ms = -1 if timeout is None else int(timeout * 1000)
+    cdef vector[string] changed
+    with nogil:
+      changed = self.w.wait(timeout_ms)
+
+    # raise KeyboardInterrupt if a signal ended the wait
+    PyErr_CheckSignals()
+    return [k.decode() for k in changed]
+
+  def interrupt(self):
+    with nogil:
+      self.w.interrupt()
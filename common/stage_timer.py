@@ -0,0 +1,96 @@
+"""Always-on timers of the stages of realtime loops, published as histograms at a low rate."""
+import time
+
+import cereal.messaging as messaging
+from openpilot.common.swaglog import cloudlog
+
+NUM_BINS = 16
+BIN_SHIFT = 10  # bin 0 is below 2**10 ns, bin i below 2**(10 + i) ns
+PUBLISH_PERIOD = 5.  # s
+MAX_OVERHEAD = 0.01  # of the loop period
+
+
+class StageTimer:
+  """
+  Times the stages of a loop, between start() and the mark() at the end of each stage. Durations go into
+  preallocated histograms that finish() publishes every publish_period and then resets.
+  """
+  def __init__(self, service: str, stages: list[str], period: float, publish_period: float = PUBLISH_PERIOD):
+    self.service = service
+    self.stages = stages
+    self.index = {s: i for i, s in enumerate(stages)}
+    self.period_ns = int(period * 1e9)
+    self.publish_frames = max(round(publish_period / period), 1)
+
+    # one more for the total
+    self.counts = [[0] * NUM_BINS for _ in range(len(stages) + 1)]
+    self.sums = [0] * (len(stages) + 1)
+    self.maxs = [0] * (len(stages) + 1)
+    self.frames = 0
+    self.start_ns = 0
+    self.last_ns = 0
+
+    self.overhead_ns = self.measure_overhead()
+    if self.overhead_ns > MAX_OVERHEAD * self.period_ns:
+      cloudlog.warning(f"{service}: stage timing takes {self.overhead_ns / 1e3:.1f} us of a {period * 1e3:.0f} ms loop")
+
+  def start(self) -> None:
+    self.start_ns = self.last_ns = time.monotonic_ns()
+
+  def mark(self, stage: str) -> None:
+    now = time.monotonic_ns()
+    self.add(self.index[stage], now - self.last_ns)
+    self.last_ns = now
+
+  def add(self, i: int, dt: int) -> None:
+    self.counts[i][min((dt >> BIN_SHIFT).bit_length(), NUM_BINS - 1)] += 1
+    self.sums[i] += dt
+    if dt > self.maxs[i]:
+      self.maxs[i] = dt
+
+  def end_frame(self) -> None:
+    self.add(len(self.stages), self.last_ns - self.start_ns)
+    self.frames += 1
+
+  def finish(self, pm: messaging.PubMaster) -> None:
+    """Ends the loop, after the mark of the last stage"""
+    self.end_frame()
+    if self.frames >= self.publish_frames:
+      pm.send(self.service, self.get_msg())
+      self.reset()
+
+  def reset(self) -> None:
+    for i in range(len(self.stages) + 1):
+      self.counts[i] = [0] * NUM_BINS
+      self.sums[i] = 0
+      self.maxs[i] = 0
+    self.frames = 0
+
+  def get_msg(self):
+    dat = messaging.new_message(self.service)
+    timings = getattr(dat, self.service)
+    timings.frames = self.frames
+    timings.periodNs = self.period_ns
+    timings.overheadNs = self.overhead_ns
+    self.fill_stage(timings.total, 'total', len(self.stages))
+    for i, stage in enumerate(timings.init('stages', len(self.stages))):
+      self.fill_stage(stage, self.stages[i], i)
+    return dat
+
+  def fill_stage(self, stage, name: str, i: int) -> None:
+    stage.name = name
+    stage.counts = self.counts[i]
+    stage.sumNs = self.sums[i]
+    stage.maxNs = self.maxs[i]
+
+  def measure_overhead(self, n: int = 1000) -> int:
+    """Cost of timing one loop in ns"""
+    st = time.monotonic_ns()
+    for _ in range(n):
+      self.start()
+      for stage in self.stages:
+        self.mark(stage)
+      self.end_frame()
+    overhead = (time.monotonic_ns() - st) // n
+    self.reset()
+    return overhead
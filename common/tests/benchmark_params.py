@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import argparse
+import time
+
+import numpy as np
+
+from openpilot.common.params import Params
+
+# the params daemons read together at startup
+READ_SETS = {
+  'selfdrived': ["IsMetric", "IsLdwEnabled", "ExperimentalMode", "LongitudinalPersonality", "DisengageOnAccelerator",
+                 "OpenpilotEnabledToggle", "JoystickDebugMode", "CarParams"],
+  'card': ["ObdMultiplexingEnabled", "ExperimentalLongitudinalEnabled", "CarParamsCache", "DisengageOnAccelerator",
+           "OpenpilotEnabledToggle", "IsReleaseBranch", "SecOCKey", "CarParamsPersistent", "IsMetric"],
+  'manager_init': ["CompletedTrainingVersion", "DisengageOnAccelerator", "GsmMetered", "HasAcceptedTerms",
+                   "LanguageSetting", "OpenpilotEnabledToggle", "LongitudinalPersonality", "RecordFrontLock"],
+}
+
+# and write
+WRITE_SETS = {
+  'manager_init': {"Version": "0.9.8", "TermsVersion": "2", "TrainingVersion": "0.2.0", "GitCommit": "0" * 40,
+                   "GitCommitDate": "'1700000000 2024-01-01 00:00:00 +0000'", "GitBranch": "master",
+                   "GitRemote": "https://github.com/commaai/openpilot.git", "IsTestedBranch": "0",
+                   "IsReleaseBranch": "0", "HardwareSerial": "0123456789"},
+  'card': {"CarParamsPrevRoute": b"\x00" * 3000, "CarParams": b"\x00" * 3000},
+}
+
+
+def timeit(n: int, f, *args) -> float:
+  """Median time of f in us"""
+  times = []
+  for _ in range(n):
+    st = time.perf_counter()
+    f(*args)
+    times.append(time.perf_counter() - st)
+  return float(np.median(times) * 1e6)
+
+
+def get_one_by_one(params, keys):
+  return [params.get(k) for k in keys]
+
+
+def put_one_by_one(params, values):
+  for k, v in values.items():
+    params.put(k, v)
+
+
+def put_transaction(params, values):
+  with params.transaction() as tx:
+    for k, v in values.items():
+      tx.put(k, v)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Reading and writing the params of daemon startups one by one against at once")
+  parser.add_argument("-n", type=int, default=200, help="repetitions of the reads, a tenth of that of the writes")
+  args = parser.parse_args()
+
+  params = Params()
+  for values in WRITE_SETS.values():
+    params.put_many(values)
+  params.put("CarParams", b"\x00" * 3000)
+
+  for name, keys in READ_SETS.items():
+    one_by_one = timeit(args.n, get_one_by_one, params, keys)
+    at_once = timeit(args.n, params.get_many, keys)
+    print(f"read {name} ({len(keys)} params): get {one_by_one:.1f} us, get_many {at_once:.1f} us")
+
+  for name, values in WRITE_SETS.items():
+    n = max(args.n // 10, 1)
+    res = {
+      'put': timeit(n, put_one_by_one, params, values),
+      'put_many': timeit(n, params.put_many, values),
+      'transaction': timeit(n, put_transaction, params, values),
+    }
+    print(f"write {name} ({len(values)} params): " + ", ".join(f"{k} {v / 1e3:.2f} ms" for k, v in res.items()))
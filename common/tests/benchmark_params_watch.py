@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import argparse
+import random
+import threading
+import time
+
+import numpy as np
+
+from openpilot.common.params import Params, ParamCallbackThread
+
+KEYS = ["IsMetric", "ExperimentalMode", "LongitudinalPersonality"]
+
+
+def get_context_switches() -> int:
+  with open("/proc/thread-self/status") as f:
+    for line in f:
+      if line.startswith("voluntary_ctxt_switches"):
+        return int(line.split()[1])
+  return 0
+
+
+class PollingThread(threading.Thread):
+  """How the params threads of selfdrived and card used to notice changes"""
+  def __init__(self, keys: list[str], callback):
+    super().__init__(daemon=True)
+    self.keys = keys
+    self.callback = callback
+    self.exit_event = threading.Event()
+
+  def run(self):
+    while not self.exit_event.is_set():
+      self.callback(self.keys)
+      time.sleep(0.1)
+
+  def stop(self):
+    self.exit_event.set()
+    self.join()
+
+
+def measure(cls, duration: float, rate: float) -> dict[str, float]:
+  class CountedThread(cls):
+    def run(self):
+      switches = get_context_switches()
+      super().run()
+      self.wakeups = get_context_switches() - switches
+
+  params = Params()
+  params.put_bool("IsMetric", False)
+  put_times: list[float] = []
+  latencies: list[float] = []
+  callbacks = 0
+
+  def callback(keys):
+    nonlocal callbacks
+    callbacks += 1
+    # like the daemons, read them all
+    values = [params.get(k) for k in KEYS]
+    if len(put_times) > len(latencies) and values[0] == (b"1" if len(put_times) % 2 else b"0"):
+      latencies.append(time.monotonic() - put_times[-1])
+
+  t = CountedThread(KEYS, callback)
+  t.start()
+  st = time.monotonic()
+  while time.monotonic() - st < duration:
+    # at random times, not in step with the polling
+    time.sleep(random.uniform(0.5, 1.5) / rate if rate > 0 else duration)
+    if rate > 0:
+      put_times.append(time.monotonic())
+      params.put_bool("IsMetric", len(put_times) % 2 == 1)
+  t.stop()
+  elapsed = time.monotonic() - st
+
+  return {
+    'callbacks/s': callbacks / elapsed,
+    'wakeups/s': t.wakeups / elapsed,
+    'latency p50 (ms)': np.percentile(latencies, 50) * 1e3 if latencies else float('nan'),
+    'latency max (ms)': np.max(latencies) * 1e3 if latencies else float('nan'),
+  }
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Wakeups and change latency of a params thread, polling against watching")
+  parser.add_argument("--duration", type=float, default=10., help="seconds per measurement")
+  parser.add_argument("--rate", type=float, default=1., help="param changes per second, 0 for none")
+  args = parser.parse_args()
+
+  for cls in (PollingThread, ParamCallbackThread):
+    res = measure(cls, args.duration, args.rate)
+    print(f"{cls.__name__}: " + ", ".join(f"{k} {v:.2f}" for k, v in res.items()))
@@ -4,7 +4,7 @@ import threading
 import time
 import uuid
 
-from openpilot.common.params import Params, ParamKeyType, UnknownKeyName
+from openpilot.common.params import Params, ParamCallbackThread, ParamKeyType, ParamWatcher, UnknownKeyName
 
 class TestParams:
   def setup_method(self):
@@ -107,3 +107,97 @@ class TestParams:
     assert len(keys) > 20
     assert len(keys) == len(set(keys))
     assert b"CarParams" in keys
+
+  def test_wait_for_change(self):
+    def _delayed_writer():
+      time.sleep(0.1)
+      self.params.put("DongleId", "bob")
+      self.params.put("CarParams", "test")
+    threading.Thread(target=_delayed_writer).start()
+    assert self.params.wait_for_change(["CarParams", "IsMetric"], timeout=5) == ["CarParams"]
+
+    st = time.monotonic()
+    assert self.params.wait_for_change(["CarParams"], timeout=0.1) == []
+    assert time.monotonic() - st >= 0.1
+
+    with pytest.raises(UnknownKeyName):
+      self.params.wait_for_change(["swag"])
+
+  def test_watcher(self):
+    watcher = ParamWatcher(["CarParams", "IsMetric"])
+    # changes between waits aren't missed
+    self.params.put_bool("IsMetric", True)
+    self.params.remove("CarParams")
+    self.params.put("CarParams", "test")
+    assert sorted(watcher.wait(timeout=1)) == ["CarParams", "IsMetric"]
+    assert watcher.wait(timeout=0) == []
+
+    self.params.clear_all(ParamKeyType.CLEAR_ON_MANAGER_START)
+    assert watcher.wait(timeout=1) == ["CarParams"]
+
+    threading.Timer(0.1, watcher.interrupt).start()
+    assert watcher.wait() == []
+    assert watcher.wait() == []
+
+  def test_callback_thread(self):
+    calls = []
+    t = ParamCallbackThread(["CarParams", "IsMetric"], calls.append)
+    t.start()
+    time.sleep(0.1)
+    self.params.put_bool("IsMetric", True)
+    time.sleep(0.1)
+    t.stop()
+    assert calls == [["CarParams", "IsMetric"], ["IsMetric"]]
+
+  def test_get_many(self):
+    self.params.put("DongleId", "bob")
+    self.params.put_bool("IsMetric", True)
+    assert self.params.get_many(["DongleId", "IsMetric", "CarParams"]) == {"DongleId": b"bob", "IsMetric": b"1", "CarParams": None}
+    assert self.params.get_many([b"DongleId"], encoding="utf8") == {b"DongleId": "bob"}
+    assert self.params.get_many([]) == {}
+
+    with pytest.raises(UnknownKeyName):
+      self.params.get_many(["DongleId", "swag"])
+
+  def test_put_many(self):
+    self.params.put_many({"DongleId": "bob", "CarParams": b"\xe1\x90\xff"})
+    assert self.params.get("DongleId") == b"bob"
+    assert self.params.get("CarParams") == b"\xe1\x90\xff"
+
+    with pytest.raises(UnknownKeyName):
+      self.params.put_many({"DongleId": "alice", "swag": "abc"})
+    assert self.params.get("DongleId") == b"bob"
+
+  def test_transaction(self):
+    self.params.put("DongleId", "bob")
+    with self.params.transaction() as tx:
+      tx.put("CarParams", "test")
+      tx.put_bool("IsMetric", True)
+      tx.remove("DongleId")
+      # nothing is written before the end
+      assert self.params.get("CarParams") is None
+    assert self.params.get_many(["CarParams", "IsMetric", "DongleId"]) == {"CarParams": b"test", "IsMetric": b"1", "DongleId": None}
+
+    # the last put or remove of a key wins
+    with self.params.transaction() as tx:
+      tx.remove("CarParams")
+      tx.put("CarParams", "again")
+      tx.put("DongleId", "bob")
+      tx.remove("DongleId")
+    assert self.params.get("CarParams") == b"again"
+    assert self.params.get("DongleId") is None
+
+    # an exception in the block writes nothing
+    with pytest.raises(ValueError), self.params.transaction() as tx:
+      tx.put("DongleId", "bob")
+      raise ValueError
+    assert self.params.get("DongleId") is None
+
+  def test_transaction_recovery(self):
+    # a transaction that crashed after its journal was written is finished by the next Params
+    with open(os.path.join(self.params.get_param_path(), "..", ".tmp_value_test"), "w") as f:
+      f.write("test")
+    with open(os.path.join(self.params.get_param_path(), "..", ".transaction"), "w") as f:
+      f.write("put .tmp_value_test CarParams\nput .tmp_value_gone DongleId\n")
+    assert Params().get("CarParams") == b"test"
+    assert not os.path.exists(os.path.join(self.params.get_param_path(), "..", ".transaction"))
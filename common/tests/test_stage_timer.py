@@ -0,0 +1,61 @@
+import time
+
+from openpilot.common.realtime import DT_CTRL
+from openpilot.common.stage_timer import MAX_OVERHEAD, NUM_BINS, StageTimer
+
+
+class FakePubMaster:
+  def __init__(self):
+    self.sent = []
+
+  def send(self, service, dat):
+    self.sent.append((service, dat))
+
+
+class TestStageTimer:
+  def test_histograms(self, monkeypatch):
+    now = [0]
+    monkeypatch.setattr(time, 'monotonic_ns', lambda: now[0])
+    timer = StageTimer('controlsdTimings', ['update', 'publish'], DT_CTRL, publish_period=3 * DT_CTRL)
+    pm = FakePubMaster()
+
+    for update_ns in (500, 5000, 10 ** 9):
+      timer.start()
+      now[0] += update_ns
+      timer.mark('update')
+      now[0] += 2048
+      timer.mark('publish')
+      timer.finish(pm)
+      now[0] += 10 ** 7
+
+    assert len(pm.sent) == 1
+    service, dat = pm.sent[0]
+    timings = dat.controlsdTimings
+    assert service == 'controlsdTimings'
+    assert timings.frames == 3
+    assert timings.periodNs == DT_CTRL * 1e9
+
+    update, publish = timings.stages
+    assert update.name == 'update'
+    assert list(update.counts) == [1, 0, 0, 1] + [0] * (NUM_BINS - 5) + [1]
+    assert update.sumNs == 500 + 5000 + 10 ** 9
+    assert update.maxNs == 10 ** 9
+    assert list(publish.counts) == [0, 0, 3] + [0] * (NUM_BINS - 3)
+    assert timings.total.maxNs == 10 ** 9 + 2048
+
+    # and starts over
+    assert timer.frames == 0
+    assert sum(timer.sums) == 0
+
+  def test_overhead(self):
+    # the timing of selfdrived's loop, the one with the most stages
+    timer = StageTimer('selfdrivedTimings', ['data_sample', 'update_events', 'state_machine', 'update_alerts', 'publish'], DT_CTRL)
+    assert timer.overhead_ns < MAX_OVERHEAD * DT_CTRL * 1e9
+
+    st = time.monotonic_ns()
+    for _ in range(1000):
+      timer.start()
+      for stage in timer.stages:
+        timer.mark(stage)
+      timer.end_frame()
+    assert (time.monotonic_ns() - st) / 1000 < MAX_OVERHEAD * DT_CTRL * 1e9
@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 import os
 import time
-import threading
 
 import cereal.messaging as messaging
 
 from cereal import car, log
 
-from openpilot.common.params import Params
+from openpilot.common.params import Params, ParamCallbackThread
 from openpilot.common.realtime import config_realtime_process, Priority, Ratekeeper
+from openpilot.common.stage_timer import StageTimer
 from openpilot.common.swaglog import cloudlog, ForwardingHandler
 
 from opendbc.car import DT_CTRL, structs
@@ -67,7 +67,8 @@ class Car:
   def __init__(self, CI=None, RI=None) -> None:
     self.can_sock = messaging.sub_sock('can', timeout=20)
     self.sm = messaging.SubMaster(['pandaStates', 'carControl', 'onroadEvents'])
-    self.pm = messaging.PubMaster(['sendcan', 'carState', 'carParams', 'carOutput', 'liveTracks'])
+    self.pm = messaging.PubMaster(['sendcan', 'carState', 'carParams', 'carOutput', 'liveTracks', 'cardTimings'])
+    self.timer = StageTimer('cardTimings', ['state_update', 'state_publish', 'controls_update'], DT_CTRL)
 
     self.can_rcv_cum_timeout_counter = 0
 
@@ -171,6 +172,7 @@ class Car:
     """carState update loop, driven by can"""
 
     can_strs = messaging.drain_sock_raw(self.can_sock, wait_for_one=True)
+    self.timer.start()
     can_list = can_capnp_to_list(can_strs)
 
     # Update carState from CAN
@@ -215,13 +217,13 @@ class Car:
       self.pm.send('carParams', cp_send)
 
     # publish new carOutput
-    co_send = messaging.new_message('carOutput')
+    co_send = self.pm.new_message('carOutput')
     co_send.valid = self.sm.all_checks(['carControl'])
     co_send.carOutput.actuatorsOutput = self.last_actuators_output
     self.pm.send('carOutput', co_send)
 
     # kick off controlsd step while we actuate the latest carControl packet
-    cs_send = messaging.new_message('carState')
+    cs_send = self.pm.new_message('carState')
     cs_send.valid = CS.canValid
     cs_send.carState = CS
     cs_send.carState.canErrorCounter = self.can_rcv_cum_timeout_counter
@@ -254,35 +256,35 @@ class Car:
 
   def step(self):
     CS, RD = self.state_update()
+    self.timer.mark('state_update')
 
     self.state_publish(CS, RD)
+    self.timer.mark('state_publish')
 
     initialized = (not any(e.name == EventName.selfdriveInitializing for e in self.sm['onroadEvents']) and
                    self.sm.seen['onroadEvents'])
     if not self.CP.passive and initialized:
       self.controls_update(CS, self.sm['carControl'])
+    self.timer.mark('controls_update')
 
     self.initialized_prev = initialized
     self.CS_prev = CS
+    self.timer.finish(self.pm)
 
-  def params_thread(self, evt):
-    while not evt.is_set():
-      self.is_metric = self.params.get_bool("IsMetric")
-      self.experimental_mode = True #Arsany
-      #self.experimental_mode = self.params.get_bool("ExperimentalMode") and self.CP.openpilotLongitudinalControl #Arsany
-      time.sleep(0.1)
+  def update_params(self, keys):
+    self.is_metric = self.params.get_bool("IsMetric")
+    self.experimental_mode = True #Arsany
+    #self.experimental_mode = self.params.get_bool("ExperimentalMode") and self.CP.openpilotLongitudinalControl #Arsany
 
   def card_thread(self):
-    e = threading.Event()
-    t = threading.Thread(target=self.params_thread, args=(e, ))
+    t = ParamCallbackThread(["IsMetric", "ExperimentalMode"], self.update_params)
     try:
       t.start()
       while True:
         self.step()
         self.rk.monitor_time()
     finally:
-      e.set()
-      t.join()
+      t.stop()
 
 
 def main():
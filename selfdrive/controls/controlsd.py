@@ -6,7 +6,8 @@ from cereal import car, log
 import cereal.messaging as messaging
 from openpilot.common.conversions import Conversions as CV
 from openpilot.common.params import Params
-from openpilot.common.realtime import config_realtime_process, Priority, Ratekeeper
+from openpilot.common.realtime import config_realtime_process, Priority, Ratekeeper, DT_CTRL
+from openpilot.common.stage_timer import StageTimer
 from openpilot.common.swaglog import cloudlog
 
 from opendbc.car.car_helpers import get_car_interface
@@ -38,7 +39,8 @@ class Controls:
     self.sm = messaging.SubMaster(['liveParameters', 'liveTorqueParameters', 'modelV2', 'selfdriveState',
                                    'liveCalibration', 'livePose', 'longitudinalPlan', 'carState', 'carOutput',
                                    'driverMonitoringState', 'onroadEvents', 'driverAssistance'], poll='selfdriveState')
-    self.pm = messaging.PubMaster(['carControl', 'controlsState'])
+    self.pm = messaging.PubMaster(['carControl', 'controlsState', 'controlsdTimings'])
+    self.timer = StageTimer('controlsdTimings', ['update', 'state_control', 'publish'], DT_CTRL)
 
     self.steer_limited = False
     self.desired_curvature = 0.0
@@ -58,6 +60,7 @@ class Controls:
 
   def update(self):
     self.sm.update(15)
+    self.timer.start()
     if self.sm.updated["liveCalibration"]:
       self.pose_calibrator.feed_live_calib(self.sm['liveCalibration'])
     if self.sm.updated["livePose"]:
@@ -170,7 +173,7 @@ class Controls:
     #       sm.all_checks(), but this creates a circular dependency
 
     # controlsState
-    dat = messaging.new_message('controlsState')
+    dat = self.pm.new_message('controlsState')
     dat.valid = CS.canValid
     cs = dat.controlsState
 
@@ -199,7 +202,7 @@ class Controls:
     self.pm.send('controlsState', dat)
 
     # carControl
-    cc_send = messaging.new_message('carControl')
+    cc_send = self.pm.new_message('carControl')
     cc_send.valid = CS.canValid
     cc_send.carControl = CC
     self.pm.send('carControl', cc_send)
@@ -208,8 +211,12 @@ class Controls:
     rk = Ratekeeper(100, print_delay_threshold=None)
     while True:
       self.update()
+      self.timer.mark('update')
       CC, lac_log = self.state_control()
+      self.timer.mark('state_control')
       self.publish(CC, lac_log)
+      self.timer.mark('publish')
+      self.timer.finish(self.pm)
       rk.monitor_time()
 
 def main():
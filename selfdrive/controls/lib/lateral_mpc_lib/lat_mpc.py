@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 import os
-import time
 import numpy as np
 
 from casadi import SX, vertcat, sin, cos
+from openpilot.common.realtime import DT_MDL
 # WARNING: imports outside of constants will not trigger a rebuild
 from openpilot.selfdrive.modeld.constants import ModelConstants
+from openpilot.selfdrive.controls.lib.solve_budget import SolveBudget, shift_solution
 
 if __name__ == '__main__':  # generating code
   from openpilot.third_party.acados.acados_template import AcadosModel, AcadosOcp, AcadosOcpSolver
@@ -22,6 +23,10 @@ COST_DIM = COST_E_DIM + 2
 SPEED_OFFSET = 10.0
 MODEL_NAME = 'lat'
 ACADOS_SOLVER_TYPE = 'SQP_RTI'
+QP_ITER_MAX = 1
+# the shifted previous solution is only reused while it still starts at the current yaw rate and speed
+FALLBACK_MAX_YAW_RATE_ERROR = 0.05  # rad/s
+FALLBACK_MAX_V_ERROR = 0.5  # m/s
 N = 32
 
 def gen_lat_model():
@@ -117,7 +122,7 @@ def gen_lat_ocp():
   ocp.solver_options.hessian_approx = 'GAUSS_NEWTON'
   ocp.solver_options.integrator_type = 'ERK'
   ocp.solver_options.nlp_solver_type = ACADOS_SOLVER_TYPE
-  ocp.solver_options.qp_solver_iter_max = 1
+  ocp.solver_options.qp_solver_iter_max = QP_ITER_MAX
   ocp.solver_options.qp_solver_cond_N = 1
 
   # set prediction horizon
@@ -129,10 +134,13 @@ def gen_lat_ocp():
 
 
 class LateralMpc:
-  def __init__(self, x0=None):
+  def __init__(self, x0=None, dt=DT_MDL, budget=None):
     if x0 is None:
       x0 = np.zeros(X_DIM)
+    self.dt = dt
     self.solver = AcadosOcpSolverCython(MODEL_NAME, ACADOS_SOLVER_TYPE, N)
+    # with a single QP iteration the budget can only decide whether to solve at all
+    self.budget = SolveBudget(budget, QP_ITER_MAX) if budget is not None else None
     self.reset(x0)
 
   def reset(self, x0=None):
@@ -141,18 +149,19 @@ class LateralMpc:
     self.x_sol = np.zeros((N+1, X_DIM))
     self.u_sol = np.zeros((N, 1))
     self.yref = np.zeros((N+1, COST_DIM))
-    for i in range(N):
-      self.solver.cost_set(i, "yref", self.yref[i])
-    self.solver.cost_set(N, "yref", self.yref[N][:COST_E_DIM])
+    self.solver.set_all("yref", self.yref)
 
     # Somehow needed for stable init
-    for i in range(N+1):
-      self.solver.set(i, 'x', np.zeros(X_DIM))
-      self.solver.set(i, 'p', np.zeros(P_DIM))
+    self.solver.set_all('x', np.zeros((N+1, X_DIM)))
+    self.solver.set_all('p', np.zeros((N+1, P_DIM)))
     self.solver.constraints_set(0, "lbx", x0)
     self.solver.constraints_set(0, "ubx", x0)
     self.solver.solve()
     self.solution_status = 0
+    self.qp_iterations = 0
+    self.fallback = False
+    # speed the current solution was solved for, none until the first solve
+    self.solution_v_ego = None
     self.solve_time = 0.0
     self.cost = 0
 
@@ -167,6 +176,12 @@ class LateralMpc:
     self.solver.cost_set(N, 'W', W[:COST_E_DIM,:COST_E_DIM])
 
   def run(self, x0, p, y_pts, heading_pts, yaw_rate_pts):
+    # a run is a whole cycle of the lateral MPC, only the previous solves count against the budget
+    self.fallback = self.budget is not None and self.budget.get_qp_iter_max(0.0, self.can_fall_back(x0, p)) == 0
+    if self.fallback:
+      self.run_fallback()
+      return
+
     x0_cp = np.copy(x0)
     p_cp = np.copy(p)
     self.solver.constraints_set(0, "lbx", x0_cp)
@@ -176,22 +191,37 @@ class LateralMpc:
     # rotation_radius = p_cp[1]
     self.yref[:,1] = heading_pts * (v_ego + SPEED_OFFSET)
     self.yref[:,2] = yaw_rate_pts * (v_ego + SPEED_OFFSET)
-    for i in range(N):
-      self.solver.cost_set(i, "yref", self.yref[i])
-      self.solver.set(i, "p", p_cp[i])
-    self.solver.set(N, "p", p_cp[N])
-    self.solver.cost_set(N, "yref", self.yref[N][:COST_E_DIM])
+    self.solver.set_all("yref", self.yref)
+    self.solver.set_all("p", p_cp)
 
-    t = time.monotonic()
     self.solution_status = self.solver.solve()
-    self.solve_time = time.monotonic() - t
-
-    for i in range(N+1):
-      self.x_sol[i] = self.solver.get(i, 'x')
-    for i in range(N):
-      self.u_sol[i] = self.solver.get(i, 'u')
+    self.solve_time = float(self.solver.get_stats('time_tot')[0])
+    self.qp_iterations = int(np.sum(self.solver.get_stats('qp_iter')))
+    if self.budget is not None:
+      self.budget.update(self.solve_time, float(self.solver.get_stats('time_qp')[0]), self.qp_iterations)
+
+    self.x_sol = self.solver.get_all('x')
+    self.u_sol = self.solver.get_all('u')
+    self.solution_v_ego = v_ego
     self.cost = self.solver.get_cost()
 
+  def can_fall_back(self, x0, p):
+    # a jump of the yaw rate or the speed needs a new solve
+    if self.solution_v_ego is None:
+      return False
+    yaw_rate = np.interp(self.dt, ModelConstants.T_IDXS[:N+1], self.x_sol[:,3])
+    return bool(abs(yaw_rate - x0[3]) < FALLBACK_MAX_YAW_RATE_ERROR and abs(self.solution_v_ego - p[0, 0]) < FALLBACK_MAX_V_ERROR)
+
+  def run_fallback(self):
+    # the previous solution one cycle later, still in the frame it was solved in
+    self.solution_status = 0
+    self.qp_iterations = 0
+    self.solve_time = 0.0
+    t_idxs = np.array(ModelConstants.T_IDXS)[:N+1]
+    self.x_sol = shift_solution(self.x_sol, t_idxs, self.dt)
+    self.u_sol = shift_solution(self.u_sol, t_idxs, self.dt)
+    self.solver.set_all('x', self.x_sol)
+
 
 if __name__ == "__main__":
   ocp = gen_lat_ocp()
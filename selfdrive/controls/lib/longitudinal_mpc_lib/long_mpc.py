@@ -9,6 +9,7 @@ from openpilot.common.swaglog import cloudlog
 # WARNING: imports outside of constants will not trigger a rebuild
 from openpilot.selfdrive.modeld.constants import index_function
 from openpilot.selfdrive.controls.radard import _LEAD_ACCEL_TAU
+from openpilot.selfdrive.controls.lib.solve_budget import SolveBudget, shift_solution
 from aenum import IntFlag, ReprEnum, StrEnum, EnumType, auto
 
 if __name__ == '__main__':  # generating code
@@ -43,6 +44,11 @@ CRASH_DISTANCE = .25
 LEAD_DANGER_FACTOR = 0.75
 LIMIT_COST = 1e6
 ACADOS_SOLVER_TYPE = 'SQP_RTI'
+QP_ITER_MAX = 10
+# the shifted previous solution is only reused while it still starts at the current state and obstacle
+FALLBACK_MAX_V_ERROR = 0.5  # m/s
+FALLBACK_MAX_A_ERROR = 0.5  # m/s^2
+FALLBACK_MAX_OBSTACLE_ERROR = 2.0  # m
 
 
 # Fewer timestamps don't hurt performance and lead to
@@ -211,7 +217,7 @@ def gen_long_ocp():
 
   # More iterations take too much time and less lead to inaccurate convergence in
   # some situations. Ideally we would run just 1 iteration to ensure fixed runtime.
-  ocp.solver_options.qp_solver_iter_max = 10
+  ocp.solver_options.qp_solver_iter_max = QP_ITER_MAX
   ocp.solver_options.qp_tol = 1e-3
 
   # set prediction horizon
@@ -223,10 +229,14 @@ def gen_long_ocp():
 
 
 class LongitudinalMpc:
-  def __init__(self, mode='acc', dt=DT_MDL):
+  def __init__(self, mode='acc', dt=DT_MDL, budget=None):
     self.mode = mode
     self.dt = dt
     self.solver = AcadosOcpSolverCython(MODEL_NAME, ACADOS_SOLVER_TYPE, N)
+    # without a budget every cycle solves with up to QP_ITER_MAX iterations
+    self.budget = SolveBudget(budget, QP_ITER_MAX) if budget is not None else None
+    self.qp_iter_max = QP_ITER_MAX
+    self.cycle_start = 0.0
     self.reset()
     self.source = SOURCES[2]
 
@@ -239,18 +249,19 @@ class LongitudinalMpc:
     self.prev_a = np.array(self.a_solution)
     self.j_solution = np.zeros(N)
     self.yref = np.zeros((N+1, COST_DIM))
-    for i in range(N):
-      self.solver.cost_set(i, "yref", self.yref[i])
-    self.solver.cost_set(N, "yref", self.yref[N][:COST_E_DIM])
+    self.solver.set_all("yref", self.yref)
     self.x_sol = np.zeros((N+1, X_DIM))
     self.u_sol = np.zeros((N,1))
     self.params = np.zeros((N+1, PARAM_DIM))
-    for i in range(N+1):
-      self.solver.set(i, 'x', np.zeros(X_DIM))
+    self.solver.set_all('x', self.x_sol)
     self.last_cloudlog_t = 0
     self.status = False
     self.crash_cnt = 0.0
     self.solution_status = 0
+    self.qp_iterations = 0
+    self.fallback = False
+    # obstacle distances the current solution was solved for, none until the first solve
+    self.solution_obstacles = None
     # timers
     self.solve_time = 0.0
     self.time_qp_solution = 0.0
@@ -294,8 +305,7 @@ class LongitudinalMpc:
     self.x0[1] = v
     self.x0[2] = a
     if abs(v_prev - v) > 2.:  # probably only helps if v < v_prev
-      for i in range(N+1):
-        self.solver.set(i, 'x', self.x0)
+      self.solver.set_all('x', np.tile(self.x0, (N+1, 1)))
 
   @staticmethod
   def extrapolate_lead(x_lead, v_lead, a_lead, a_lead_tau):
@@ -329,6 +339,7 @@ class LongitudinalMpc:
     return lead_xv
 
   def update(self, radarstate, v_cruise, x, v, a, j, personality=log.LongitudinalPersonality.standard):
+    self.cycle_start = time.monotonic()
     t_follow = get_T_FOLLOW(personality)
     v_ego = self.x0[1]
     self.status = radarstate.leadOne.status or radarstate.leadTwo.status
@@ -385,9 +396,7 @@ class LongitudinalMpc:
     self.yref[:,2] = v
     self.yref[:,3] = a
     self.yref[:,5] = j
-    for i in range(N):
-      self.solver.set(i, "yref", self.yref[i])
-    self.solver.set(N, "yref", self.yref[N][:COST_E_DIM])
+    self.solver.set_all("yref", self.yref)
 
     self.params[:,2] = np.min(x_obstacles, axis=1)
     self.params[:,3] = np.copy(self.prev_a)
@@ -412,8 +421,17 @@ class LongitudinalMpc:
   def run(self):
     # t0 = time.monotonic()
     # reset = 0
-    for i in range(N+1):
-      self.solver.set(i, 'p', self.params[i])
+    self.fallback = False
+    if self.budget is not None:
+      qp_iter_max = self.budget.get_qp_iter_max(time.monotonic() - self.cycle_start, self.can_fall_back())
+      if qp_iter_max == 0:
+        self.run_fallback()
+        return
+      if qp_iter_max != self.qp_iter_max:
+        self.qp_iter_max = qp_iter_max
+        self.solver.options_set('qp_iter_max', qp_iter_max)
+
+    self.solver.set_all('p', self.params)
     self.solver.constraints_set(0, "lbx", self.x0)
     self.solver.constraints_set(0, "ubx", self.x0)
 
@@ -422,34 +440,68 @@ class LongitudinalMpc:
     self.time_qp_solution = float(self.solver.get_stats('time_qp')[0])
     self.time_linearization = float(self.solver.get_stats('time_lin')[0])
     self.time_integrator = float(self.solver.get_stats('time_sim')[0])
+    self.qp_iterations = int(np.sum(self.solver.get_stats('qp_iter')))
+    if self.budget is not None:
+      self.budget.update(self.solve_time, self.time_qp_solution, self.qp_iterations)
 
-    # qp_iter = self.solver.get_stats('statistics')[-1][-1] # SQP_RTI specific
     # print(f"long_mpc timings: tot {self.solve_time:.2e}, qp {self.time_qp_solution:.2e}, lin {self.time_linearization:.2e}, \
-    # integrator {self.time_integrator:.2e}, qp_iter {qp_iter}")
+    # integrator {self.time_integrator:.2e}, qp_iter {self.qp_iterations}")
     # res = self.solver.get_residuals()
     # print(f"long_mpc residuals: {res[0]:.2e}, {res[1]:.2e}, {res[2]:.2e}, {res[3]:.2e}")
     # self.solver.print_statistics()
 
-    for i in range(N+1):
-      self.x_sol[i] = self.solver.get(i, 'x')
-    for i in range(N):
-      self.u_sol[i] = self.solver.get(i, 'u')
-
-    self.v_solution = self.x_sol[:,1]
-    self.a_solution = self.x_sol[:,2]
-    self.j_solution = self.u_sol[:,0]
-
-    self.prev_a = np.interp(T_IDXS + self.dt, T_IDXS, self.a_solution)
+    self.x_sol = self.solver.get_all('x')
+    self.u_sol = self.solver.get_all('u')
+    self.solution_obstacles = np.copy(self.params[:,2])
+    self.update_solution()
 
     t = time.monotonic()
     if self.solution_status != 0:
       if t > self.last_cloudlog_t + 5.0:
         self.last_cloudlog_t = t
         cloudlog.warning(f"Long mpc reset, solution_status: {self.solution_status}")
+      # keep the telemetry of the failed solve, it's what gets published
+      stats = self.solution_status, self.qp_iterations, self.solve_time
       self.reset()
+      self.solution_status, self.qp_iterations, self.solve_time = stats
       # reset = 1
     # print(f"long_mpc timings: total internal {self.solve_time:.2e}, external: {(time.monotonic() - t0):.2e} qp {self.time_qp_solution:.2e}, \
-    # lin {self.time_linearization:.2e} qp_iter {qp_iter}, reset {reset}")
+    # lin {self.time_linearization:.2e} qp_iter {self.qp_iterations}, reset {reset}")
+
+  def get_shifted_solution(self):
+    """The previous solution and the obstacles it was solved for one cycle later, relative to where the car is by then"""
+    x_sol = shift_solution(self.x_sol, T_IDXS, self.dt)
+    obstacles = shift_solution(self.solution_obstacles[:,None], T_IDXS, self.dt)[:,0] - x_sol[0,0]
+    x_sol[:,0] -= x_sol[0,0]
+    return x_sol, obstacles
+
+  def can_fall_back(self):
+    # a jump of the state or the closest obstacle, e.g. a cut-in, needs a new solve
+    if self.solution_obstacles is None:
+      return False
+    x_sol, obstacles = self.get_shifted_solution()
+    return bool(abs(x_sol[0,1] - self.x0[1]) < FALLBACK_MAX_V_ERROR and
+                abs(x_sol[0,2] - self.x0[2]) < FALLBACK_MAX_A_ERROR and
+                abs(obstacles[0] - self.params[0,2]) < FALLBACK_MAX_OBSTACLE_ERROR)
+
+  def run_fallback(self):
+    # not enough of the cycle left to solve, the previous solution is one cycle old by now
+    self.fallback = True
+    self.solution_status = 0
+    self.qp_iterations = 0
+    self.solve_time = 0.0
+    self.x_sol, self.solution_obstacles = self.get_shifted_solution()
+    self.u_sol = shift_solution(self.u_sol, T_IDXS, self.dt)
+    # also the initial guess of the next solve
+    self.solver.set_all('x', self.x_sol)
+    self.update_solution()
+
+  def update_solution(self):
+    self.v_solution = self.x_sol[:,1]
+    self.a_solution = self.x_sol[:,2]
+    self.j_solution = self.u_sol[:,0]
+
+    self.prev_a = np.interp(T_IDXS + self.dt, T_IDXS, self.a_solution)
 
 
 if __name__ == "__main__":
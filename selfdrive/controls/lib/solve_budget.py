@@ -0,0 +1,53 @@
+import numpy as np
+
+from openpilot.common.realtime import DT_MDL
+
+# the MPCs run once per model frame, leave the rest of the cycle to the planner and to publishing
+MPC_SOLVE_BUDGET = 0.5 * DT_MDL
+# a skipped solve reuses the previous solution shifted by one cycle, after this many in a row it's too old and the MPC solves anyway
+MAX_FALLBACKS = 2
+# observed times are tracked as peaks that decay by this every solve, a single slow solve throttles the next ones
+PEAK_DECAY = 0.95
+
+
+class SolveBudget:
+  """
+  Per-cycle time budget of an MPC solve. The cost of a solve is predicted from the observed time per QP iteration
+  and the time spent outside of the QP, the QP iterations are capped to what fits in the rest of the cycle.
+  """
+  def __init__(self, budget: float, qp_iter_max: int, max_fallbacks: int = MAX_FALLBACKS):
+    self.budget = budget
+    self.qp_iter_max = qp_iter_max
+    self.max_fallbacks = max_fallbacks
+    self.reset()
+
+  def reset(self) -> None:
+    self.qp_iter_time = 0.0
+    self.overhead_time = 0.0
+    self.fallbacks = 0
+
+  def get_qp_iter_max(self, elapsed: float, can_fall_back: bool = True) -> int:
+    """
+    QP iterations that fit in the budget after elapsed seconds of the cycle, 0 when the solve should be skipped.
+    A solve is never skipped when the previous solution no longer fits the current state.
+    """
+    remaining = self.budget - elapsed - self.overhead_time
+    qp_iter_max = self.qp_iter_max if self.qp_iter_time <= 0. else min(int(remaining / self.qp_iter_time), self.qp_iter_max)
+    if qp_iter_max < 1:
+      if can_fall_back and self.fallbacks < self.max_fallbacks:
+        self.fallbacks += 1
+        return 0
+      qp_iter_max = 1
+    self.fallbacks = 0
+    return qp_iter_max
+
+  def update(self, solve_time: float, qp_time: float, qp_iterations: int) -> None:
+    self.overhead_time = max(solve_time - qp_time, PEAK_DECAY * self.overhead_time)
+    if qp_iterations > 0:
+      self.qp_iter_time = max(qp_time / qp_iterations, PEAK_DECAY * self.qp_iter_time)
+
+
+def shift_solution(sol: np.ndarray, t_idxs: np.ndarray, dt: float) -> np.ndarray:
+  """A solution trajectory at t_idxs, dt later in time. The end of the horizon is held"""
+  t = np.asarray(t_idxs)[:len(sol)]
+  return np.column_stack([np.interp(t + dt, t, sol[:, i]) for i in range(sol.shape[1])])
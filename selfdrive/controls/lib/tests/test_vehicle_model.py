@@ -65,3 +65,29 @@ class TestVehicleModel:
           x2 = dyn_ss_sol(sa, u, roll, self.VM)
 
           np.testing.assert_almost_equal(x1, x2, decimal=3)
+
+  def test_vectorized(self):
+    """The array versions match the scalar ones sample by sample, also at low speed"""
+    sa = np.radians(np.linspace(-20, 20, num=11))
+    roll = np.radians(np.linspace(-20, 20, num=11))
+    for u in np.linspace(0, 30, num=10):
+      sols = self.VM.steady_state_sol_vec(sa, u, roll)
+      for i in range(len(sa)):
+        np.testing.assert_allclose(sols[i], self.VM.steady_state_sol(sa[i], u, roll[i])[:, 0])
+
+    u = np.linspace(1, 30, num=11)
+    curv = self.VM.calc_curvature(sa, u, roll)
+    for i in range(len(sa)):
+      assert curv[i] == pytest.approx(self.VM.calc_curvature(sa[i], u[i], roll[i]))
+    np.testing.assert_allclose(self.VM.get_steer_from_curvature(curv, u, roll), sa, atol=1e-12)
+
+  def test_params_update(self):
+    """Cached values follow the parameters"""
+    yr = self.VM.yaw_rate(0.1, 20., 0.)
+    sol = self.VM.steady_state_sol(0.1, 20., 0.)
+
+    self.VM.update_params(0.8, self.VM.sR * 1.2)
+    assert self.VM.yaw_rate(0.1, 20., 0.) != pytest.approx(yr)
+    assert not np.allclose(self.VM.steady_state_sol(0.1, 20., 0.), sol)
+    _, yr1 = dyn_ss_sol(0.1, 20., 0., self.VM)
+    assert float(yr1[0]) == pytest.approx(self.VM.yaw_rate(0.1, 20., 0.))
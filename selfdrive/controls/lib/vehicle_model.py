@@ -11,6 +11,9 @@ The system is defined by
 x_dot = A*x + B*u
 
 A depends on longitudinal speed, u [m/s], and vehicle parameters CP
+
+The methods of VehicleModel also take arrays of samples, the steady state
+solution of many samples is computed by steady_state_sol_vec
 """
 
 import numpy as np
@@ -37,14 +40,38 @@ class VehicleModel:
 
     self.cF_orig: float = CP.tireStiffnessFront
     self.cR_orig: float = CP.tireStiffnessRear
+    self.params: tuple[float, float] | None = None
     self.update_params(1.0, CP.steerRatio)
 
   def update_params(self, stiffness_factor: float, steer_ratio: float) -> None:
     """Update the vehicle model with a new stiffness factor and steer ratio"""
+    if (stiffness_factor, steer_ratio) == self.params:
+      return
+    self.params = (stiffness_factor, steer_ratio)
     self.cF: float = stiffness_factor * self.cF_orig
     self.cR: float = stiffness_factor * self.cR_orig
     self.sR: float = steer_ratio
 
+    # only change with the parameters, the steady state gain is cached for the last speed
+    self.sf: float = calc_slip_factor(self)
+    self._ss_gain_u: float | None = None
+    self._ss_gain = np.zeros((2, 2))
+
+  def dyn_ss_gain(self, u: float) -> np.ndarray:
+    """Returns -A^{-1} B, the steady state solution per input, cached until the speed or the parameters change
+
+    Args:
+      u: Speed [m/s]
+
+    Returns:
+      2x2 matrix, the steady state solution is this times [steering angle, roll]
+    """
+    if u != self._ss_gain_u:
+      A, B = create_dyn_state_matrices(u, self)
+      self._ss_gain = -solve(A, B)
+      self._ss_gain_u = u
+    return self._ss_gain
+
   def steady_state_sol(self, sa: float, u: float, roll: float) -> np.ndarray:
     """Returns the steady state solution.
 
@@ -64,6 +91,23 @@ class VehicleModel:
     else:
       return kin_ss_sol(sa, u, self)
 
+  def steady_state_sol_vec(self, sa: np.ndarray, u: np.ndarray, roll: np.ndarray) -> np.ndarray:
+    """Returns the steady state solutions of arrays of samples, see steady_state_sol
+
+    Args:
+      sa: Steering wheel angle [rad]
+      u: Speed [m/s]
+      roll: Road Roll [rad]
+
+    Returns:
+      Nx2 array with steady state solutions (lateral speed, rotational speed)
+    """
+    sa, u, roll = np.broadcast_arrays(np.asarray(sa, dtype=float), np.asarray(u, dtype=float), np.asarray(roll, dtype=float))
+    dyn = u > 0.1
+    # the dynamic model is undefined at low speed, those samples are solved at any valid speed and replaced
+    sol = dyn_ss_sol_vec(sa, np.where(dyn, u, 1.), roll, self)
+    return np.where(dyn[..., None], sol, kin_ss_sol_vec(sa, u, self))
+
   def calc_curvature(self, sa: float, u: float, roll: float) -> float:
     """Returns the curvature. Multiplied by the speed this will give the yaw rate.
 
@@ -87,8 +131,7 @@ class VehicleModel:
     Returns:
       Curvature factor [1/m]
     """
-    sf = calc_slip_factor(self)
-    return (1. - self.chi) / (1. - sf * u**2) / self.l
+    return (1. - self.chi) / (1. - self.sf * u**2) / self.l
 
   def get_steer_from_curvature(self, curv: float, u: float, roll: float) -> float:
     """Calculates the required steering wheel angle for a given curvature
@@ -114,12 +157,10 @@ class VehicleModel:
     Returns:
       Roll compensation curvature [rad]
     """
-    sf = calc_slip_factor(self)
-
-    if abs(sf) < 1e-6:
-      return 0
+    if abs(self.sf) < 1e-6:
+      return 0 * roll
     else:
-      return (ACCELERATION_DUE_TO_GRAVITY * roll) / ((1 / sf) - u**2)
+      return (ACCELERATION_DUE_TO_GRAVITY * roll) / ((1 / self.sf) - u**2)
 
   def get_steer_from_yaw_rate(self, yaw_rate: float, u: float, roll: float) -> float:
     """Calculates the required steering wheel angle for a given yaw_rate
@@ -168,6 +209,12 @@ def kin_ss_sol(sa: float, u: float, VM: VehicleModel) -> np.ndarray:
   return K * sa
 
 
+def kin_ss_sol_vec(sa: np.ndarray, u: np.ndarray, VM: VehicleModel) -> np.ndarray:
+  """kin_ss_sol of arrays of samples, returns an Nx2 array"""
+  sa, u = np.broadcast_arrays(np.asarray(sa, dtype=float), np.asarray(u, dtype=float))
+  return np.stack([VM.aR / VM.sR / VM.l * u * sa, 1. / VM.sR / VM.l * u * sa], axis=-1)
+
+
 def create_dyn_state_matrices(u: float, VM: VehicleModel) -> tuple[np.ndarray, np.ndarray]:
   """Returns the A and B matrix for the dynamics system
 
@@ -205,6 +252,18 @@ def create_dyn_state_matrices(u: float, VM: VehicleModel) -> tuple[np.ndarray, n
   return A, B
 
 
+def create_dyn_state_matrices_vec(u: np.ndarray, VM: VehicleModel) -> tuple[np.ndarray, np.ndarray]:
+  """create_dyn_state_matrices of an array of speeds, returns Nx2x2 A matrices and the 2x2 B matrix they share"""
+  u = np.asarray(u, dtype=float)
+  A = np.empty(u.shape + (2, 2))
+  A[..., 0, 0] = - (VM.cF + VM.cR) / (VM.m * u)
+  A[..., 0, 1] = - (VM.cF * VM.aF - VM.cR * VM.aR) / (VM.m * u) - u
+  A[..., 1, 0] = - (VM.cF * VM.aF - VM.cR * VM.aR) / (VM.j * u)
+  A[..., 1, 1] = - (VM.cF * VM.aF**2 + VM.cR * VM.aR**2) / (VM.j * u)
+  _, B = create_dyn_state_matrices(1., VM)
+  return A, B
+
+
 def dyn_ss_sol(sa: float, u: float, roll: float, VM: VehicleModel) -> np.ndarray:
   """Calculate the steady state solution when x_dot = 0,
   Ax + Bu = 0 => x = -A^{-1} B u
@@ -218,9 +277,20 @@ def dyn_ss_sol(sa: float, u: float, roll: float, VM: VehicleModel) -> np.ndarray
   Returns:
     2x1 matrix with steady state solution
   """
-  A, B = create_dyn_state_matrices(u, VM)
   inp = np.array([[sa], [roll]])
-  return -solve(A, B) @ inp  # type: ignore
+  return VM.dyn_ss_gain(u) @ inp  # type: ignore
+
+
+def dyn_ss_sol_vec(sa: np.ndarray, u: np.ndarray, roll: np.ndarray, VM: VehicleModel) -> np.ndarray:
+  """dyn_ss_sol of arrays of samples, returns an Nx2 array"""
+  sa, u, roll = np.broadcast_arrays(np.asarray(sa, dtype=float), np.asarray(u, dtype=float), np.asarray(roll, dtype=float))
+  A, B = create_dyn_state_matrices_vec(u, VM)
+  # A^{-1} of all samples in closed form, it's 2x2
+  det = A[..., 0, 0] * A[..., 1, 1] - A[..., 0, 1] * A[..., 1, 0]
+  inp = np.tensordot(B, np.stack([sa, roll]), axes=1)
+  x0 = -(A[..., 1, 1] * inp[0] - A[..., 0, 1] * inp[1]) / det
+  x1 = -(A[..., 0, 0] * inp[1] - A[..., 1, 0] * inp[0]) / det
+  return np.stack([x0, x1], axis=-1)
 
 
 def calc_slip_factor(VM: VehicleModel) -> float:
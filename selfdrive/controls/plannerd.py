@@ -5,9 +5,23 @@ from openpilot.common.realtime import Priority, config_realtime_process
 from openpilot.common.swaglog import cloudlog
 from openpilot.selfdrive.controls.lib.ldw import LaneDepartureWarning
 from openpilot.selfdrive.controls.lib.longitudinal_planner import LongitudinalPlanner
+from openpilot.selfdrive.controls.lib.solve_budget import MPC_SOLVE_BUDGET
 import cereal.messaging as messaging
 
 
+def step(sm: messaging.SubMaster, pm: messaging.PubMaster, longitudinal_planner: LongitudinalPlanner, ldw: LaneDepartureWarning) -> None:
+  if sm.updated['modelV2']:
+    longitudinal_planner.update(sm)
+    longitudinal_planner.publish(sm, pm)
+
+    ldw.update(sm.frame, sm['modelV2'], sm['carState'], sm['carControl'])
+    msg = messaging.new_message('driverAssistance')
+    msg.valid = sm.all_checks(['carState', 'carControl', 'modelV2', 'liveParameters'])
+    msg.driverAssistance.leftLaneDeparture = ldw.left
+    msg.driverAssistance.rightLaneDeparture = ldw.right
+    pm.send('driverAssistance', msg)
+
+
 def main():
   config_realtime_process(5, Priority.CTRL_LOW)
 
@@ -17,23 +31,14 @@ def main():
   cloudlog.info("plannerd got CarParams: %s", CP.brand)
 
   ldw = LaneDepartureWarning()
-  longitudinal_planner = LongitudinalPlanner(CP)
+  longitudinal_planner = LongitudinalPlanner(CP, mpc_budget=MPC_SOLVE_BUDGET)
   pm = messaging.PubMaster(['longitudinalPlan', 'driverAssistance'])
   sm = messaging.SubMaster(['carControl', 'carState', 'controlsState', 'liveParameters', 'radarState', 'modelV2', 'selfdriveState'],
                            poll='modelV2', ignore_avg_freq=['radarState'])
 
   while True:
     sm.update()
-    if sm.updated['modelV2']:
-      longitudinal_planner.update(sm)
-      longitudinal_planner.publish(sm, pm)
-
-      ldw.update(sm.frame, sm['modelV2'], sm['carState'], sm['carControl'])
-      msg = messaging.new_message('driverAssistance')
-      msg.valid = sm.all_checks(['carState', 'carControl', 'modelV2', 'liveParameters'])
-      msg.driverAssistance.leftLaneDeparture = ldw.left
-      msg.driverAssistance.rightLaneDeparture = ldw.right
-      pm.send('driverAssistance', msg)
+    step(sm, pm, longitudinal_planner, ldw)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-import math
 import numpy as np
 from collections import deque
 from typing import Any
@@ -9,14 +8,14 @@ from cereal import messaging, log, car
 from openpilot.common.params import Params
 from openpilot.common.realtime import DT_MDL, Priority, config_realtime_process
 from openpilot.common.swaglog import cloudlog
-from openpilot.common.simple_kalman import KF1D
 
 
 # Default lead acceleration decay set to 50% at 1s
 _LEAD_ACCEL_TAU = 1.5
 
 # radar tracks
-SPEED, ACCEL = 0, 1     # Kalman filter states enum
+V_LEAD_K, A_LEAD_K, A_LEAD_TAU, CNT = 0, 1, 2, 3  # track state columns, the first two are the Kalman filter states
+D_REL, Y_REL, V_REL, MEASURED = 0, 1, 2, 3        # track measurement columns
 
 # stationary qualification parameters
 V_EGO_STATIONARY = 4.   # no stationary object flag below this speed
@@ -47,97 +46,128 @@ class KalmanParams:
     self.K = [[np.interp(dt, dts, K0)], [np.interp(dt, dts, K1)]]
 
 
-class Track:
-  def __init__(self, identifier: int, v_lead: float, kalman_params: KalmanParams):
-    self.identifier = identifier
-    self.cnt = 0
-    self.aLeadTau = _LEAD_ACCEL_TAU
-    self.K_A = kalman_params.A
-    self.K_C = kalman_params.C
-    self.K_K = kalman_params.K
-    self.kf = KF1D([[v_lead], [0.0]], self.K_A, self.K_C, self.K_K)
-
-  def update(self, d_rel: float, y_rel: float, v_rel: float, v_lead: float, measured: float):
-    # relative values, copy
-    self.dRel = d_rel   # LONG_DIST
-    self.yRel = y_rel   # -LAT_DIST
-    self.vRel = v_rel   # REL_SPEED
-    self.vLead = v_lead
-    self.measured = measured   # measured or estimate
+class Tracks:
+  """
+  Struct-of-arrays table of the radar tracks, in the order they were first seen.
+  Each track has a 2-state Kalman filter of the lead speed and acceleration, all filters are updated together.
+  """
+  def __init__(self, kalman_params: KalmanParams):
+    A, C, K = kalman_params.A, kalman_params.C, kalman_params.K
+    # same constant gain update as KF1D: x = (A - K C) x + K meas
+    self.A_K = [A[0][0] - K[0][0] * C[0], A[0][1] - K[0][0] * C[1], A[1][0] - K[1][0] * C[0], A[1][1] - K[1][0] * C[1]]
+    self.K = [K[0][0], K[1][0]]
+
+    self.identifier: list[int] = []
+    # one row per track: [vLeadK, aLeadK, aLeadTau, cnt]
+    self.state = np.zeros((0, 4))
+    # one row per track: [dRel, yRel, vRel, measured], relative values are LONG_DIST, -LAT_DIST, REL_SPEED
+    self.pts = np.zeros((0, 4))
+    self.vLead = np.zeros(0)
+
+  def __len__(self) -> int:
+    return len(self.identifier)
+
+  @property
+  def dRel(self) -> np.ndarray:
+    return self.pts[:, D_REL]
+
+  @property
+  def yRel(self) -> np.ndarray:
+    return self.pts[:, Y_REL]
+
+  @property
+  def vRel(self) -> np.ndarray:
+    return self.pts[:, V_REL]
+
+  def update(self, ar_pts: dict[int, tuple[float, float, float, bool]], v_ego: float):
+    """ar_pts are the [dRel, yRel, vRel, measured] of each track id, v_ego is aligned with the radar measurement"""
+    ids = list(ar_pts.keys())
+    pts = np.array(list(ar_pts.values()), dtype=np.float64).reshape(-1, 4)
+
+    if ids != self.identifier:
+      # remove missing points
+      keep = [i in ar_pts for i in self.identifier]
+      kept = [i for i, k in zip(self.identifier, keep, strict=True) if k]
+
+      # new tracks are appended in the order of the points, filters start at the measured speed and no acceleration
+      kept_set = set(kept)
+      new = [n for n, i in enumerate(ids) if i not in kept_set]
+      init = np.zeros((len(new), 4))
+      init[:, V_LEAD_K] = pts[new, V_REL] + v_ego
+      init[:, A_LEAD_TAU] = _LEAD_ACCEL_TAU
+
+      self.identifier = kept + [ids[n] for n in new]
+      self.state = np.concatenate((self.state[keep], init))
+      pos = {i: n for n, i in enumerate(ids)}
+      pts = pts[[pos[i] for i in self.identifier]]
+
+    self.pts = pts
+    self.vLead = pts[:, V_REL] + v_ego
 
     # computed velocity and accelerations
-    if self.cnt > 0:
-      self.kf.update(self.vLead)
-
-    self.vLeadK = float(self.kf.x[SPEED][0])
-    self.aLeadK = float(self.kf.x[ACCEL][0])
+    updated = self.state[:, CNT] > 0
+    x0, x1 = self.state[:, V_LEAD_K], self.state[:, A_LEAD_K]
+    v_lead_k = self.A_K[0] * x0 + self.A_K[1] * x1 + self.K[0] * self.vLead
+    a_lead_k = self.A_K[2] * x0 + self.A_K[3] * x1 + self.K[1] * self.vLead
+    np.copyto(x0, v_lead_k, where=updated)
+    np.copyto(x1, a_lead_k, where=updated)
 
     # Learn if constant acceleration
-    if abs(self.aLeadK) < 0.5:
-      self.aLeadTau = _LEAD_ACCEL_TAU
-    else:
-      self.aLeadTau *= 0.9
+    a_lead_tau = self.state[:, A_LEAD_TAU]
+    a_lead_tau *= 0.9
+    a_lead_tau[np.abs(x1) < 0.5] = _LEAD_ACCEL_TAU
 
-    self.cnt += 1
+    self.state[:, CNT] += 1
 
-  def reset_a_lead(self, aLeadK: float, aLeadTau: float):
-    self.kf = KF1D([[self.vLead], [aLeadK]], self.K_A, self.K_C, self.K_K)
-    self.aLeadK = aLeadK
-    self.aLeadTau = aLeadTau
-
-  def get_RadarState(self, model_prob: float = 0.0):
+  def get_RadarState(self, idx: int, model_prob: float = 0.0):
     return {
-      "dRel": float(self.dRel),
-      "yRel": float(self.yRel),
-      "vRel": float(self.vRel),
-      "vLead": float(self.vLead),
-      "vLeadK": float(self.vLeadK),
-      "aLeadK": float(self.aLeadK),
-      "aLeadTau": float(self.aLeadTau),
+      "dRel": float(self.dRel[idx]),
+      "yRel": float(self.yRel[idx]),
+      "vRel": float(self.vRel[idx]),
+      "vLead": float(self.vLead[idx]),
+      "vLeadK": float(self.state[idx, V_LEAD_K]),
+      "aLeadK": float(self.state[idx, A_LEAD_K]),
+      "aLeadTau": float(self.state[idx, A_LEAD_TAU]),
       "status": True,
       "fcw": self.is_potential_fcw(model_prob),
       "modelProb": model_prob,
       "radar": True,
-      "radarTrackId": self.identifier,
+      "radarTrackId": self.identifier[idx],
     }
 
-  def potential_low_speed_lead(self, v_ego: float):
+  def potential_low_speed_lead(self, v_ego: float) -> np.ndarray:
     # stop for stuff in front of you and low speed, even without model confirmation
     # Radar points closer than 0.75, are almost always glitches on toyota radars
-    return abs(self.yRel) < 1.0 and (v_ego < V_EGO_STATIONARY) and (0.75 < self.dRel < 25)
+    if v_ego >= V_EGO_STATIONARY:
+      return np.zeros(len(self), dtype=bool)
+    return (np.abs(self.yRel) < 1.0) & (0.75 < self.dRel) & (self.dRel < 25)
 
   def is_potential_fcw(self, model_prob: float):
     return model_prob > .9
 
-  def __str__(self):
-    ret = f"x: {self.dRel:4.1f}  y: {self.yRel:4.1f}  v: {self.vRel:4.1f}  a: {self.aLeadK:4.1f}"
-    return ret
-
 
-def laplacian_pdf(x: float, mu: float, b: float):
+def laplacian_pdf(x: np.ndarray, mu: float, b: float) -> np.ndarray:
   b = max(b, 1e-4)
-  return math.exp(-abs(x-mu)/b)
+  return np.exp(-np.abs(x-mu)/b)
 
 
-def match_vision_to_track(v_ego: float, lead: capnp._DynamicStructReader, tracks: dict[int, Track]):
+def match_vision_to_track(v_ego: float, lead: capnp._DynamicStructReader, tracks: Tracks) -> int | None:
   offset_vision_dist = lead.x[0] - RADAR_TO_CAMERA
 
-  def prob(c):
-    prob_d = laplacian_pdf(c.dRel, offset_vision_dist, lead.xStd[0])
-    prob_y = laplacian_pdf(c.yRel, -lead.y[0], lead.yStd[0])
-    prob_v = laplacian_pdf(c.vRel + v_ego, lead.v[0], lead.vStd[0])
+  prob_d = laplacian_pdf(tracks.dRel, offset_vision_dist, lead.xStd[0])
+  prob_y = laplacian_pdf(tracks.yRel, -lead.y[0], lead.yStd[0])
+  prob_v = laplacian_pdf(tracks.vRel + v_ego, lead.v[0], lead.vStd[0])
 
-    # This isn't exactly right, but it's a good heuristic
-    return prob_d * prob_y * prob_v
-
-  track = max(tracks.values(), key=prob)
+  # This isn't exactly right, but it's a good heuristic
+  idx = int(np.argmax(prob_d * prob_y * prob_v))
 
   # if no 'sane' match is found return -1
   # stationary radar points can be false positives
-  dist_sane = abs(track.dRel - offset_vision_dist) < max([(offset_vision_dist)*.25, 5.0])
-  vel_sane = (abs(track.vRel + v_ego - lead.v[0]) < 10) or (v_ego + track.vRel > 3)
+  d_rel, v_rel = float(tracks.dRel[idx]), float(tracks.vRel[idx])
+  dist_sane = abs(d_rel - offset_vision_dist) < max([(offset_vision_dist)*.25, 5.0])
+  vel_sane = (abs(v_rel + v_ego - lead.v[0]) < 10) or (v_ego + v_rel > 3)
   if dist_sane and vel_sane:
-    return track
+    return idx
   else:
     return None
 
@@ -160,7 +190,7 @@ def get_RadarState_from_vision(lead_msg: capnp._DynamicStructReader, v_ego: floa
   }
 
 
-def get_lead(v_ego: float, ready: bool, tracks: dict[int, Track], lead_msg: capnp._DynamicStructReader,
+def get_lead(v_ego: float, ready: bool, tracks: Tracks, lead_msg: capnp._DynamicStructReader,
              model_v_ego: float, low_speed_override: bool = True) -> dict[str, Any]:
   # Determine leads, this is where the essential logic happens
   if len(tracks) > 0 and ready and lead_msg.prob > .5:
@@ -170,18 +200,18 @@ def get_lead(v_ego: float, ready: bool, tracks: dict[int, Track], lead_msg: capn
 
   lead_dict = {'status': False}
   if track is not None:
-    lead_dict = track.get_RadarState(lead_msg.prob)
+    lead_dict = tracks.get_RadarState(track, lead_msg.prob)
   elif (track is None) and ready and (lead_msg.prob > .5):
     lead_dict = get_RadarState_from_vision(lead_msg, v_ego, model_v_ego)
 
   if low_speed_override:
-    low_speed_tracks = [c for c in tracks.values() if c.potential_low_speed_lead(v_ego)]
+    low_speed_tracks = np.flatnonzero(tracks.potential_low_speed_lead(v_ego))
     if len(low_speed_tracks) > 0:
-      closest_track = min(low_speed_tracks, key=lambda c: c.dRel)
+      closest_track = int(low_speed_tracks[np.argmin(tracks.dRel[low_speed_tracks])])
 
       # Only choose new track if it is actually closer than the previous one
-      if (not lead_dict['status']) or (closest_track.dRel < lead_dict['dRel']):
-        lead_dict = closest_track.get_RadarState()
+      if (not lead_dict['status']) or (tracks.dRel[closest_track] < lead_dict['dRel']):
+        lead_dict = tracks.get_RadarState(closest_track)
 
   return lead_dict
 
@@ -190,8 +220,8 @@ class RadarD:
   def __init__(self, delay: float = 0.0):
     self.current_time = 0.0
 
-    self.tracks: dict[int, Track] = {}
     self.kalman_params = KalmanParams(DT_MDL)
+    self.tracks = Tracks(self.kalman_params)
 
     self.v_ego = 0.0
     self.v_ego_hist = deque([0.0], maxlen=int(round(delay / DT_MDL))+1)
@@ -213,24 +243,11 @@ class RadarD:
 
     ar_pts = {}
     for pt in rr.points:
-      ar_pts[pt.trackId] = [pt.dRel, pt.yRel, pt.vRel, pt.measured]
-
-    # *** remove missing points from meta data ***
-    for ids in list(self.tracks.keys()):
-      if ids not in ar_pts:
-        self.tracks.pop(ids, None)
+      ar_pts[pt.trackId] = (pt.dRel, pt.yRel, pt.vRel, pt.measured)
 
     # *** compute the tracks ***
-    for ids in ar_pts:
-      rpt = ar_pts[ids]
-
-      # align v_ego by a fixed time to align it with the radar measurement
-      v_lead = rpt[2] + self.v_ego_hist[0]
-
-      # create the track if it doesn't exist or it's a new track
-      if ids not in self.tracks:
-        self.tracks[ids] = Track(ids, v_lead, self.kalman_params)
-      self.tracks[ids].update(rpt[0], rpt[1], rpt[2], v_lead, rpt[3])
+    # align v_ego by a fixed time to align it with the radar measurement
+    self.tracks.update(ar_pts, self.v_ego_hist[0])
 
     # *** publish radarState ***
     self.radar_state_valid = sm.all_checks() and len(rr.errors) == 0
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+import argparse
+import multiprocessing
+import time
+from collections import Counter, defaultdict
+
+import capnp
+import numpy as np
+
+import cereal.messaging as messaging
+from openpilot.selfdrive.controls.lib.drive_helpers import CAR_ROTATION_RADIUS
+from openpilot.selfdrive.controls.lib.lateral_mpc_lib.lat_mpc import LateralMpc, N as LAT_MPC_N
+from openpilot.selfdrive.controls.lib.longitudinal_planner import LongitudinalPlanner
+from openpilot.selfdrive.controls.lib.solve_budget import MPC_SOLVE_BUDGET
+from openpilot.selfdrive.modeld.constants import ModelConstants
+from openpilot.tools.lib.logreader import LogIterable, LogReader
+
+PERCENTILES = (50, 90, 99, 100)
+PLANNER_SERVICES = ['carControl', 'carState', 'controlsState', 'liveParameters', 'radarState', 'modelV2', 'selfdriveState']
+
+
+class SolverStats:
+  """Per-solve telemetry of one MPC, wall time is measured around the whole update so it includes setting parameters"""
+  def __init__(self):
+    self.times: defaultdict[str, list[float]] = defaultdict(list)
+    self.qp_iterations: Counter[int] = Counter()
+    self.status: Counter[int] = Counter()
+    self.fallbacks = 0
+
+  def add(self, mpc, wall_time: float) -> None:
+    if mpc.fallback:
+      self.fallbacks += 1
+      return
+    self.times['solve'].append(mpc.solve_time)
+    self.times['wall'].append(wall_time)
+    self.times['overhead'].append(wall_time - mpc.solve_time)
+    self.qp_iterations[mpc.qp_iterations] += 1
+    self.status[mpc.solution_status] += 1
+
+  def report(self, name: str) -> str:
+    lines = [f"{name} ({len(self.times['solve'])} solves, {self.fallbacks} fallbacks)", "  time (ms):"]
+    for k, times in self.times.items():
+      ms = np.array(times) * 1e3
+      lines.append(f"    {k:<10} " + " ".join(f"{f'p{p}' if p < 100 else 'max'}: {np.percentile(ms, p):7.3f}" for p in PERCENTILES))
+    lines.append("  qp iterations: " + ", ".join(f"{k}: {n}" for k, n in sorted(self.qp_iterations.items())))
+    lines.append("  solution status: " + ", ".join(f"{k}: {n}" for k, n in sorted(self.status.items())))
+    return "\n".join(lines)
+
+
+def get_lat_mpc_inputs(model, v_ego: float) -> tuple[np.ndarray, ...]:
+  t_idxs = ModelConstants.T_IDXS[:LAT_MPC_N + 1]
+  y_pts = np.interp(t_idxs, model.position.t, model.position.y)
+  heading_pts = np.interp(t_idxs, model.orientation.t, model.orientation.z)
+  yaw_rate_pts = np.interp(t_idxs, model.orientationRate.t, model.orientationRate.z)
+  x0 = np.array([0., 0., 0., yaw_rate_pts[0]])
+  p = np.column_stack([max(v_ego, 0.) * np.ones(LAT_MPC_N + 1), CAR_ROTATION_RADIUS * np.ones(LAT_MPC_N + 1)])
+  return x0, p, y_pts, heading_pts, yaw_rate_pts
+
+
+def burn_cpu() -> None:
+  while True:
+    pass
+
+
+def run(lr: LogIterable, budget: float | None = None) -> dict[str, SolverStats]:
+  """Replays the recorded planner inputs through LongitudinalPlanner and LateralMpc, one solve of each per modelV2"""
+  msgs = sorted(lr, key=lambda m: m.logMonoTime)
+  CP = next(m.carParams for m in msgs if m.which() == 'carParams')
+
+  planner = LongitudinalPlanner(CP, mpc_budget=budget)
+  lat_mpc = LateralMpc(budget=budget)
+  lat_mpc.set_weights(1., .1, 0.0, .05, 800)
+  sm = messaging.SubMaster(PLANNER_SERVICES, poll='modelV2', ignore_avg_freq=['radarState'])
+
+  stats = {'longitudinal': SolverStats(), 'lateral': SolverStats()}
+  pending: dict[str, capnp._DynamicStructReader] = {}
+  for msg in msgs:
+    if msg.which() not in PLANNER_SERVICES:
+      continue
+    pending[msg.which()] = msg
+    if msg.which() != 'modelV2':
+      continue
+
+    sm.update_msgs(msg.logMonoTime * 1e-9, list(pending.values()))
+    pending.clear()
+
+    st = time.perf_counter()
+    planner.update(sm)
+    stats['longitudinal'].add(planner.mpc, time.perf_counter() - st)
+
+    st = time.perf_counter()
+    lat_mpc.run(*get_lat_mpc_inputs(sm['modelV2'], sm['carState'].vEgo))
+    stats['lateral'].add(lat_mpc, time.perf_counter() - st)
+  return stats
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Solve time, QP iterations and solution status of the MPCs over the planner inputs of a route")
+  parser.add_argument("route", help="The route or segment to replay")
+  parser.add_argument("--budget", type=float, help=f"Solve time budget per cycle in seconds, plannerd uses {MPC_SOLVE_BUDGET}")
+  parser.add_argument("--load", type=int, default=0, help="Number of busy processes to run next to the MPCs")
+  args = parser.parse_args()
+
+  lr = list(LogReader(args.route))
+  load = [multiprocessing.Process(target=burn_cpu, daemon=True) for _ in range(args.load)]
+  for p in load:
+    p.start()
+  try:
+    stats = run(lr, args.budget)
+  finally:
+    for p in load:
+      p.terminate()
+
+  for name, s in stats.items():
+    print(s.report(name))
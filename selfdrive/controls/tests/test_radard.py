@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from cereal import log
+from openpilot.common.realtime import DT_MDL
+from openpilot.selfdrive.controls.radard import _LEAD_ACCEL_TAU, A_LEAD_K, A_LEAD_TAU, CNT, RADAR_TO_CAMERA, V_LEAD_K, KalmanParams, Tracks, \
+                                                get_lead, match_vision_to_track
+
+
+def get_tracks(ar_pts: dict[int, tuple[float, float, float, bool]], v_ego: float) -> Tracks:
+  tracks = Tracks(KalmanParams(DT_MDL))
+  tracks.update(ar_pts, v_ego)
+  return tracks
+
+
+def get_lead_msg(prob: float, x: float, y: float, v: float):
+  return log.ModelDataV2.LeadDataV3.new_message(prob=prob, x=[x], xStd=[1.], y=[y], yStd=[0.5], v=[v], vStd=[1.], a=[0.5])
+
+
+class TestTracks:
+  def test_update(self):
+    tracks = Tracks(KalmanParams(DT_MDL))
+    tracks.update({3: (20., 1., -2., True), 1: (40., 0., 0., True)}, 10.)
+    # new tracks start at the measured speed, without filtering
+    assert tracks.identifier == [3, 1]
+    np.testing.assert_array_equal(tracks.state, [[8., 0., _LEAD_ACCEL_TAU, 1], [10., 0., _LEAD_ACCEL_TAU, 1]])
+    np.testing.assert_array_equal(tracks.vLead, [8., 10.])
+
+    # track 3 is gone, 7 is new and comes after the tracks seen before, whatever the order of the points
+    tracks.update({7: (30., -1., 5., False), 1: (39.5, 0.5, 0., True)}, 10.)
+    assert tracks.identifier == [1, 7]
+    np.testing.assert_array_equal(tracks.dRel, [39.5, 30.])
+    np.testing.assert_array_equal(tracks.yRel, [0.5, -1.])
+    np.testing.assert_array_equal(tracks.state[:, CNT], [2, 1])
+    np.testing.assert_allclose(tracks.state[:, V_LEAD_K], [10., 15.])
+
+    # a lead 1 m/s faster than its filtered speed, with the gains of a 20 Hz filter
+    tracks.update({1: (39.5, 0.5, 1., True), 7: (30., -1., 5., False)}, 10.)
+    assert tracks.state[0, V_LEAD_K] == pytest.approx(10.1988689)
+    assert tracks.state[0, A_LEAD_K] == pytest.approx(0.28555364)
+    assert tracks.state[0, A_LEAD_TAU] == _LEAD_ACCEL_TAU
+    np.testing.assert_allclose(tracks.state[1, [V_LEAD_K, A_LEAD_K, A_LEAD_TAU]], [15., 0., _LEAD_ACCEL_TAU], atol=1e-9)
+
+    # accelerating by more than 0.5 m/s^2, the acceleration decays slower
+    tracks.update({1: (39.5, 0.5, 1., True), 7: (30., -1., 5., False)}, 10.)
+    assert tracks.state[0, V_LEAD_K] == pytest.approx(10.3724666)
+    assert tracks.state[0, A_LEAD_K] == pytest.approx(0.5143195)
+    assert tracks.state[0, A_LEAD_TAU] == pytest.approx(0.9 * _LEAD_ACCEL_TAU)
+
+  def test_random_updates(self):
+    rng = np.random.default_rng(0)
+    tracks = Tracks(KalmanParams(DT_MDL))
+    for _ in range(500):
+      ids = rng.choice(32, rng.integers(20), replace=False)
+      ar_pts = {int(i): (rng.uniform(0, 100), rng.uniform(-5, 5), rng.uniform(-10, 10), bool(rng.random() > 0.5)) for i in ids}
+      prev = tracks.identifier
+      tracks.update(ar_pts, rng.uniform(0, 30))
+      # tracks keep their first-seen order, each row has the measurement of its id
+      assert sorted(tracks.identifier) == sorted(ar_pts)
+      assert tracks.identifier[:len(set(prev) & set(ar_pts))] == [i for i in prev if i in ar_pts]
+      np.testing.assert_array_equal(tracks.dRel, [ar_pts[i][0] for i in tracks.identifier])
+      assert np.isfinite(tracks.state).all()
+
+
+class TestLeads:
+  # tracks 1 and 2 are at the same distance, only 2 is where the vision lead is
+  AR_PTS = {1: (30., 3., 0., True), 2: (30., -0.5, 0., True), 3: (60., -0.5, 0., True)}
+
+  def test_match_vision_to_track(self):
+    tracks = get_tracks(self.AR_PTS, 10.)
+    assert match_vision_to_track(10., get_lead_msg(0.75, 30. + RADAR_TO_CAMERA, 0.5, 10.), tracks) == 1
+    assert match_vision_to_track(10., get_lead_msg(0.75, 60. + RADAR_TO_CAMERA, 0.5, 10.), tracks) == 2
+
+    # too far from any track
+    assert match_vision_to_track(10., get_lead_msg(0.75, 90. + RADAR_TO_CAMERA, 0.5, 10.), tracks) is None
+    # a stationary track doesn't match a moving lead
+    tracks = get_tracks(self.AR_PTS, 0.)
+    assert match_vision_to_track(0., get_lead_msg(0.75, 30. + RADAR_TO_CAMERA, 0.5, 15.), tracks) is None
+
+  def test_get_lead(self):
+    tracks = get_tracks(self.AR_PTS, 10.)
+    lead_msg = get_lead_msg(0.75, 30. + RADAR_TO_CAMERA, 0.5, 10.)
+    assert get_lead(10., False, tracks, lead_msg, 10.) == {'status': False}
+    assert get_lead(10., True, tracks, get_lead_msg(0.25, 30. + RADAR_TO_CAMERA, 0.5, 10.), 10.) == {'status': False}
+
+    lead = get_lead(10., True, tracks, lead_msg, 10.)
+    assert lead['status'] and lead['radar']
+    assert (lead['radarTrackId'], lead['dRel'], lead['yRel'], lead['vLead'], lead['modelProb'], lead['fcw']) == (2, 30., -0.5, 10., 0.75, False)
+
+    # without a matching track, the lead comes from vision
+    lead = get_lead(10., True, tracks, get_lead_msg(0.75, 90. + RADAR_TO_CAMERA, 0.5, 12.), 11.)
+    assert lead['status'] and not lead['radar']
+    assert lead['dRel'] == pytest.approx(90.)
+    assert (lead['radarTrackId'], lead['yRel'], lead['vRel'], lead['vLead'], lead['aLeadK']) == (-1, -0.5, 1., 11., 0.5)
+
+  def test_low_speed_override(self):
+    # only tracks close in front count, the closest one is the lead
+    ar_pts = {1: (10., 0.5, 0., True), 2: (5., 3., 0., True), 3: (0.5, 0., 0., True), 4: (8., 0., 0., True), 5: (30., 0., 0., True)}
+    tracks = get_tracks(ar_pts, 2.)
+    lead = get_lead(2., True, tracks, get_lead_msg(0., 0., 0., 0.), 2.)
+    assert lead['status'] and lead['radarTrackId'] == 4 and lead['modelProb'] == 0.
+    assert get_lead(2., True, tracks, get_lead_msg(0., 0., 0., 0.), 2., low_speed_override=False) == {'status': False}
+    # not above the stationary speed
+    assert get_lead(5., True, tracks, get_lead_msg(0., 0., 0., 0.), 5.) == {'status': False}
+
+    # a matched lead further away is overridden by the closest track
+    lead = get_lead(2., True, tracks, get_lead_msg(0.75, 30. + RADAR_TO_CAMERA, 0., 2.), 2.)
+    assert lead['radarTrackId'] == 4
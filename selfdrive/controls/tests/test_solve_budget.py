@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+
+from cereal import log
+from openpilot.selfdrive.controls.lib.longitudinal_mpc_lib.long_mpc import QP_ITER_MAX, LongitudinalMpc
+from openpilot.selfdrive.controls.lib.solve_budget import MAX_FALLBACKS, MPC_SOLVE_BUDGET, SolveBudget
+from openpilot.selfdrive.test.longitudinal_maneuvers.plant import Plant
+
+EventName = log.OnroadEvent.EventName
+
+
+def burn_cpu(seconds: float) -> None:
+  st = time.monotonic()
+  while time.monotonic() - st < seconds:
+    pass
+
+
+class TestSolveBudget:
+  def test_caps_qp_iterations(self):
+    budget = SolveBudget(1 / 16, 10)
+    assert budget.get_qp_iter_max(0.) == 10
+
+    # 1/128s per QP iteration and 1/64s outside of the QP
+    budget.update(1 / 64 + 3 / 128, 3 / 128, 3)
+    assert budget.get_qp_iter_max(0.) == 6
+    assert budget.get_qp_iter_max(1 / 64) == 4
+
+    # slower solves take effect at once, faster ones slowly
+    budget.update(1 / 64 + 2 / 64, 2 / 64, 2)
+    assert budget.get_qp_iter_max(0.) == 3
+    budget.update(1 / 64 + 3 / 128, 3 / 128, 3)
+    assert budget.get_qp_iter_max(0.) == 3
+
+  def test_fallbacks_are_bounded(self):
+    budget = SolveBudget(0.01, 10)
+    budget.update(0.1, 0.05, 1)
+    for _ in range(3):
+      assert [budget.get_qp_iter_max(0.) for _ in range(MAX_FALLBACKS + 1)] == [0] * MAX_FALLBACKS + [1]
+
+  def test_no_fallback_when_invalid(self):
+    budget = SolveBudget(0.01, 10)
+    budget.update(0.1, 0.05, 1)
+    assert [budget.get_qp_iter_max(0., can_fall_back=False) for _ in range(3)] == [1, 1, 1]
+    assert budget.get_qp_iter_max(0.) == 0
+    assert budget.get_qp_iter_max(0., can_fall_back=False) == 1
+    assert budget.get_qp_iter_max(0.) == 0
+
+  def get_loaded_plant(self, monkeypatch) -> Plant:
+    # artificial CPU load, the planner spends the whole budget of every cycle before the MPC gets to solve
+    process_lead = LongitudinalMpc.process_lead
+    def loaded_process_lead(self, lead):
+      burn_cpu(MPC_SOLVE_BUDGET / 2)
+      return process_lead(self, lead)
+    monkeypatch.setattr(LongitudinalMpc, 'process_lead', loaded_process_lead)
+
+    plant = Plant(lead_relevancy=True, speed=20., distance_lead=50.)
+    plant.planner.mpc.budget = SolveBudget(MPC_SOLVE_BUDGET, QP_ITER_MAX)
+    return plant
+
+  def test_loaded_planner(self, monkeypatch):
+    plant = self.get_loaded_plant(monkeypatch)
+    fallbacks = []
+    for _ in range(100):
+      out = plant.step(v_lead=20.)
+      fallbacks.append(plant.planner.mpc.fallback)
+      assert plant.planner.events.names == ([EventName.plannerSolverFallback] if fallbacks[-1] else [])
+      assert np.all(np.isfinite(plant.planner.mpc.x_sol))
+
+    # the first solve has nothing to go by, after that only every third cycle solves
+    assert fallbacks == [False] + ([True] * MAX_FALLBACKS + [False]) * 33
+    assert out["distance_lead"] - out["distance"] > 30.
+    assert abs(out["speed"] - 20.) < 1.
+
+  def test_cut_in_solves(self, monkeypatch):
+    plant = self.get_loaded_plant(monkeypatch)
+    for _ in range(31):
+      plant.step(v_lead=20.)
+    assert not plant.planner.mpc.fallback
+
+    # a lead cutting in 20 m closer, right when the previous plan would be reused
+    plant.distance_lead -= 20.
+    plant.step(v_lead=20.)
+    assert not plant.planner.mpc.fallback
+    assert plant.planner.mpc.qp_iterations > 0
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import argparse
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from openpilot.tools.lib.logreader import LogIterable, LogReader
+
+PERCENTILES = (50, 90, 99, 100)
+
+Node = tuple[str, int]
+
+
+def get_chains(lr: LogIterable, source: str, target: str) -> list[list[tuple[Node, int]]]:
+  """
+  Causal chains from source to target, reconstructed from the lineage recorded with TRACE_LINEAGE=1.
+  Each target message is traced back to the freshest source message it was derived from, a chain is the list
+  of (node, capture time) from target to source, where only the source has a capture time.
+  """
+  inputs: dict[Node, list[Node]] = {}
+  capture_time: dict[Node, int] = {}
+  for msg in lr:
+    node = (msg.which(), msg.logMonoTime)
+    if node[0] == source:
+      capture_time[node] = getattr(getattr(msg, source), 'timestampSof', 0)
+    elif len(msg.lineage):
+      inputs[node] = [(i.service, i.logMonoTime) for i in msg.lineage]
+
+  # inputs are always older than the message, so one pass in time order finds the freshest path to the source
+  freshest: dict[Node, tuple[int, Node | None]] = {node: (node[1], None) for node in capture_time}
+  for node in sorted(inputs, key=lambda n: n[1]):
+    best = max(((freshest[i][0], i) for i in inputs[node] if i in freshest), default=None)
+    if best is not None:
+      freshest[node] = best
+
+  chains = []
+  for node in sorted(n for n in freshest if n[0] == target):
+    chain: list[tuple[Node, int]] = []
+    cur: Node | None = node
+    while cur is not None:
+      chain.append((cur, capture_time.get(cur, 0)))
+      cur = freshest[cur][1]
+    chains.append(chain)
+  return chains
+
+
+def latency_stats(times: list[int]) -> str:
+  ms = np.array(times) / 1e6
+  return " ".join(f"{f'p{p}' if p < 100 else 'max'}: {np.percentile(ms, p):7.2f}" for p in PERCENTILES) + f"  ({len(times)})"
+
+
+def report(chains: list[list[tuple[Node, int]]]) -> str:
+  paths = Counter(" <- ".join(s for (s, _), _ in chain) for chain in chains)
+  hops: defaultdict[str, list[int]] = defaultdict(list)
+  end_to_end: list[int] = []
+  from_capture: list[int] = []
+  for chain in chains:
+    for (child, _), (parent, _) in zip(chain[:-1], chain[1:], strict=True):
+      hops[f"{parent[0]} -> {child[0]}"].append(child[1] - parent[1])
+
+    (target, _), (source, sof) = chain[0], chain[-1]
+    end_to_end.append(target[1] - source[1])
+    if sof > 0:
+      hops[f"{source[0]} capture -> {source[0]}"].append(source[1] - sof)
+      from_capture.append(target[1] - sof)
+
+  lines = ["chains:"]
+  lines += [f"  {n:6d}  {path}" for path, n in paths.most_common()]
+  lines.append("hop latency (ms):")
+  lines += [f"  {hop:<50} {latency_stats(times)}" for hop, times in hops.items()]
+  lines.append("end-to-end latency (ms):")
+  lines.append(f"  {'from publish':<50} {latency_stats(end_to_end)}")
+  if len(from_capture):
+    lines.append(f"  {'from capture':<50} {latency_stats(from_capture)}")
+  return "\n".join(lines)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Per-hop and end-to-end latency between two services of a route logged with TRACE_LINEAGE=1",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("route", help="The route or segment to analyze")
+  parser.add_argument("--source", default="roadCameraState")
+  parser.add_argument("--target", default="carControl")
+  args = parser.parse_args()
+
+  chains = get_chains(LogReader(args.route), args.source, args.target)
+  assert len(chains), f"no {args.target} message derived from {args.source}, was the route logged with TRACE_LINEAGE=1?"
+  print(report(chains))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import argparse
+from collections import defaultdict
+
+import numpy as np
+
+from openpilot.common.stage_timer import BIN_SHIFT, NUM_BINS
+from openpilot.tools.lib.logreader import LogIterable, LogReader
+
+SERVICES = ['controlsdTimings', 'selfdrivedTimings', 'cardTimings']
+PERCENTILES = (50, 90, 99)
+
+# upper edge of each bin in us
+BIN_EDGES = np.array([2 ** (BIN_SHIFT + i) / 1e3 for i in range(NUM_BINS - 1)] + [np.inf])
+
+
+class StageStats:
+  def __init__(self):
+    self.counts = np.zeros(NUM_BINS, dtype=np.int64)
+    self.sum_ns = 0
+    self.max_ns = 0
+
+  def add(self, stage) -> None:
+    self.counts += np.array(stage.counts, dtype=np.int64)
+    self.sum_ns += stage.sumNs
+    self.max_ns = max(self.max_ns, stage.maxNs)
+
+  def percentile(self, p: float) -> float:
+    """Upper bound in us, the edge of the bin the percentile falls in"""
+    cum = np.cumsum(self.counts)
+    return float(BIN_EDGES[np.searchsorted(cum, p / 100 * cum[-1])])
+
+
+def get_stats(lr: LogIterable) -> dict[str, tuple[int, int, dict[str, StageStats]]]:
+  """Per service the frames, loop period and the stats of each stage, merged over the route"""
+  frames: defaultdict[str, int] = defaultdict(int)
+  periods: dict[str, int] = {}
+  stats: defaultdict[str, defaultdict[str, StageStats]] = defaultdict(lambda: defaultdict(StageStats))
+  for msg in lr:
+    if msg.which() not in SERVICES:
+      continue
+    timings = getattr(msg, msg.which())
+    frames[msg.which()] += timings.frames
+    periods[msg.which()] = timings.periodNs
+    for stage in [*timings.stages, timings.total]:
+      stats[msg.which()][stage.name].add(stage)
+  return {s: (frames[s], periods[s], stats[s]) for s in SERVICES if frames[s] > 0}
+
+
+def report(stats: dict[str, tuple[int, int, dict[str, StageStats]]]) -> str:
+  lines = []
+  for service, (frames, period_ns, stages) in stats.items():
+    # a frame is certainly over budget when its whole bin is
+    over = stages['total'].counts[1:][BIN_EDGES[:-1] * 1e3 >= period_ns].sum()
+    lines.append(f"{service}: {frames} frames of {period_ns / 1e6:.0f} ms, at least {over} over budget")
+    lines.append(f"  {'stage':<20} {'mean':>8} " + " ".join(f"{f'p{p} <':>8}" for p in PERCENTILES) + f" {'max':>8} {'budget':>7}  (us)")
+    for name, s in stages.items():
+      mean_us = s.sum_ns / frames / 1e3
+      lines.append(f"  {name:<20} {mean_us:8.1f} " + " ".join(f"{s.percentile(p):8.0f}" for p in PERCENTILES) +
+                   f" {s.max_ns / 1e3:8.1f} {mean_us * 1e3 / period_ns:7.1%}")
+  return "\n".join(lines)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Where the loop time of controlsd, selfdrived and card went over a route",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("route", help="The route or segment to report on")
+  args = parser.parse_args()
+
+  print(report(get_stats(LogReader(args.route))))
@@ -254,6 +254,26 @@ class Calibrator:
     pm.send('liveCalibration', self.get_msg(valid))
 
 
+def step(sm: messaging.SubMaster, pm: messaging.PubMaster, calibrator: Calibrator) -> None:
+  calibrator.not_car = sm['carParams'].notCar
+
+  if sm.updated['cameraOdometry']:
+    calibrator.handle_v_ego(sm['carState'].vEgo)
+    new_rpy = calibrator.handle_cam_odom(sm['cameraOdometry'].trans,
+                                         sm['cameraOdometry'].rot,
+                                         sm['cameraOdometry'].wideFromDeviceEuler,
+                                         sm['cameraOdometry'].transStd,
+                                         sm['cameraOdometry'].roadTransformTrans,
+                                         sm['cameraOdometry'].roadTransformTransStd)
+
+    if DEBUG and new_rpy is not None:
+      print('got new rpy', new_rpy)
+
+  # 4Hz driven by cameraOdometry
+  if sm.frame % 5 == 0:
+    calibrator.send_data(pm, sm.all_checks())
+
+
 def main() -> NoReturn:
   config_realtime_process([0, 1, 2, 3], 5)
 
@@ -265,24 +285,7 @@ def main() -> NoReturn:
   while 1:
     timeout = 0 if sm.frame == -1 else 100
     sm.update(timeout)
-
-    calibrator.not_car = sm['carParams'].notCar
-
-    if sm.updated['cameraOdometry']:
-      calibrator.handle_v_ego(sm['carState'].vEgo)
-      new_rpy = calibrator.handle_cam_odom(sm['cameraOdometry'].trans,
-                                           sm['cameraOdometry'].rot,
-                                           sm['cameraOdometry'].wideFromDeviceEuler,
-                                           sm['cameraOdometry'].transStd,
-                                           sm['cameraOdometry'].roadTransformTrans,
-                                           sm['cameraOdometry'].roadTransformTransStd)
-
-      if DEBUG and new_rpy is not None:
-        print('got new rpy', new_rpy)
-
-    # 4Hz driven by cameraOdometry
-    if sm.frame % 5 == 0:
-      calibrator.send_data(pm, sm.all_checks())
+    step(sm, pm, calibrator)
 
 
 if __name__ == "__main__":
@@ -14,27 +14,70 @@ def rotate_std(rot_matrix, std_in):
 
 
 class NPQueue:
-  def __init__(self, maxlen: int, rowsize: int) -> None:
+  """Fixed-capacity ring buffer of rows, dropping the oldest when full. arr has the rows oldest first."""
+  def __init__(self, maxlen: int, rowsize: int, buf: np.ndarray | None = None) -> None:
     self.maxlen = maxlen
-    self.arr = np.empty((0, rowsize))
+    self.buf = np.empty((maxlen, rowsize)) if buf is None else buf
+    self.idx = 0  # where the next row goes
+    self.count = 0
+    self.writes = 0
+    self._arr: np.ndarray | None = None
 
   def __len__(self) -> int:
-    return len(self.arr)
+    return self.count
+
+  @property
+  def arr(self) -> np.ndarray:
+    if self._arr is None:
+      if self.count < self.maxlen:
+        self._arr = self.buf[:self.count]
+      else:
+        self._arr = np.concatenate((self.buf[self.idx:], self.buf[:self.idx]))
+    return self._arr
 
   def append(self, pt: list[float]) -> None:
-    if len(self.arr) < self.maxlen:
-      self.arr = np.append(self.arr, [pt], axis=0)
+    self.buf[self.idx] = pt
+    self.idx = (self.idx + 1) % self.maxlen
+    self.count = min(self.count + 1, self.maxlen)
+    self.writes += 1
+    self._arr = None
+
+
+class ScatterNPQueue(NPQueue):
+  """NPQueue that also keeps the scatter matrix of its rows, the sum of their outer products, for least squares fits"""
+  def __init__(self, maxlen: int, rowsize: int, buf: np.ndarray | None = None) -> None:
+    super().__init__(maxlen, rowsize, buf)
+    self.scatter = np.zeros((rowsize, rowsize))
+
+  def append(self, pt: list[float]) -> None:
+    if self.count == self.maxlen:
+      self.scatter -= np.outer(self.buf[self.idx], self.buf[self.idx])
+    super().append(pt)
+    if self.idx == 0:
+      # full again, recompute to not accumulate rounding errors
+      self.scatter = self.buf.T @ self.buf
     else:
-      self.arr[:-1] = self.arr[1:]
-      self.arr[-1] = pt
+      self.scatter += np.outer(self.buf[self.idx - 1], self.buf[self.idx - 1])
 
 
 class PointBuckets:
+  queue_cls: type[NPQueue] = NPQueue
+
   def __init__(self, x_bounds: list[tuple[float, float]], min_points: list[float], min_points_total: int, points_per_bucket: int, rowsize: int) -> None:
     self.x_bounds = x_bounds
-    self.buckets = {bounds: NPQueue(maxlen=points_per_bucket, rowsize=rowsize) for bounds in x_bounds}
+    # the buckets are consecutive slices of one buffer, to sample from all of them without concatenating
+    self.buf = np.empty((len(x_bounds) * points_per_bucket, rowsize))
+    self.buckets = {bounds: self.queue_cls(maxlen=points_per_bucket, rowsize=rowsize, buf=self.buf[i * points_per_bucket:(i + 1) * points_per_bucket])
+                    for i, bounds in enumerate(x_bounds)}
     self.buckets_min_points = dict(zip(x_bounds, min_points, strict=True))
     self.min_points_total = min_points_total
+    self.rng = np.random.default_rng()
+
+    # caches of get_points, invalid once the buckets have been written to
+    self._points: np.ndarray | None = None
+    self._points_writes = -1
+    self._filled = np.empty(0, dtype=int)
+    self._filled_lens: tuple[int, ...] = ()
 
   def __len__(self) -> int:
     return sum([len(v) for v in self.buckets.values()])
@@ -51,10 +94,21 @@ class PointBuckets:
     raise NotImplementedError
 
   def get_points(self, num_points: int = None) -> Any:
-    points = np.vstack([x.arr for x in self.buckets.values()])
-    if num_points is None:
-      return points
-    return points[np.random.choice(np.arange(len(points)), min(len(points), num_points), replace=False)]
+    """All points bucket by bucket and oldest first, as cached by torqued, or a random sample of num_points of them"""
+    if num_points is None or num_points >= len(self):
+      writes = sum(v.writes for v in self.buckets.values())
+      if self._points is None or self._points_writes != writes:
+        self._points = np.vstack([v.arr for v in self.buckets.values()])
+        self._points.flags.writeable = False
+        self._points_writes = writes
+      return self._points
+
+    # rows of the buffer holding points, only changes while the buckets fill up
+    lens = tuple(len(v) for v in self.buckets.values())
+    if lens != self._filled_lens:
+      self._filled = np.concatenate([np.arange(len(v)) + i * v.maxlen for i, v in enumerate(self.buckets.values())])
+      self._filled_lens = lens
+    return self.buf[self._filled[self.rng.choice(len(self._filled), num_points, replace=False)]]
 
   def load_points(self, points: list[list[float]]) -> None:
     for point in points:
@@ -254,43 +254,35 @@ def sensor_all_checks(acc_msgs, gyro_msgs, sensor_valid, sensor_recv_time, senso
   return all(sensor_alive.values()) and all(sensor_valid.values())
 
 
-def main():
-  config_realtime_process([0, 1, 2, 3], 5)
-
-  DEBUG = bool(int(os.getenv("DEBUG", "0")))
-  SIMULATION = bool(int(os.getenv("SIMULATION", "0")))
-
-  pm = messaging.PubMaster(['livePose'])
-  sm = messaging.SubMaster(['carState', 'liveCalibration', 'cameraOdometry'], poll='cameraOdometry')
-  # separate sensor sockets for efficiency
-  sensor_sockets = [messaging.sub_sock(which, timeout=20) for which in ['accelerometer', 'gyroscope']]
-  sensor_alive, sensor_valid, sensor_recv_time = defaultdict(bool), defaultdict(bool), defaultdict(float)
+CRITICAL_SERVICES = ["accelerometer", "gyroscope", "cameraOdometry"]
 
-  params = Params()
 
-  estimator = LocationEstimator(DEBUG)
+class LocationD:
+  def __init__(self, params: Params, debug: bool = False, simulation: bool = False):
+    self.simulation = simulation
+    self.estimator = LocationEstimator(debug)
 
-  filter_initialized = False
-  critcal_services = ["accelerometer", "gyroscope", "cameraOdometry"]
-  observation_input_invalid = defaultdict(int)
+    self.sensor_alive, self.sensor_valid, self.sensor_recv_time = defaultdict(bool), defaultdict(bool), defaultdict(float)
+    self.filter_initialized = False
+    self.observation_input_invalid: defaultdict[str, float] = defaultdict(int)
 
-  input_invalid_limit = {s: round(INPUT_INVALID_LIMIT * (SERVICE_LIST[s].frequency / 20.)) for s in critcal_services}
-  input_invalid_threshold = {s: input_invalid_limit[s] - 0.5 for s in critcal_services}
-  input_invalid_decay = {s: calculate_invalid_input_decay(input_invalid_limit[s], INPUT_INVALID_RECOVERY, SERVICE_LIST[s].frequency) for s in critcal_services}
+    self.input_invalid_limit = {s: round(INPUT_INVALID_LIMIT * (SERVICE_LIST[s].frequency / 20.)) for s in CRITICAL_SERVICES}
+    self.input_invalid_threshold = {s: self.input_invalid_limit[s] - 0.5 for s in CRITICAL_SERVICES}
+    self.input_invalid_decay = {s: calculate_invalid_input_decay(self.input_invalid_limit[s], INPUT_INVALID_RECOVERY, SERVICE_LIST[s].frequency)
+                                for s in CRITICAL_SERVICES}
 
-  initial_pose = params.get("LocationFilterInitialState")
-  if initial_pose is not None:
-    initial_pose = json.loads(initial_pose)
-    x_initial = np.array(initial_pose["x"], dtype=np.float64)
-    P_initial = np.diag(np.array(initial_pose["P"], dtype=np.float64))
-    estimator.reset(None, x_initial, P_initial)
+    initial_pose = params.get("LocationFilterInitialState")
+    if initial_pose is not None:
+      initial_pose = json.loads(initial_pose)
+      x_initial = np.array(initial_pose["x"], dtype=np.float64)
+      P_initial = np.diag(np.array(initial_pose["P"], dtype=np.float64))
+      self.estimator.reset(None, x_initial, P_initial)
 
-  while True:
-    sm.update()
-
-    acc_msgs, gyro_msgs = (messaging.drain_sock(sock) for sock in sensor_sockets)
+  def sensor_all_checks(self, acc_msgs, gyro_msgs) -> bool:
+    return sensor_all_checks(acc_msgs, gyro_msgs, self.sensor_valid, self.sensor_recv_time, self.sensor_alive, self.simulation)
 
-    if filter_initialized:
+  def update(self, sm: messaging.SubMaster, acc_msgs, gyro_msgs):
+    if self.filter_initialized:
       msgs = []
       for msg in acc_msgs + gyro_msgs:
         t, valid, which, data = msg.logMonoTime, msg.valid, msg.which(), getattr(msg, msg.which())
@@ -304,28 +296,51 @@ def main():
       for log_mono_time, valid, which, msg in sorted(msgs, key=lambda x: x[0]):
         if valid:
           t = log_mono_time * 1e-9
-          res = estimator.handle_log(t, which, msg)
-          if which not in critcal_services:
+          res = self.estimator.handle_log(t, which, msg)
+          if which not in CRITICAL_SERVICES:
             continue
 
           if res == HandleLogResult.TIMING_INVALID:
             cloudlog.warning(f"Observation {which} ignored due to failed timing check")
-            observation_input_invalid[which] += 1
+            self.observation_input_invalid[which] += 1
           elif res == HandleLogResult.INPUT_INVALID:
             cloudlog.warning(f"Observation {which} ignored due to failed sanity check")
-            observation_input_invalid[which] += 1
+            self.observation_input_invalid[which] += 1
           elif res == HandleLogResult.SUCCESS:
-            observation_input_invalid[which] *= input_invalid_decay[which]
+            self.observation_input_invalid[which] *= self.input_invalid_decay[which]
     else:
-      filter_initialized = sm.all_checks() and sensor_all_checks(acc_msgs, gyro_msgs, sensor_valid, sensor_recv_time, sensor_alive, SIMULATION)
+      self.filter_initialized = sm.all_checks() and self.sensor_all_checks(acc_msgs, gyro_msgs)
 
-    if sm.updated["cameraOdometry"]:
-      critical_service_inputs_valid = all(observation_input_invalid[s] < input_invalid_threshold[s] for s in critcal_services)
-      inputs_valid = sm.all_valid() and critical_service_inputs_valid
-      sensors_valid = sensor_all_checks(acc_msgs, gyro_msgs, sensor_valid, sensor_recv_time, sensor_alive, SIMULATION)
+  def publish(self, sm: messaging.SubMaster, pm: messaging.PubMaster, acc_msgs, gyro_msgs):
+    critical_service_inputs_valid = all(self.observation_input_invalid[s] < self.input_invalid_threshold[s] for s in CRITICAL_SERVICES)
+    inputs_valid = sm.all_valid() and critical_service_inputs_valid
+    sensors_valid = self.sensor_all_checks(acc_msgs, gyro_msgs)
+
+    msg = self.estimator.get_msg(sensors_valid, inputs_valid, self.filter_initialized)
+    pm.send("livePose", msg)
 
-      msg = estimator.get_msg(sensors_valid, inputs_valid, filter_initialized)
-      pm.send("livePose", msg)
+
+def main():
+  config_realtime_process([0, 1, 2, 3], 5)
+
+  DEBUG = bool(int(os.getenv("DEBUG", "0")))
+  SIMULATION = bool(int(os.getenv("SIMULATION", "0")))
+
+  pm = messaging.PubMaster(['livePose'])
+  sm = messaging.SubMaster(['carState', 'liveCalibration', 'cameraOdometry'], poll='cameraOdometry')
+  # separate sensor sockets for efficiency
+  sensor_sockets = [messaging.sub_sock(which, timeout=20) for which in ['accelerometer', 'gyroscope']]
+
+  locationd = LocationD(Params(), DEBUG, SIMULATION)
+
+  while True:
+    sm.update()
+
+    acc_msgs, gyro_msgs = (messaging.drain_sock(sock) for sock in sensor_sockets)
+
+    locationd.update(sm, acc_msgs, gyro_msgs)
+    if sm.updated["cameraOdometry"]:
+      locationd.publish(sm, pm, acc_msgs, gyro_msgs)
 
 
 if __name__ == "__main__":
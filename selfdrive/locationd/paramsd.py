@@ -122,21 +122,7 @@ def check_valid_with_hysteresis(current_valid: bool, val: float, threshold: floa
   return current_valid
 
 
-def main():
-  config_realtime_process([0, 1, 2, 3], 5)
-
-  DEBUG = bool(int(os.getenv("DEBUG", "0")))
-  REPLAY = bool(int(os.getenv("REPLAY", "0")))
-
-  pm = messaging.PubMaster(['liveParameters'])
-  sm = messaging.SubMaster(['livePose', 'liveCalibration', 'carState'], poll='livePose')
-
-  params_reader = Params()
-  # wait for stats about the car to come in from controls
-  cloudlog.info("paramsd is waiting for CarParams")
-  CP = messaging.log_from_bytes(params_reader.get("CarParams", block=True), car.CarParams)
-  cloudlog.info("paramsd got CarParams")
-
+def retrieve_initial_vehicle_params(params_reader: Params, CP: car.CarParams, replay: bool, debug: bool):
   min_sr, max_sr = 0.5 * CP.steerRatio, 2.0 * CP.steerRatio
 
   params = params_reader.get("LiveParameters")
@@ -169,94 +155,129 @@ def main():
     }
     cloudlog.info("Parameter learner resetting to default values")
 
-  if not REPLAY:
+  if not replay:
     # When driving in wet conditions the stiffness can go down, and then be too low on the next drive
     # Without a way to detect this we have to reset the stiffness every drive
     params['stiffnessFactor'] = 1.0
 
   pInitial = None
-  if DEBUG:
+  if debug:
     pInitial = np.array(params['debugFilterState']['std']) if 'debugFilterState' in params else None
 
-  learner = ParamsLearner(CP, params['steerRatio'], params['stiffnessFactor'], math.radians(params['angleOffsetAverageDeg']), pInitial)
-  angle_offset_average = params['angleOffsetAverageDeg']
-  angle_offset = angle_offset_average
-  roll = 0.0
-  avg_offset_valid = True
-  total_offset_valid = True
-  roll_valid = True
+  return params['steerRatio'], params['stiffnessFactor'], params['angleOffsetAverageDeg'], pInitial
 
-  while True:
-    sm.update()
+
+class ParamsD:
+  def __init__(self, CP: car.CarParams, params_reader: Params, debug: bool = False, replay: bool = False):
+    self.CP = CP
+    self.params_reader = params_reader
+    self.debug = debug
+
+    self.min_sr, self.max_sr = 0.5 * CP.steerRatio, 2.0 * CP.steerRatio
+
+    steer_ratio, stiffness_factor, angle_offset_deg, pInitial = retrieve_initial_vehicle_params(params_reader, CP, replay, debug)
+    self.learner = ParamsLearner(CP, steer_ratio, stiffness_factor, math.radians(angle_offset_deg), pInitial)
+    self.angle_offset_average = angle_offset_deg
+    self.angle_offset = self.angle_offset_average
+    self.roll = 0.0
+    self.avg_offset_valid = True
+    self.total_offset_valid = True
+    self.roll_valid = True
+
+  def update(self, sm: messaging.SubMaster):
     if sm.all_checks():
       for which in sorted(sm.updated.keys(), key=lambda x: sm.logMonoTime[x]):
         if sm.updated[which]:
           t = sm.logMonoTime[which] * 1e-9
-          learner.handle_log(t, which, sm[which])
+          self.learner.handle_log(t, which, sm[which])
+
+  def publish(self, sm: messaging.SubMaster, pm: messaging.PubMaster):
+    x = self.learner.kf.x
+    P = np.sqrt(self.learner.kf.P.diagonal())
+    if not all(map(math.isfinite, x)):
+      cloudlog.error("NaN in liveParameters estimate. Resetting to default values")
+      self.learner = ParamsLearner(self.CP, self.CP.steerRatio, 1.0, 0.0)
+      x = self.learner.kf.x
+
+    self.angle_offset_average = np.clip(math.degrees(x[States.ANGLE_OFFSET].item()),
+                                        self.angle_offset_average - MAX_ANGLE_OFFSET_DELTA, self.angle_offset_average + MAX_ANGLE_OFFSET_DELTA)
+    self.angle_offset = np.clip(math.degrees(x[States.ANGLE_OFFSET].item() + x[States.ANGLE_OFFSET_FAST].item()),
+                                self.angle_offset - MAX_ANGLE_OFFSET_DELTA, self.angle_offset + MAX_ANGLE_OFFSET_DELTA)
+    self.roll = np.clip(float(x[States.ROAD_ROLL].item()), self.roll - ROLL_MAX_DELTA, self.roll + ROLL_MAX_DELTA)
+    roll_std = float(P[States.ROAD_ROLL].item())
+    if self.learner.active and self.learner.speed > LOW_ACTIVE_SPEED:
+      # Account for the opposite signs of the yaw rates
+      # At low speeds, bumping into a curb can cause the yaw rate to be very high
+      sensors_valid = bool(abs(self.learner.speed * (x[States.YAW_RATE].item() + self.learner.yaw_rate)) < LATERAL_ACC_SENSOR_THRESHOLD)
+    else:
+      sensors_valid = True
+    self.avg_offset_valid = check_valid_with_hysteresis(self.avg_offset_valid, self.angle_offset_average, OFFSET_MAX, OFFSET_LOWERED_MAX)
+    self.total_offset_valid = check_valid_with_hysteresis(self.total_offset_valid, self.angle_offset, OFFSET_MAX, OFFSET_LOWERED_MAX)
+    self.roll_valid = check_valid_with_hysteresis(self.roll_valid, self.roll, ROLL_MAX, ROLL_LOWERED_MAX)
+
+    msg = messaging.new_message('liveParameters')
+
+    liveParameters = msg.liveParameters
+    liveParameters.posenetValid = True
+    liveParameters.sensorValid = sensors_valid
+    liveParameters.steerRatio = float(x[States.STEER_RATIO].item())
+    liveParameters.stiffnessFactor = float(x[States.STIFFNESS].item())
+    liveParameters.roll = float(self.roll)
+    liveParameters.angleOffsetAverageDeg = float(self.angle_offset_average)
+    liveParameters.angleOffsetDeg = float(self.angle_offset)
+    liveParameters.valid = all((
+      self.avg_offset_valid,
+      self.total_offset_valid,
+      self.roll_valid,
+      roll_std < ROLL_STD_MAX,
+      0.2 <= liveParameters.stiffnessFactor <= 5.0,
+      self.min_sr <= liveParameters.steerRatio <= self.max_sr,
+    ))
+    liveParameters.steerRatioStd = float(P[States.STEER_RATIO].item())
+    liveParameters.stiffnessFactorStd = float(P[States.STIFFNESS].item())
+    liveParameters.angleOffsetAverageStd = float(P[States.ANGLE_OFFSET].item())
+    liveParameters.angleOffsetFastStd = float(P[States.ANGLE_OFFSET_FAST].item())
+    if self.debug:
+      liveParameters.debugFilterState = log.LiveParametersData.FilterState.new_message()
+      liveParameters.debugFilterState.value = x.tolist()
+      liveParameters.debugFilterState.std = P.tolist()
+
+    msg.valid = sm.all_checks()
+
+    if sm.frame % 1200 == 0:  # once a minute
+      params = {
+        'carFingerprint': self.CP.carFingerprint,
+        'steerRatio': liveParameters.steerRatio,
+        'stiffnessFactor': liveParameters.stiffnessFactor,
+        'angleOffsetAverageDeg': liveParameters.angleOffsetAverageDeg,
+      }
+      self.params_reader.put_nonblocking("LiveParameters", json.dumps(params))
+
+    pm.send('liveParameters', msg)
+
+
+def main():
+  config_realtime_process([0, 1, 2, 3], 5)
+
+  DEBUG = bool(int(os.getenv("DEBUG", "0")))
+  REPLAY = bool(int(os.getenv("REPLAY", "0")))
+
+  pm = messaging.PubMaster(['liveParameters'])
+  sm = messaging.SubMaster(['livePose', 'liveCalibration', 'carState'], poll='livePose')
 
+  params_reader = Params()
+  # wait for stats about the car to come in from controls
+  cloudlog.info("paramsd is waiting for CarParams")
+  CP = messaging.log_from_bytes(params_reader.get("CarParams", block=True), car.CarParams)
+  cloudlog.info("paramsd got CarParams")
+
+  paramsd = ParamsD(CP, params_reader, DEBUG, REPLAY)
+
+  while True:
+    sm.update()
+    paramsd.update(sm)
     if sm.updated['livePose']:
-      x = learner.kf.x
-      P = np.sqrt(learner.kf.P.diagonal())
-      if not all(map(math.isfinite, x)):
-        cloudlog.error("NaN in liveParameters estimate. Resetting to default values")
-        learner = ParamsLearner(CP, CP.steerRatio, 1.0, 0.0)
-        x = learner.kf.x
-
-      angle_offset_average = np.clip(math.degrees(x[States.ANGLE_OFFSET].item()),
-                                  angle_offset_average - MAX_ANGLE_OFFSET_DELTA, angle_offset_average + MAX_ANGLE_OFFSET_DELTA)
-      angle_offset = np.clip(math.degrees(x[States.ANGLE_OFFSET].item() + x[States.ANGLE_OFFSET_FAST].item()),
-                          angle_offset - MAX_ANGLE_OFFSET_DELTA, angle_offset + MAX_ANGLE_OFFSET_DELTA)
-      roll = np.clip(float(x[States.ROAD_ROLL].item()), roll - ROLL_MAX_DELTA, roll + ROLL_MAX_DELTA)
-      roll_std = float(P[States.ROAD_ROLL].item())
-      if learner.active and learner.speed > LOW_ACTIVE_SPEED:
-        # Account for the opposite signs of the yaw rates
-        # At low speeds, bumping into a curb can cause the yaw rate to be very high
-        sensors_valid = bool(abs(learner.speed * (x[States.YAW_RATE].item() + learner.yaw_rate)) < LATERAL_ACC_SENSOR_THRESHOLD)
-      else:
-        sensors_valid = True
-      avg_offset_valid = check_valid_with_hysteresis(avg_offset_valid, angle_offset_average, OFFSET_MAX, OFFSET_LOWERED_MAX)
-      total_offset_valid = check_valid_with_hysteresis(total_offset_valid, angle_offset, OFFSET_MAX, OFFSET_LOWERED_MAX)
-      roll_valid = check_valid_with_hysteresis(roll_valid, roll, ROLL_MAX, ROLL_LOWERED_MAX)
-
-      msg = messaging.new_message('liveParameters')
-
-      liveParameters = msg.liveParameters
-      liveParameters.posenetValid = True
-      liveParameters.sensorValid = sensors_valid
-      liveParameters.steerRatio = float(x[States.STEER_RATIO].item())
-      liveParameters.stiffnessFactor = float(x[States.STIFFNESS].item())
-      liveParameters.roll = float(roll)
-      liveParameters.angleOffsetAverageDeg = float(angle_offset_average)
-      liveParameters.angleOffsetDeg = float(angle_offset)
-      liveParameters.valid = all((
-        avg_offset_valid,
-        total_offset_valid,
-        roll_valid,
-        roll_std < ROLL_STD_MAX,
-        0.2 <= liveParameters.stiffnessFactor <= 5.0,
-        min_sr <= liveParameters.steerRatio <= max_sr,
-      ))
-      liveParameters.steerRatioStd = float(P[States.STEER_RATIO].item())
-      liveParameters.stiffnessFactorStd = float(P[States.STIFFNESS].item())
-      liveParameters.angleOffsetAverageStd = float(P[States.ANGLE_OFFSET].item())
-      liveParameters.angleOffsetFastStd = float(P[States.ANGLE_OFFSET_FAST].item())
-      if DEBUG:
-        liveParameters.debugFilterState = log.LiveParametersData.FilterState.new_message()
-        liveParameters.debugFilterState.value = x.tolist()
-        liveParameters.debugFilterState.std = P.tolist()
-
-      msg.valid = sm.all_checks()
-
-      if sm.frame % 1200 == 0:  # once a minute
-        params = {
-          'carFingerprint': CP.carFingerprint,
-          'steerRatio': liveParameters.steerRatio,
-          'stiffnessFactor': liveParameters.stiffnessFactor,
-          'angleOffsetAverageDeg': liveParameters.angleOffsetAverageDeg,
-        }
-        params_reader.put_nonblocking("LiveParameters", json.dumps(params))
-
-      pm.send('liveParameters', msg)
+      paramsd.publish(sm, pm)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import argparse
+import time
+
+import numpy as np
+
+from openpilot.selfdrive.locationd.helpers import NPQueue, PointBuckets
+from openpilot.selfdrive.locationd.test.test_point_buckets import get_buckets, get_drive
+from openpilot.selfdrive.locationd.torqued import POINTS_PER_BUCKET
+
+FIT_POINTS_TOTAL = 2000  # the sample torqued used to fit on
+
+
+def run(buckets: PointBuckets, points: np.ndarray, fit_every: int) -> tuple[float, float]:
+  """Time per added point and per fit sample in us"""
+  add_time = fit_time = 0.
+  fits = 0
+  for i, (x, y) in enumerate(points):
+    st = time.perf_counter()
+    buckets.add_point(x, y)
+    add_time += time.perf_counter() - st
+    if i % fit_every == 0 and buckets.is_calculable():
+      st = time.perf_counter()
+      buckets.get_points(FIT_POINTS_TOTAL)
+      fit_time += time.perf_counter() - st
+      fits += 1
+  return add_time / len(points) * 1e6, fit_time / max(fits, 1) * 1e6
+
+
+def timeit(n: int, f, *args) -> float:
+  """Median time of f in us"""
+  times = []
+  for _ in range(n):
+    st = time.perf_counter()
+    f(*args)
+    times.append(time.perf_counter() - st)
+  return float(np.median(times) * 1e6)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Cost of the torqued point buckets")
+  parser.add_argument("--count", type=int, default=30000, help="points to add, enough to fill the buckets by default")
+  parser.add_argument("--fit-every", type=int, default=5, help="points added between fits, torqued fits at 4 Hz and adds up to 20 Hz")
+  args = parser.parse_args()
+
+  q = NPQueue(POINTS_PER_BUCKET, 3)
+  for _ in range(POINTS_PER_BUCKET):
+    q.append([0., 1., 0.])
+  print(f"full queue append: {timeit(1000, q.append, [0., 1., 0.]):.2f} us")
+
+  buckets = get_buckets()
+  add_us, fit_us = run(buckets, get_drive(args.count), args.fit_every)
+  cache_us = timeit(100, buckets.get_points)
+  print(f"add_point {add_us:.2f} us, get_points({FIT_POINTS_TOTAL}) {fit_us:.1f} us, get_points() without new points {cache_us:.1f} us")
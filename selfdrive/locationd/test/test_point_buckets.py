@@ -0,0 +1,93 @@
+import numpy as np
+
+from openpilot.selfdrive.locationd.helpers import NPQueue, PointBuckets
+from openpilot.selfdrive.locationd.torqued import MIN_BUCKET_POINTS, MIN_POINTS_TOTAL, POINTS_PER_BUCKET, STEER_BUCKET_BOUNDS, TorqueBuckets
+
+
+def get_buckets(cls: type[PointBuckets] = TorqueBuckets) -> PointBuckets:
+  return cls(x_bounds=STEER_BUCKET_BOUNDS, min_points=MIN_BUCKET_POINTS, min_points_total=MIN_POINTS_TOTAL,
+             points_per_bucket=POINTS_PER_BUCKET, rowsize=3)
+
+
+def get_drive(n: int, seed: int = 0) -> np.ndarray:
+  """Steer torque and lateral accel of n points, roughly on a line like torqued sees them"""
+  rng = np.random.default_rng(seed)
+  steer = np.clip(rng.normal(0, 0.15, n), -0.49, 0.49)
+  return np.column_stack((steer, 2.5 * steer + rng.normal(0, 0.1, n)))
+
+
+class TestNPQueue:
+  def test_append(self):
+    q = NPQueue(maxlen=3, rowsize=2)
+    assert len(q) == 0 and q.arr.shape == (0, 2)
+    q.append([0, 0])
+    q.append([1, -1])
+    assert len(q) == 2
+    np.testing.assert_array_equal(q.arr, [[0, 0], [1, -1]])
+
+    # full, the oldest rows roll out
+    for i in range(2, 6):
+      q.append([i, -i])
+    assert len(q) == 3
+    np.testing.assert_array_equal(q.arr, [[3, -3], [4, -4], [5, -5]])
+
+  def test_arr_cache(self):
+    q = NPQueue(maxlen=3, rowsize=1)
+    for i in range(4):
+      q.append([i])
+    arr = q.arr
+    assert q.arr is arr
+    q.append([4])
+    assert q.arr is not arr
+    np.testing.assert_array_equal(q.arr[:, 0], [2, 3, 4])
+
+
+class TestPointBuckets:
+  def test_add_point(self):
+    buckets = TorqueBuckets(x_bounds=[(-0.5, 0.), (0., 0.5)], min_points=[1, 2], min_points_total=3, points_per_bucket=2, rowsize=3)
+    buckets.add_point(0.1, 0.2)
+    assert not buckets.is_calculable() and not buckets.is_valid()
+    buckets.add_point(-0.1, -0.3)
+    assert buckets.is_calculable() and not buckets.is_valid()
+    # out of all buckets
+    buckets.add_point(0.5, 1.2)
+    assert len(buckets) == 2
+
+    # the second bucket is full, its oldest point rolls out
+    buckets.add_point(0.2, 0.5)
+    buckets.add_point(0.3, 0.7)
+    assert len(buckets) == 3 and buckets.is_valid()
+    np.testing.assert_array_equal(buckets.get_points(), [[-0.1, 1., -0.3], [0.2, 1., 0.5], [0.3, 1., 0.7]])
+
+  def test_get_points_cache(self):
+    buckets = get_buckets()
+    buckets.load_points(get_drive(500))
+    points = buckets.get_points()
+    assert buckets.get_points() is points
+    assert not points.flags.writeable
+    buckets.add_point(0.05, 0.1)
+    assert buckets.get_points() is not points
+    assert len(buckets.get_points()) == len(points) + 1
+
+  def test_sample(self):
+    buckets = get_buckets()
+    buckets.load_points(get_drive(3000))
+    points = buckets.get_points()
+    sample = buckets.get_points(1000)
+    assert sample.shape == (1000, 3)
+    # without replacement, from the points in the buckets
+    rows = {tuple(p) for p in points}
+    assert len({tuple(p) for p in sample}) == 1000
+    assert all(tuple(p) in rows for p in sample)
+    assert len(buckets.get_points(len(points) + 1)) == len(points)
+
+  def test_cache_format(self):
+    # torqued caches the points as [steer, lateral accel] and loads them back into new buckets
+    buckets = get_buckets()
+    buckets.load_points(get_drive(4 * POINTS_PER_BUCKET))
+    cached = buckets.get_points()[:, [0, 2]].tolist()
+
+    loaded = get_buckets()
+    loaded.load_points(cached)
+    np.testing.assert_array_equal(loaded.get_points(), buckets.get_points())
+    assert len(loaded) == len(buckets)
@@ -0,0 +1,72 @@
+import numpy as np
+
+from cereal import car
+from openpilot.selfdrive.locationd.test.test_point_buckets import get_drive
+from openpilot.selfdrive.locationd.torqued import FRICTION_FACTOR, POINTS_PER_BUCKET, TorqueEstimator, slope2rot
+
+
+def get_estimator() -> TorqueEstimator:
+  CP = car.CarParams.new_message()
+  CP.brand = 'toyota'
+  CP.carFingerprint = 'TOYOTA_COROLLA_TSS2'
+  CP.steerActuatorDelay = 0.12
+  CP.lateralTuning.init('torque')
+  CP.lateralTuning.torque.latAccelFactor = 2.5
+  CP.lateralTuning.torque.friction = 0.1
+  return TorqueEstimator(CP)
+
+
+def svd_fit(buckets: list[np.ndarray]) -> tuple[float, float, float]:
+  """The total least squares fit of torqued on the points themselves, every bucket weighing the same"""
+  buckets = [b for b in buckets if len(b)]
+  points = np.concatenate(buckets)
+  weights = np.concatenate([np.full(len(b), 1 / len(b)) for b in buckets])
+  _, _, v = np.linalg.svd(points * np.sqrt(weights)[:, None], full_matrices=False)
+  slope, offset = -v.T[0:2, 2] / v.T[2, 2]
+  _, spread = np.matmul(points[:, [0, 2]], slope2rot(slope)).T
+  spread_mean = np.average(spread, weights=weights)
+  return slope, offset, np.sqrt(np.average((spread - spread_mean) ** 2, weights=weights)) * FRICTION_FACTOR
+
+
+class TestTorqued:
+  def test_estimate_params(self):
+    estimator = get_estimator()
+    # filling up the buckets and then rolling them over
+    for n in (500, 3 * POINTS_PER_BUCKET, 3 * POINTS_PER_BUCKET):
+      estimator.filtered_points.load_points(get_drive(n, seed=n))
+      buckets = [b.arr for b in estimator.filtered_points.buckets.values()]
+      np.testing.assert_allclose(estimator.estimate_params(), svd_fit(buckets), rtol=1e-6)
+
+  def test_buckets_weigh_the_same(self):
+    # the line through three points, one bucket holding many more points than the others
+    pts = [(0.05, 0.1), (0.25, 0.5), (0.4, 1.0)]
+    fits = []
+    for repeats in (1, 100):
+      estimator = get_estimator()
+      for i, (x, y) in enumerate(pts):
+        for _ in range(repeats if i == 0 else 1):
+          estimator.filtered_points.add_point(x, y)
+      fits.append(estimator.estimate_params())
+    np.testing.assert_allclose(fits[0], fits[1], rtol=1e-9)
+
+    # on a line the fit is exact and there is no spread
+    estimator = get_estimator()
+    for x in (-0.4, -0.15, 0.05, 0.25, 0.4):
+      for _ in range(1 if x < 0 else 50):
+        estimator.filtered_points.add_point(x, 2.0 * x + 0.1)
+    np.testing.assert_allclose(estimator.estimate_params(), (2.0, 0.1, 0.0), atol=1e-7)
+
+  def test_scatter(self):
+    estimator = get_estimator()
+    estimator.filtered_points.load_points(get_drive(4 * POINTS_PER_BUCKET))
+    for bucket in estimator.filtered_points.buckets.values():
+      np.testing.assert_allclose(bucket.scatter, bucket.arr.T @ bucket.arr, rtol=1e-9, atol=1e-9)
+
+  def test_restore_points(self):
+    estimator = get_estimator()
+    estimator.filtered_points.load_points(get_drive(4 * POINTS_PER_BUCKET))
+    cached = estimator.get_msg(with_points=True).liveTorqueParameters.points
+
+    restored = get_estimator()
+    restored.filtered_points.load_points(cached)
+    np.testing.assert_allclose(restored.estimate_params(), estimator.estimate_params(), rtol=1e-5)
@@ -9,14 +9,12 @@ from openpilot.common.realtime import config_realtime_process, DT_MDL
 from openpilot.common.filter_simple import FirstOrderFilter
 from openpilot.common.swaglog import cloudlog
 from openpilot.selfdrive.controls.lib.vehicle_model import ACCELERATION_DUE_TO_GRAVITY
-from openpilot.selfdrive.locationd.helpers import PointBuckets, ParameterEstimator, PoseCalibrator, Pose
+from openpilot.selfdrive.locationd.helpers import PointBuckets, ParameterEstimator, PoseCalibrator, Pose, ScatterNPQueue
 
 HISTORY = 5  # secs
 POINTS_PER_BUCKET = 1500
 MIN_POINTS_TOTAL = 4000
 MIN_POINTS_TOTAL_QLOG = 600
-FIT_POINTS_TOTAL = 2000
-FIT_POINTS_TOTAL_QLOG = 600
 MIN_VEL = 15  # m/s
 FRICTION_FACTOR = 1.5  # ~85% of data coverage
 FACTOR_SANITY = 0.3
@@ -42,12 +40,18 @@ def slope2rot(slope):
 
 
 class TorqueBuckets(PointBuckets):
+  queue_cls = ScatterNPQueue
+
   def add_point(self, x, y):
     for bound_min, bound_max in self.x_bounds:
       if (x >= bound_min) and (x < bound_max):
         self.buckets[(bound_min, bound_max)].append([x, 1.0, y])
         break
 
+  def get_scatter(self):
+    # each bucket weighs the same, however many points it has
+    return sum(v.scatter / len(v) for v in self.buckets.values() if len(v) > 0)
+
 
 class TorqueEstimator(ParameterEstimator):
   def __init__(self, CP, decimated=False, track_all_points=False):
@@ -57,14 +61,12 @@ class TorqueEstimator(ParameterEstimator):
     if decimated:
       self.min_bucket_points = MIN_BUCKET_POINTS / 10
       self.min_points_total = MIN_POINTS_TOTAL_QLOG
-      self.fit_points = FIT_POINTS_TOTAL_QLOG
       self.factor_sanity = FACTOR_SANITY_QLOG
       self.friction_sanity = FRICTION_SANITY_QLOG
 
     else:
       self.min_bucket_points = MIN_BUCKET_POINTS
       self.min_points_total = MIN_POINTS_TOTAL
-      self.fit_points = FIT_POINTS_TOTAL
       self.factor_sanity = FACTOR_SANITY
       self.friction_sanity = FRICTION_SANITY
 
@@ -142,14 +144,19 @@ class TorqueEstimator(ParameterEstimator):
     self.all_torque_points = []
 
   def estimate_params(self):
-    points = self.filtered_points.get_points(self.fit_points)
     # total least square solution as both x and y are noisy observations
     # this is empirically the slope of the hysteresis parallelogram as opposed to the line through the diagonals
+    # fit on the scatter matrix of the points, kept up to date as they come and go, so the cost doesn't grow with them
+    scatter = self.filtered_points.get_scatter()
     try:
-      _, _, v = np.linalg.svd(points, full_matrices=False)
-      slope, offset = -v.T[0:2, 2] / v.T[2, 2]
-      _, spread = np.matmul(points[:, [0, 2]], slope2rot(slope)).T
-      friction_coeff = np.std(spread) * FRICTION_FACTOR
+      _, v = np.linalg.eigh(scatter)
+      slope, offset = -v[0:2, 0] / v[2, 0]
+      # std of the points across the line, from the moments of steer and lateral accel
+      spread_dir = slope2rot(slope)[:, 1]
+      n = scatter[1, 1]  # total weight of the points
+      spread_mean = spread_dir @ scatter[[0, 2], 1] / n
+      spread_var = spread_dir @ scatter[np.ix_([0, 2], [0, 2])] @ spread_dir / n - spread_mean ** 2
+      friction_coeff = np.sqrt(max(spread_var, 0.)) * FRICTION_FACTOR
     except np.linalg.LinAlgError as e:
       cloudlog.exception(f"Error computing live torque params: {e}")
       slope = offset = friction_coeff = np.nan
@@ -237,6 +244,23 @@ class TorqueEstimator(ParameterEstimator):
     return msg
 
 
+def step(sm, pm, params, estimator):
+  if sm.all_checks():
+    for which in sm.updated.keys():
+      if sm.updated[which]:
+        t = sm.logMonoTime[which] * 1e-9
+        estimator.handle_log(t, which, sm[which])
+
+  # 4Hz driven by livePose
+  if sm.frame % 5 == 0:
+    pm.send('liveTorqueParameters', estimator.get_msg(valid=sm.all_checks()))
+
+  # Cache points every 60 seconds while onroad
+  if sm.frame % 240 == 0:
+    msg = estimator.get_msg(valid=sm.all_checks(), with_points=True)
+    params.put_nonblocking("LiveTorqueParameters", msg.to_bytes())
+
+
 def main(demo=False):
   config_realtime_process([0, 1, 2, 3], 5)
 
@@ -248,20 +272,7 @@ def main(demo=False):
 
   while True:
     sm.update()
-    if sm.all_checks():
-      for which in sm.updated.keys():
-        if sm.updated[which]:
-          t = sm.logMonoTime[which] * 1e-9
-          estimator.handle_log(t, which, sm[which])
-
-    # 4Hz driven by livePose
-    if sm.frame % 5 == 0:
-      pm.send('liveTorqueParameters', estimator.get_msg(valid=sm.all_checks()))
-
-    # Cache points every 60 seconds while onroad
-    if sm.frame % 240 == 0:
-      msg = estimator.get_msg(valid=sm.all_checks(), with_points=True)
-      params.put_nonblocking("LiveTorqueParameters", msg.to_bytes())
+    step(sm, pm, params, estimator)
 
 
 if __name__ == "__main__":
@@ -13,6 +13,7 @@ else:
 import time
 import pickle
 import numpy as np
+from dataclasses import dataclass
 import cereal.messaging as messaging
 from cereal import car, log
 from pathlib import Path
@@ -41,6 +42,9 @@ MODEL_PATH = Path(__file__).parent / 'models/supercombo.onnx'
 MODEL_PKL_PATH = Path(__file__).parent / 'models/supercombo_tinygrad.pkl'
 METADATA_PATH = Path(__file__).parent / 'models/supercombo_metadata.pkl'
 
+SM_SERVICES = ["deviceState", "carState", "roadCameraState", "liveCalibration", "driverMonitoringState", "carControl"]
+PM_SERVICES = ["modelV2", "drivingModelData", "cameraOdometry"]
+
 class FrameMeta:
   frame_id: int = 0
   timestamp_sof: int = 0
@@ -83,6 +87,9 @@ class ModelState:
       with open(MODEL_PKL_PATH, "rb") as f:
         self.model_run = pickle.load(f)
     else:
+      # preallocated, the warped images are copied in every frame
+      for key in self.frames:
+        self.numpy_inputs[key] = np.zeros(self.input_shapes[key], dtype=np.float32)
       self.onnx_cpu_runner = make_onnx_cpu_runner(MODEL_PATH)
 
   def slice_outputs(self, model_outputs: np.ndarray) -> dict[str, np.ndarray]:
@@ -91,8 +98,7 @@ class ModelState:
       parsed_model_outputs['raw_pred'] = model_outputs.copy()
     return parsed_model_outputs
 
-  def run(self, buf: VisionBuf, wbuf: VisionBuf, transform: np.ndarray, transform_wide: np.ndarray,
-                inputs: dict[str, np.ndarray], prepare_only: bool) -> dict[str, np.ndarray] | None:
+  def update_inputs(self, inputs: dict[str, np.ndarray]) -> None:
     # Model decides when action is completed, so desire input is just a pulse triggered on rising edge
     inputs['desire'][0] = 0
     new_desire = np.where(inputs['desire'] - self.prev_desire > .99, inputs['desire'], 0)
@@ -103,6 +109,10 @@ class ModelState:
 
     self.numpy_inputs['traffic_convention'][:] = inputs['traffic_convention']
     self.numpy_inputs['lateral_control_params'][:] = inputs['lateral_control_params']
+
+  def prepare_imgs(self, buf: VisionBuf, wbuf: VisionBuf, transform: np.ndarray, transform_wide: np.ndarray,
+                   imgs: dict[str, np.ndarray] | None = None) -> None:
+    """Warps both frames into the model input images, imgs can hold other preallocated buffers than the model's own"""
     imgs_cl = {'input_imgs': self.frames['input_imgs'].prepare(buf, transform.flatten()),
                'big_input_imgs': self.frames['big_input_imgs'].prepare(wbuf, transform_wide.flatten())}
 
@@ -112,11 +122,13 @@ class ModelState:
         if key not in self.tensor_inputs:
           self.tensor_inputs[key] = qcom_tensor_from_opencl_address(imgs_cl[key].mem_address, self.input_shapes[key], dtype=dtypes.uint8)
     else:
+      imgs = self.numpy_inputs if imgs is None else imgs
       for key in imgs_cl:
-        self.numpy_inputs[key] = self.frames[key].buffer_from_cl(imgs_cl[key]).reshape(self.input_shapes[key]).astype(dtype=np.float32)
+        np.copyto(imgs[key], self.frames[key].buffer_from_cl(imgs_cl[key]).reshape(self.input_shapes[key]))
 
-    if prepare_only:
-      return None
+  def execute(self, imgs: dict[str, np.ndarray] | None = None) -> dict[str, np.ndarray]:
+    if imgs is not None:
+      self.numpy_inputs.update(imgs)
 
     if TICI:
       self.output = self.model_run(**self.tensor_inputs).numpy().flatten()
@@ -134,6 +146,119 @@ class ModelState:
     self.numpy_inputs['prev_desired_curv'][0,-1,:] = outputs['desired_curvature'][0, :]
     return outputs
 
+  def run(self, buf: VisionBuf, wbuf: VisionBuf, transform: np.ndarray, transform_wide: np.ndarray,
+                inputs: dict[str, np.ndarray], prepare_only: bool) -> dict[str, np.ndarray] | None:
+    self.update_inputs(inputs)
+    self.prepare_imgs(buf, wbuf, transform, transform_wide)
+
+    if prepare_only:
+      return None
+    return self.execute()
+
+
+@dataclass
+class FrameInputs:
+  meta_main: FrameMeta
+  meta_extra: FrameMeta
+  frame_id: int
+  v_ego: float
+  lateral_control_params: np.ndarray
+  traffic_convention: np.ndarray
+  transform_main: np.ndarray
+  transform_extra: np.ndarray
+  live_calib_seen: bool
+  vipc_dropped_frames: int
+  frame_drop_ratio: float
+  car_state: car.CarState
+  lat_active: bool
+
+  @property
+  def prepare_only(self) -> bool:
+    return self.vipc_dropped_frames > 0
+
+
+class ModeldStep:
+  """Everything main() does around the model for one frame, shared with offline model replay"""
+  def __init__(self, steer_delay: float, main_wide_camera: bool):
+    self.steer_delay = steer_delay
+    self.main_wide_camera = main_wide_camera
+    self.publish_state = PublishState()
+    self.DH = DesireHelper()
+
+    # setup filter to track dropped frames
+    self.frame_dropped_filter = FirstOrderFilter(0., 10., 1. / ModelConstants.MODEL_FREQ)
+    self.last_vipc_frame_id = 0
+    self.run_count = 0
+
+    self.model_transform_main = np.zeros((3, 3), dtype=np.float32)
+    self.model_transform_extra = np.zeros((3, 3), dtype=np.float32)
+    self.live_calib_seen = False
+
+  def read_frame(self, sm: SubMaster, meta_main: FrameMeta, meta_extra: FrameMeta) -> FrameInputs:
+    """Model inputs known from sm and the frames, the desire depends on the previous output and is added in model_inputs"""
+    is_rhd = sm["driverMonitoringState"].isRHD
+    frame_id = sm["roadCameraState"].frameId
+    v_ego = max(sm["carState"].vEgo, 0.)
+    lateral_control_params = np.array([v_ego, self.steer_delay], dtype=np.float32)
+    if sm.updated["liveCalibration"] and sm.seen['roadCameraState'] and sm.seen['deviceState']:
+      device_from_calib_euler = np.array(sm["liveCalibration"].rpyCalib, dtype=np.float32)
+      dc = DEVICE_CAMERAS[(str(sm['deviceState'].deviceType), str(sm['roadCameraState'].sensor))]
+      self.model_transform_main = get_warp_matrix(device_from_calib_euler, dc.ecam.intrinsics if self.main_wide_camera else dc.fcam.intrinsics,
+                                                  False).astype(np.float32)
+      self.model_transform_extra = get_warp_matrix(device_from_calib_euler, dc.ecam.intrinsics, True).astype(np.float32)
+      self.live_calib_seen = True
+
+    traffic_convention = np.zeros(2)
+    traffic_convention[int(is_rhd)] = 1
+
+    # tracked dropped frames
+    vipc_dropped_frames = max(0, meta_main.frame_id - self.last_vipc_frame_id - 1)
+    frames_dropped = self.frame_dropped_filter.update(min(vipc_dropped_frames, 10))
+    if self.run_count < 10: # let frame drops warm up
+      self.frame_dropped_filter.x = 0.
+      frames_dropped = 0.
+    self.run_count = self.run_count + 1
+    self.last_vipc_frame_id = meta_main.frame_id
+
+    return FrameInputs(meta_main, meta_extra, frame_id, v_ego, lateral_control_params, traffic_convention,
+                       self.model_transform_main, self.model_transform_extra, self.live_calib_seen,
+                       vipc_dropped_frames, frames_dropped / (1 + frames_dropped), sm['carState'], sm['carControl'].latActive)
+
+  def model_inputs(self, frame: FrameInputs) -> dict[str, np.ndarray]:
+    desire = self.DH.desire
+    vec_desire = np.zeros(ModelConstants.DESIRE_LEN, dtype=np.float32)
+    if desire >= 0 and desire < ModelConstants.DESIRE_LEN:
+      vec_desire[desire] = 1
+
+    return {
+      'desire': vec_desire,
+      'traffic_convention': frame.traffic_convention,
+      'lateral_control_params': frame.lateral_control_params,
+    }
+
+  def publish(self, pm: PubMaster, frame: FrameInputs, model_output: dict[str, np.ndarray], model_execution_time: float) -> None:
+    modelv2_send = messaging.new_message('modelV2')
+    drivingdata_send = messaging.new_message('drivingModelData')
+    posenet_send = messaging.new_message('cameraOdometry')
+    fill_model_msg(drivingdata_send, modelv2_send, model_output, frame.v_ego, self.steer_delay,
+                   self.publish_state, frame.meta_main.frame_id, frame.meta_extra.frame_id, frame.frame_id,
+                   frame.frame_drop_ratio, frame.meta_main.timestamp_eof, model_execution_time, frame.live_calib_seen)
+
+    desire_state = modelv2_send.modelV2.meta.desireState
+    l_lane_change_prob = desire_state[log.Desire.laneChangeLeft]
+    r_lane_change_prob = desire_state[log.Desire.laneChangeRight]
+    lane_change_prob = l_lane_change_prob + r_lane_change_prob
+    self.DH.update(frame.car_state, frame.lat_active, lane_change_prob)
+    modelv2_send.modelV2.meta.laneChangeState = self.DH.lane_change_state
+    modelv2_send.modelV2.meta.laneChangeDirection = self.DH.lane_change_direction
+    drivingdata_send.drivingModelData.meta.laneChangeState = self.DH.lane_change_state
+    drivingdata_send.drivingModelData.meta.laneChangeDirection = self.DH.lane_change_direction
+
+    fill_pose_msg(posenet_send, model_output, frame.meta_main.frame_id, frame.vipc_dropped_frames, frame.meta_main.timestamp_eof, frame.live_calib_seen)
+    pm.send('modelV2', modelv2_send)
+    pm.send('drivingModelData', drivingdata_send)
+    pm.send('cameraOdometry', posenet_send)
+
 
 def main(demo=False):
   cloudlog.warning("modeld init")
@@ -173,21 +298,11 @@ def main(demo=False):
     cloudlog.warning(f"connected extra cam with buffer size: {vipc_client_extra.buffer_len} ({vipc_client_extra.width} x {vipc_client_extra.height})")
 
   # messaging
-  pm = PubMaster(["modelV2", "drivingModelData", "cameraOdometry"])
-  sm = SubMaster(["deviceState", "carState", "roadCameraState", "liveCalibration", "driverMonitoringState", "carControl"])
+  pm = PubMaster(PM_SERVICES)
+  sm = SubMaster(SM_SERVICES)
 
-  publish_state = PublishState()
   params = Params()
 
-  # setup filter to track dropped frames
-  frame_dropped_filter = FirstOrderFilter(0., 10., 1. / ModelConstants.MODEL_FREQ)
-  frame_id = 0
-  last_vipc_frame_id = 0
-  run_count = 0
-
-  model_transform_main = np.zeros((3, 3), dtype=np.float32)
-  model_transform_extra = np.zeros((3, 3), dtype=np.float32)
-  live_calib_seen = False
   buf_main, buf_extra = None, None
   meta_main = FrameMeta()
   meta_extra = FrameMeta()
@@ -202,7 +317,7 @@ def main(demo=False):
   # TODO this needs more thought, use .2s extra for now to estimate other delays
   steer_delay = CP.steerActuatorDelay + .2
 
-  DH = DesireHelper()
+  step = ModeldStep(steer_delay, main_wide_camera)
 
   while True:
     # Keep receiving frames until we are at least 1 frame ahead of previous extra frame
@@ -238,72 +353,19 @@ def main(demo=False):
       meta_extra = meta_main
 
     sm.update(0)
-    desire = DH.desire
-    is_rhd = sm["driverMonitoringState"].isRHD
-    frame_id = sm["roadCameraState"].frameId
-    v_ego = max(sm["carState"].vEgo, 0.)
-    lateral_control_params = np.array([v_ego, steer_delay], dtype=np.float32)
-    if sm.updated["liveCalibration"] and sm.seen['roadCameraState'] and sm.seen['deviceState']:
-      device_from_calib_euler = np.array(sm["liveCalibration"].rpyCalib, dtype=np.float32)
-      dc = DEVICE_CAMERAS[(str(sm['deviceState'].deviceType), str(sm['roadCameraState'].sensor))]
-      model_transform_main = get_warp_matrix(device_from_calib_euler, dc.ecam.intrinsics if main_wide_camera else dc.fcam.intrinsics, False).astype(np.float32)
-      model_transform_extra = get_warp_matrix(device_from_calib_euler, dc.ecam.intrinsics, True).astype(np.float32)
-      live_calib_seen = True
+    frame = step.read_frame(sm, meta_main, meta_extra)
+    if frame.prepare_only:
+      cloudlog.error(f"skipping model eval. Dropped {frame.vipc_dropped_frames} frames")
 
-    traffic_convention = np.zeros(2)
-    traffic_convention[int(is_rhd)] = 1
-
-    vec_desire = np.zeros(ModelConstants.DESIRE_LEN, dtype=np.float32)
-    if desire >= 0 and desire < ModelConstants.DESIRE_LEN:
-      vec_desire[desire] = 1
-
-    # tracked dropped frames
-    vipc_dropped_frames = max(0, meta_main.frame_id - last_vipc_frame_id - 1)
-    frames_dropped = frame_dropped_filter.update(min(vipc_dropped_frames, 10))
-    if run_count < 10: # let frame drops warm up
-      frame_dropped_filter.x = 0.
-      frames_dropped = 0.
-    run_count = run_count + 1
-
-    frame_drop_ratio = frames_dropped / (1 + frames_dropped)
-    prepare_only = vipc_dropped_frames > 0
-    if prepare_only:
-      cloudlog.error(f"skipping model eval. Dropped {vipc_dropped_frames} frames")
-
-    inputs:dict[str, np.ndarray] = {
-      'desire': vec_desire,
-      'traffic_convention': traffic_convention,
-      'lateral_control_params': lateral_control_params,
-      }
+    inputs = step.model_inputs(frame)
 
     mt1 = time.perf_counter()
-    model_output = model.run(buf_main, buf_extra, model_transform_main, model_transform_extra, inputs, prepare_only)
+    model_output = model.run(buf_main, buf_extra, frame.transform_main, frame.transform_extra, inputs, frame.prepare_only)
     mt2 = time.perf_counter()
     model_execution_time = mt2 - mt1
 
     if model_output is not None:
-      modelv2_send = messaging.new_message('modelV2')
-      drivingdata_send = messaging.new_message('drivingModelData')
-      posenet_send = messaging.new_message('cameraOdometry')
-      fill_model_msg(drivingdata_send, modelv2_send, model_output, v_ego, steer_delay,
-                     publish_state, meta_main.frame_id, meta_extra.frame_id, frame_id,
-                     frame_drop_ratio, meta_main.timestamp_eof, model_execution_time, live_calib_seen)
-
-      desire_state = modelv2_send.modelV2.meta.desireState
-      l_lane_change_prob = desire_state[log.Desire.laneChangeLeft]
-      r_lane_change_prob = desire_state[log.Desire.laneChangeRight]
-      lane_change_prob = l_lane_change_prob + r_lane_change_prob
-      DH.update(sm['carState'], sm['carControl'].latActive, lane_change_prob)
-      modelv2_send.modelV2.meta.laneChangeState = DH.lane_change_state
-      modelv2_send.modelV2.meta.laneChangeDirection = DH.lane_change_direction
-      drivingdata_send.drivingModelData.meta.laneChangeState = DH.lane_change_state
-      drivingdata_send.drivingModelData.meta.laneChangeDirection = DH.lane_change_direction
-
-      fill_pose_msg(posenet_send, model_output, meta_main.frame_id, vipc_dropped_frames, meta_main.timestamp_eof, live_calib_seen)
-      pm.send('modelV2', modelv2_send)
-      pm.send('drivingModelData', drivingdata_send)
-      pm.send('cameraOdometry', posenet_send)
-    last_vipc_frame_id = meta_main.frame_id
+      step.publish(pm, frame, model_output, model_execution_time)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-import bisect
 import math
 import os
 from enum import IntEnum
@@ -45,39 +44,130 @@ class ET:
 
 # get event name from enum
 EVENT_NAME = {v: k for k, v in EventName.schema.enumerants.items()}
+NUM_EVENT_NAMES = max(EVENT_NAME) + 1
+
+
+class EventDict(dict):
+  """EVENTS, with a bitmask of the events of each event type, rebuilt when an event is (re)defined or removed"""
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self._type_masks: dict[str, int] | None = None
+
+  def __setitem__(self, event_name: int, event) -> None:
+    super().__setitem__(event_name, event)
+    self._type_masks = None
+
+  def __delitem__(self, event_name: int) -> None:
+    super().__delitem__(event_name)
+    self._type_masks = None
+
+  def __ior__(self, other):
+    self.update(other)
+    return self
+
+  def update(self, *args, **kwargs) -> None:
+    super().update(*args, **kwargs)
+    self._type_masks = None
+
+  def setdefault(self, event_name: int, default=None):
+    self._type_masks = None
+    return super().setdefault(event_name, default)
+
+  def pop(self, event_name: int, *args):
+    self._type_masks = None
+    return super().pop(event_name, *args)
+
+  def popitem(self):
+    self._type_masks = None
+    return super().popitem()
+
+  def clear(self) -> None:
+    super().clear()
+    self._type_masks = None
+
+  @property
+  def type_masks(self) -> dict[str, int]:
+    if self._type_masks is None:
+      self._type_masks = {}
+      for e, types in self.items():
+        for et in types:
+          self._type_masks[et] = self._type_masks.get(et, 0) | (1 << e)
+    return self._type_masks
+
+
+def iter_bits(mask: int):
+  while mask:
+    low = mask & -mask
+    yield low.bit_length() - 1
+    mask ^= low
 
 
 class Events:
+  """
+  Active events as a bitmask indexed by EventName. An event added more than once is kept once in the mask
+  and again in the duplicates, so names and to_msg list it as often as it was added.
+  """
   def __init__(self):
-    self.events: list[int] = []
-    self.static_events: list[int] = []
-    self.event_counters = dict.fromkeys(EVENTS.keys(), 0)
+    self.mask = 0
+    self.duplicates: list[int] = []
+    self.static_mask = 0
+    self.static_duplicates: list[int] = []
+    # cycles each event has been active for, only the events in counted_mask are non-zero
+    self.event_counters = [0] * NUM_EVENT_NAMES
+    self.counted_mask = 0
+    self._names: list[int] | None = []
 
   @property
   def names(self) -> list[int]:
-    return self.events
+    if self._names is None:
+      self._names = list(iter_bits(self.mask))
+      if self.duplicates:
+        self._names = sorted(self._names + self.duplicates)
+    return self._names
 
   def __len__(self) -> int:
-    return len(self.events)
+    return self.mask.bit_count() + len(self.duplicates)
 
   def add(self, event_name: int, static: bool=False) -> None:
     if static:
-      bisect.insort(self.static_events, event_name)
-    bisect.insort(self.events, event_name)
+      if self.static_mask >> event_name & 1:
+        self.static_duplicates.append(event_name)
+      self.static_mask |= 1 << event_name
+    if self.mask >> event_name & 1:
+      self.duplicates.append(event_name)
+    self.mask |= 1 << event_name
+    self._names = None
 
   def clear(self) -> None:
-    self.event_counters = {k: (v + 1 if k in self.events else 0) for k, v in self.event_counters.items()}
-    self.events = self.static_events.copy()
+    for e in iter_bits(self.counted_mask & ~self.mask):
+      self.event_counters[e] = 0
+    for e in iter_bits(self.mask):
+      self.event_counters[e] += 1
+    self.counted_mask = self.mask
+
+    self.mask = self.static_mask
+    self.duplicates = self.static_duplicates.copy()
+    self._names = None
 
   def contains(self, event_type: str) -> bool:
-    return any(event_type in EVENTS.get(e, {}) for e in self.events)
+    return bool(self.mask & EVENTS.type_masks.get(event_type, 0))
 
   def create_alerts(self, event_types: list[str], callback_args=None):
     if callback_args is None:
       callback_args = []
 
+    type_masks = EVENTS.type_masks
+    alerting = 0
+    for et in event_types:
+      alerting |= type_masks.get(et, 0)
+    alerting &= self.mask
+    if not alerting:
+      return []
+
     ret = []
-    for e in self.events:
+    for e in self.names:
+      if not alerting >> e & 1:
+        continue
       types = EVENTS[e].keys()
       for et in event_types:
         if et in types:
@@ -93,11 +183,13 @@ class Events:
 
   def add_from_msg(self, events):
     for e in events:
-      bisect.insort(self.events, e.name.raw)
+      # skip events from a newer schema, they have no alerts here
+      if e.name.raw in EVENT_NAME:
+        self.add(e.name.raw)
 
   def to_msg(self):
     ret = []
-    for event_name in self.events:
+    for event_name in self.names:
       event = log.OnroadEvent.new_message()
       event.name = event_name
       for event_type in EVENTS.get(event_name, {}):
@@ -342,11 +434,12 @@ def personality_changed_alert(CP: car.CarParams, CS: car.CarState, sm: messaging
 
 
 
-EVENTS: dict[int, dict[str, Alert | AlertCallbackType]] = {
+EVENTS: EventDict = EventDict({
   # ********** events with no alerts **********
 
   EventName.stockFcw: {},
   EventName.actuatorsApiUnavailable: {},
+  EventName.plannerSolverFallback: {},
 
   # ********** events only containing alerts displayed in all states **********
 
@@ -954,7 +1047,7 @@ EVENTS: dict[int, dict[str, Alert | AlertCallbackType]] = {
     ET.WARNING: personality_changed_alert,
   },
 
-}
+})
 
 
 if __name__ == '__main__':
@@ -1,7 +1,5 @@
 #!/usr/bin/env python3
 import os
-import time
-import threading
 
 import cereal.messaging as messaging
 
@@ -10,8 +8,9 @@ from msgq.visionipc import VisionIpcClient, VisionStreamType
 from opendbc.safety import ALTERNATIVE_EXPERIENCE
 
 
-from openpilot.common.params import Params
+from openpilot.common.params import Params, ParamCallbackThread
 from openpilot.common.realtime import config_realtime_process, Priority, Ratekeeper, DT_CTRL
+from openpilot.common.stage_timer import StageTimer
 from openpilot.common.swaglog import cloudlog
 from openpilot.common.gps import get_gps_location_service
 
@@ -58,7 +57,8 @@ class SelfdriveD:
     self.disengage_on_accelerator = not (self.CP.alternativeExperience & ALTERNATIVE_EXPERIENCE.DISABLE_DISENGAGE_ON_GAS)
 
     # Setup sockets
-    self.pm = messaging.PubMaster(['selfdriveState', 'onroadEvents'])
+    self.pm = messaging.PubMaster(['selfdriveState', 'onroadEvents', 'selfdrivedTimings'])
+    self.timer = StageTimer('selfdrivedTimings', ['data_sample', 'update_events', 'state_machine', 'update_alerts', 'publish'], DT_CTRL)
 
     #self.gps_location_service = get_gps_location_service(self.params)
     #self.gps_packets = [self.gps_location_service]
@@ -84,11 +84,13 @@ class SelfdriveD:
 
     #longitudinalPlan', 'liveParameters', 'liveTorqueParameters',
 
+    # longitudinalPlan is only read for the planner's events, plannerd isn't always running
     self.sm = messaging.SubMaster(['deviceState', 'pandaStates', 'peripheralState',
                                    'carOutput',
                                    'managerState',
-                                   'controlsState', 'carControl'],
-                                   frequency=int(1/DT_CTRL))
+                                   'controlsState', 'carControl', 'longitudinalPlan'],
+                                   ignore_alive=['longitudinalPlan'], ignore_avg_freq=['longitudinalPlan'],
+                                   ignore_valid=['longitudinalPlan'], frequency=int(1/DT_CTRL))
 
     #self.sm = messaging.SubMaster([
     #'deviceState',
@@ -196,6 +198,9 @@ class SelfdriveD:
 
     #if not self.CP.notCar:
     #  self.events.add_from_msg(self.sm['driverMonitoringState'].events)
+    # the planner's events are for one plan, not for every cycle until the next one
+    if self.sm.updated['longitudinalPlan']:
+      self.events.add_from_msg(self.sm['longitudinalPlan'].events)
 
     # Add car events, ignore if CAN isn't valid
     if CS.canValid:
@@ -436,6 +441,7 @@ class SelfdriveD:
 
   def data_sample(self):
     car_state = messaging.recv_one(self.car_state_sock)
+    self.timer.start()
     CS = car_state.carState if car_state else self.CS_prev
 
     self.sm.update(0)
@@ -496,7 +502,7 @@ class SelfdriveD:
 
   def publish_selfdriveState(self, CS):
     # selfdriveState
-    ss_msg = messaging.new_message('selfdriveState')
+    ss_msg = self.pm.new_message('selfdriveState')
     ss_msg.valid = True
     ss = ss_msg.selfdriveState
     ss.enabled = self.enabled
@@ -526,14 +532,20 @@ class SelfdriveD:
 
   def step(self):
     CS = self.data_sample()
+    self.timer.mark('data_sample')
     self.update_events(CS)
+    self.timer.mark('update_events')
     if not self.CP.passive and self.initialized:
       self.enabled, self.active = self.state_machine.update(self.events)
+    self.timer.mark('state_machine')
     self.update_alerts(CS)
+    self.timer.mark('update_alerts')
 
     self.publish_selfdriveState(CS)
+    self.timer.mark('publish')
 
     self.CS_prev = CS
+    self.timer.finish(self.pm)
 
   def read_personality_param(self):
     try:
@@ -541,24 +553,20 @@ class SelfdriveD:
     except (ValueError, TypeError):
       return log.LongitudinalPersonality.standard
 
-  def params_thread(self, evt):
-    while not evt.is_set():
-      self.is_metric = self.params.get_bool("IsMetric")
-      self.experimental_mode = self.params.get_bool("ExperimentalMode") and self.CP.openpilotLongitudinalControl
-      self.personality = self.read_personality_param()
-      time.sleep(0.1)
+  def update_params(self, keys):
+    self.is_metric = self.params.get_bool("IsMetric")
+    self.experimental_mode = self.params.get_bool("ExperimentalMode") and self.CP.openpilotLongitudinalControl
+    self.personality = self.read_personality_param()
 
   def run(self):
-    e = threading.Event()
-    t = threading.Thread(target=self.params_thread, args=(e, ))
+    t = ParamCallbackThread(["IsMetric", "ExperimentalMode", "LongitudinalPersonality"], self.update_params)
     try:
       t.start()
       while True:
         self.step()
         self.rk.monitor_time()
     finally:
-      e.set()
-      t.join()
+      t.stop()
 
 
 def main():
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import argparse
+import random
+import time
+
+from cereal import car, log
+from cereal.messaging import SubMaster
+from openpilot.selfdrive.selfdrived.events import ET, EVENTS, Events
+from openpilot.selfdrive.test.process_replay.process_replay import CONFIGS
+
+# what selfdrived asks for every cycle, the state machine checks and the alerts of the enabled state
+CONTAINS = (ET.USER_DISABLE, ET.IMMEDIATE_DISABLE, ET.SOFT_DISABLE, ET.OVERRIDE_LATERAL, ET.OVERRIDE_LONGITUDINAL,
+            ET.NO_ENTRY, ET.ENABLE, ET.PRE_ENABLE)
+ALERT_TYPES = [ET.PERMANENT, ET.WARNING]
+
+
+def get_callback_args() -> list:
+  cfg = [c for c in CONFIGS if c.proc_name == 'selfdrived'][0]
+  return [car.CarParams.new_message(), car.CarState.new_message(), SubMaster(cfg.pubs), False, 0, log.LongitudinalPersonality.standard]
+
+
+def get_cycles(n: int, max_events: int, seed: int = 0) -> list[list[int]]:
+  """Events of n cycles, mostly the same from one cycle to the next like onroad"""
+  rng = random.Random(seed)
+  names = list(EVENTS)
+  cycles = []
+  cur: list[int] = []
+  for _ in range(n):
+    if rng.random() < 0.05:
+      cur = rng.sample(names, rng.randrange(max_events + 1))
+    cycles.append(cur)
+  return cycles
+
+
+def run(events: Events, cycles: list[list[int]], callback_args: list) -> float:
+  """Time per selfdrived cycle in us"""
+  st = time.perf_counter()
+  for frame, cycle in enumerate(cycles):
+    events.clear()
+    for e in cycle:
+      events.add(e)
+    for et in CONTAINS:
+      events.contains(et)
+    events.create_alerts(ALERT_TYPES, callback_args)
+    if frame % 100 == 0:
+      events.to_msg()
+  return (time.perf_counter() - st) / len(cycles) * 1e6
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Per-cycle cost of the Events container in selfdrived")
+  parser.add_argument("--count", type=int, default=20000)
+  args = parser.parse_args()
+
+  callback_args = get_callback_args()
+  for max_events in (0, 3, 10):
+    print(f"up to {max_events} events: {run(Events(), get_cycles(args.count, max_events), callback_args):.2f} us")
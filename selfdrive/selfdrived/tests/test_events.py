@@ -0,0 +1,90 @@
+from cereal import log
+from openpilot.selfdrive.selfdrived.events import ET, EVENTS, NUM_EVENT_NAMES, Events, NormalPermanentAlert
+
+EventName = log.OnroadEvent.EventName
+EVENT_TYPES = [v for k, v in vars(ET).items() if not k.startswith('_')]
+
+
+class TestEvents:
+  def test_add_clear(self):
+    events = Events()
+    events.add(EventName.doorOpen)
+    events.add(EventName.pcmEnable)
+    events.add(EventName.doorOpen)
+    assert events.names == sorted([EventName.doorOpen, EventName.doorOpen, EventName.pcmEnable])
+    assert len(events) == 3
+    assert events.contains(ET.ENABLE) and events.contains(ET.SOFT_DISABLE) and events.contains(ET.NO_ENTRY)
+    assert not events.contains(ET.IMMEDIATE_DISABLE) and not events.contains(ET.USER_DISABLE)
+
+    # duplicates are listed as often as they were added
+    msg = [(e.name, e.enable, e.softDisable, e.noEntry) for e in events.to_msg()]
+    expected = {EventName.doorOpen: ('doorOpen', False, True, True), EventName.pcmEnable: ('pcmEnable', True, False, False)}
+    assert msg == [expected[e] for e in events.names]
+
+    events.clear()
+    assert events.names == [] and len(events) == 0
+    assert not events.contains(ET.ENABLE)
+    assert events.event_counters[EventName.doorOpen] == 1 and events.event_counters[EventName.pcmEnable] == 1
+
+    # counters restart once an event is gone for a cycle
+    events.add(EventName.doorOpen)
+    events.clear()
+    assert events.event_counters[EventName.doorOpen] == 2 and events.event_counters[EventName.pcmEnable] == 0
+    events.clear()
+    assert events.event_counters[EventName.doorOpen] == 0
+
+  def test_static_events(self):
+    events = Events()
+    events.add(EventName.stockFcw, static=True)
+    events.add(EventName.doorOpen)
+    assert events.names == sorted([EventName.stockFcw, EventName.doorOpen])
+    for _ in range(3):
+      events.clear()
+      assert events.names == [EventName.stockFcw]
+    # an event without any types doesn't alert
+    assert not any(events.contains(et) for et in EVENT_TYPES)
+
+  def test_creation_delay(self):
+    # the permanent alert of canError only shows after it has been active for 1s
+    events = Events()
+    for i in range(100):
+      events.clear()
+      events.add(EventName.canError)
+      assert events.event_counters[EventName.canError] == i
+      alerts = [a.alert_type for a in events.create_alerts([ET.PERMANENT, ET.NO_ENTRY])]
+      assert alerts == (['canError/permanent', 'canError/noEntry'] if i == 99 else ['canError/noEntry'])
+    assert events.create_alerts([ET.ENABLE, ET.WARNING]) == []
+
+  def test_add_from_msg(self):
+    events = Events()
+    # an event from a newer schema, unknown here
+    msg = [log.OnroadEvent.new_message(name=EventName.buttonCancel), log.OnroadEvent.new_message(name=NUM_EVENT_NAMES)]
+    events.add_from_msg(msg)
+    assert events.names == [EventName.buttonCancel]
+    assert events.contains(ET.USER_DISABLE)
+    events.clear()
+    assert events.event_counters[EventName.buttonCancel] == 1
+
+  def test_redefined_event(self):
+    events = Events()
+    events.add(0)
+    event = EVENTS[0]
+    event_dict = EVENTS
+    try:
+      EVENTS[0] = {ET.NO_ENTRY: NormalPermanentAlert("alert")}
+      assert events.contains(ET.NO_ENTRY)
+      EVENTS[0] = {}
+      assert not events.contains(ET.NO_ENTRY)
+
+      EVENTS.update({0: {ET.NO_ENTRY: NormalPermanentAlert("alert")}})
+      assert events.contains(ET.NO_ENTRY)
+      EVENTS.pop(0)
+      assert not events.contains(ET.NO_ENTRY)
+      EVENTS.setdefault(0, {ET.NO_ENTRY: NormalPermanentAlert("alert")})
+      assert events.contains(ET.NO_ENTRY)
+      del EVENTS[0]
+      assert not events.contains(ET.NO_ENTRY)
+      event_dict |= {0: {ET.NO_ENTRY: NormalPermanentAlert("alert")}}
+      assert events.contains(ET.NO_ENTRY)
+    finally:
+      EVENTS[0] = event
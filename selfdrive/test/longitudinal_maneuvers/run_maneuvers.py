@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import os
+import sys
+import time
+
+from tabulate import tabulate
+
+from openpilot.selfdrive.test.longitudinal_maneuvers.test_longitudinal import MANEUVERS, get_mode
+
+
+def run_maneuver(i: int) -> tuple[bool, float, list[str]]:
+  """Whether the maneuver passed, the seconds it took and why it failed"""
+  out = io.StringIO()
+  st = time.monotonic()
+  with contextlib.redirect_stdout(out):
+    valid, _ = MANEUVERS[i].evaluate()
+  reasons = list(dict.fromkeys(line for line in out.getvalue().splitlines() if not line.startswith("maneuver end")))
+  return valid, time.monotonic() - st, reasons
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Run the longitudinal maneuvers of test_longitudinal.py in parallel, faster than realtime",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+  parser.add_argument("-k", "--filter", default="", help="Only run the maneuvers with this in their title")
+  args = parser.parse_args()
+
+  idxs = [i for i, m in enumerate(MANEUVERS) if args.filter in m.title]
+  st = time.monotonic()
+  with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+    results = list(pool.map(run_maneuver, idxs))
+  elapsed = time.monotonic() - st
+
+  rows = []
+  for i, (valid, wall_time, reasons) in zip(idxs, results, strict=True):
+    m = MANEUVERS[i]
+    rows.append([m.title, get_mode(m), "pass" if valid else "FAIL", m.duration, wall_time, m.duration / wall_time, "\n".join(reasons)])
+  print(tabulate(rows, ["maneuver", "mode", "result", "sim (s)", "wall (s)", "x realtime", "failures"], tablefmt="simple_grid", floatfmt=".2f"))
+
+  failed = sum(not valid for valid, _, _ in results)
+  print(f"{len(results) - failed} passed, {failed} failed in {elapsed:.1f} s, {sum(MANEUVERS[i].duration for i in idxs) / elapsed:.0f}x realtime")
+  sys.exit(int(failed > 0))
@@ -1,5 +1,5 @@
 import itertools
-from parameterized import parameterized_class
+import pytest
 
 from openpilot.selfdrive.controls.lib.longitudinal_mpc_lib.long_mpc import STOP_DISTANCE
 from openpilot.selfdrive.test.longitudinal_maneuvers.maneuver import Maneuver
@@ -178,14 +178,18 @@ def create_maneuvers(kwargs):
   return maneuvers
 
 
-@parameterized_class(("e2e", "force_decel"), itertools.product([True, False], repeat=2))
-class TestLongitudinalControl:
-  e2e: bool
-  force_decel: bool
+def get_mode(maneuver):
+  return ("e2e" if maneuver.e2e else "acc") + (", force decel" if maneuver.force_decel else "")
+
+
+# every maneuver in every mode is a test of its own, so they are spread over the workers
+MANEUVERS = [m for e2e, force_decel in itertools.product([True, False], repeat=2)
+             for m in create_maneuvers({"e2e": e2e, "force_decel": force_decel})]
 
-  def test_maneuver(self, subtests):
-    for maneuver in create_maneuvers({"e2e": self.e2e, "force_decel": self.force_decel}):
-      with subtests.test(title=maneuver.title, e2e=maneuver.e2e, force_decel=maneuver.force_decel):
-        print(maneuver.title, f'in {"e2e" if maneuver.e2e else "acc"} mode')
-        valid, _ = maneuver.evaluate()
-        assert valid
+
+class TestLongitudinalControl:
+  @pytest.mark.parametrize("maneuver", MANEUVERS, ids=lambda m: f"{m.title} ({get_mode(m)})")
+  def test_maneuver(self, maneuver):
+    print(maneuver.title, f'in {get_mode(maneuver)} mode')
+    valid, _ = maneuver.evaluate()
+    assert valid
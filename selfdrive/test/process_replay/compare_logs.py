@@ -3,7 +3,7 @@ import sys
 import math
 import capnp
 import numbers
-import dictdiffer
+import numpy as np
 from collections import Counter
 
 from openpilot.tools.lib.logreader import LogReader
@@ -39,6 +39,119 @@ def remove_ignored_fields(msg, ignore):
   return msg
 
 
+def dotted(path):
+  # same path notation as dictdiffer
+  if all(isinstance(k, str) and '.' not in k for k in path):
+    return '.'.join(path)
+  return list(path)
+
+
+def to_python(v):
+  # same values as to_dict(verbose=True)
+  if isinstance(v, capnp.lib.capnp._DynamicStructReader):
+    return v.to_dict(verbose=True)
+  elif isinstance(v, capnp.lib.capnp._DynamicListReader):
+    return [to_python(x) for x in v]
+  elif isinstance(v, capnp.lib.capnp._DynamicEnum):
+    return v._as_str()
+  return v
+
+
+def outside_tolerance(a, b, tolerance):
+  if a == b:
+    return False
+  if isinstance(a, numbers.Number) and isinstance(b, numbers.Number):
+    if not (math.isfinite(a) and math.isfinite(b)):
+      return not (math.isnan(a) and math.isnan(b))
+    return not math.isclose(a, b, rel_tol=EPSILON) and abs(a - b) > max(tolerance, tolerance * max(abs(a), abs(b)))
+  return True
+
+
+def outside_tolerance_array(a, b, tolerance):
+  with np.errstate(invalid='ignore'):
+    d = np.abs(a - b)
+    m = np.maximum(np.abs(a), np.abs(b))
+    finite_diff = (d > EPSILON * m) & (d > np.maximum(tolerance, tolerance * m))
+  nonfinite_diff = ~(np.isnan(a) & np.isnan(b))
+  return (a != b) & np.where(np.isfinite(a) & np.isfinite(b), finite_diff, nonfinite_diff)
+
+
+class StructDiff:
+  """
+  Walks two capnp readers in lockstep by schema, without converting them to dicts.
+  Gives the same diff as dictdiffer on to_dict(verbose=True), minus the ignored fields and changes within tolerance.
+  """
+  def __init__(self, ignore_fields, tolerance):
+    self.ignore = set(ignore_fields)
+    # lists with ignored elements, e.g. liveTracks.0.yRel
+    self.ignore_items = {f.rsplit(".", 1)[0] for f in self.ignore if f.rsplit(".", 1)[-1].isdigit()}
+    self.tolerance = tolerance
+    self.fields: dict[int, tuple[bool, tuple[str, ...]]] = {}
+
+  def struct_fields(self, msg):
+    schema = msg.schema
+    node_id = schema.node.id
+    if node_id not in self.fields:
+      self.fields[node_id] = (len(schema.union_fields) > 0, tuple(schema.non_union_fields))
+    return self.fields[node_id]
+
+  def struct_keys(self, msg, has_union, non_union_fields):
+    return ((msg.which(),) + non_union_fields) if has_union else non_union_fields
+
+  def diff(self, msg1, msg2):
+    out = []
+    self.diff_struct(msg1, msg2, [], "", out)
+    return out
+
+  def diff_value(self, v1, v2, path, spath, out):
+    if isinstance(v1, capnp.lib.capnp._DynamicStructReader):
+      self.diff_struct(v1, v2, path, spath, out)
+    elif isinstance(v1, capnp.lib.capnp._DynamicListReader):
+      self.diff_list(v1, v2, path, spath, out)
+    elif isinstance(v1, capnp.lib.capnp._DynamicEnum):
+      self.diff_value(v1._as_str(), v2._as_str(), path, spath, out)
+    elif outside_tolerance(v1, v2, self.tolerance):
+      out.append(("change", dotted(path), (v1, v2)))
+
+  def diff_struct(self, msg1, msg2, path, spath, out):
+    has_union, non_union_fields = self.struct_fields(msg1)
+    keys1 = self.struct_keys(msg1, has_union, non_union_fields)
+    keys2 = keys1 if not has_union or msg1.which() == msg2.which() else self.struct_keys(msg2, has_union, non_union_fields)
+
+    prefix = spath + "." if spath else ""
+    for k in keys1:
+      if k in keys2 and prefix + k not in self.ignore:
+        self.diff_value(getattr(msg1, k), getattr(msg2, k), path + [k], prefix + k, out)
+
+    if keys1 is not keys2:
+      addition = [(k, to_python(getattr(msg2, k))) for k in keys2 if k not in keys1 and prefix + k not in self.ignore]
+      deletion = [(k, to_python(getattr(msg1, k))) for k in keys1 if k not in keys2 and prefix + k not in self.ignore]
+      if addition:
+        out.append(("add", dotted(path), addition))
+      if deletion:
+        out.append(("remove", dotted(path), deletion))
+
+  def diff_list(self, l1, l2, path, spath, out):
+    n1, n2 = len(l1), len(l2)
+    n = min(n1, n2)
+    prefix = spath + "."
+    ignore_items = spath in self.ignore_items
+
+    values1, values2 = list(l1), list(l2)
+    if n > 0 and isinstance(values1[0], float) and not ignore_items:
+      for i in np.flatnonzero(outside_tolerance_array(np.array(values1[:n]), np.array(values2[:n]), self.tolerance)):
+        out.append(("change", dotted(path + [int(i)]), (values1[i], values2[i])))
+    else:
+      for i in range(n):
+        if not ignore_items or prefix + str(i) not in self.ignore:
+          self.diff_value(values1[i], values2[i], path + [i], prefix + str(i), out)
+
+    if n2 > n:
+      out.append(("add", dotted(path), [(i, to_python(values2[i])) for i in range(n, n2)]))
+    if n1 > n:
+      out.append(("remove", dotted(path), [(i, to_python(values1[i])) for i in reversed(range(n, n1))]))
+
+
 def compare_logs(log1, log2, ignore_fields=None, ignore_msgs=None, tolerance=None,):
   if ignore_fields is None:
     ignore_fields = []
@@ -56,36 +169,13 @@ def compare_logs(log1, log2, ignore_fields=None, ignore_msgs=None, tolerance=Non
     cnt2 = Counter(m.which() for m in log2)
     raise Exception(f"logs are not same length: {len(log1)} VS {len(log2)}\n\t\t{cnt1}\n\t\t{cnt2}")
 
+  struct_diff = StructDiff(ignore_fields, tolerance)
   diff = []
   for msg1, msg2 in zip(log1, log2, strict=True):
     if msg1.which() != msg2.which():
       raise Exception("msgs not aligned between logs")
 
-    msg1 = remove_ignored_fields(msg1, ignore_fields)
-    msg2 = remove_ignored_fields(msg2, ignore_fields)
-
-    if msg1.to_bytes() != msg2.to_bytes():
-      msg1_dict = msg1.as_reader().to_dict(verbose=True)
-      msg2_dict = msg2.as_reader().to_dict(verbose=True)
-
-      dd = dictdiffer.diff(msg1_dict, msg2_dict, ignore=ignore_fields)
-
-      # Dictdiffer only supports relative tolerance, we also want to check for absolute
-      # TODO: add this to dictdiffer
-      def outside_tolerance(diff):
-        try:
-          if diff[0] == "change":
-            a, b = diff[2]
-            finite = math.isfinite(a) and math.isfinite(b)
-            if finite and isinstance(a, numbers.Number) and isinstance(b, numbers.Number):
-              return abs(a - b) > max(tolerance, tolerance * max(abs(a), abs(b)))
-        except TypeError:
-          pass
-        return True
-
-      dd = list(filter(outside_tolerance, dd))
-
-      diff.extend(dd)
+    diff.extend(struct_diff.diff(msg1, msg2))
   return diff
 
 
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+import os
+import argparse
+import time
+from abc import ABC, abstractmethod
+from typing import Any
+
+import capnp
+
+import cereal.messaging as messaging
+from cereal import car
+from openpilot.common.params import Params
+from openpilot.selfdrive.controls import plannerd
+from openpilot.selfdrive.controls.radard import RadarD
+from openpilot.selfdrive.controls.lib.ldw import LaneDepartureWarning
+from openpilot.selfdrive.controls.lib.longitudinal_planner import LongitudinalPlanner
+from openpilot.selfdrive.locationd import calibrationd, torqued
+from openpilot.selfdrive.locationd.calibrationd import Calibrator
+from openpilot.selfdrive.locationd.locationd import LocationD
+from openpilot.selfdrive.locationd.paramsd import ParamsD
+from openpilot.selfdrive.locationd.torqued import TorqueEstimator
+from openpilot.selfdrive.test.process_replay.compare_logs import compare_logs
+from openpilot.selfdrive.test.process_replay.process_replay import ProcessConfig, ProcessContainer, get_process_config, replay_process
+from openpilot.tools.lib.logreader import LogIterable, LogReader
+from openpilot.tools.lib.framereader import BaseFrameReader
+
+
+def get_car_params() -> car.CarParams:
+  return messaging.log_from_bytes(Params().get("CarParams", block=True), car.CarParams)
+
+
+class ReplayPubMaster(messaging.PubMaster):
+  """In-memory PubMaster, holds everything a daemon published during one step"""
+  def __init__(self, services: list[str]):
+    self.msgs: dict[str, list[bytes]] = {s: [] for s in services}
+    self.arena_words: dict[str, int] = {}
+
+  def send(self, s: str, dat: bytes | capnp.lib.capnp._DynamicStructBuilder) -> None:
+    self.msgs[s].append(self.serialize(s, dat))
+
+  def drain(self, s: str) -> list[bytes]:
+    msgs, self.msgs[s] = self.msgs[s], []
+    return msgs
+
+
+class InProcessDaemon(ABC):
+  """
+  One loop iteration of a daemon's main(), run on the daemon's own step classes.
+  The SubMaster is built exactly like the daemon builds it, but is fed through update_msgs instead of its sockets.
+  """
+  sm: messaging.SubMaster
+
+  def update(self, pm: ReplayPubMaster, msgs: list[capnp._DynamicStructReader]) -> None:
+    # SubMaster sockets are conflated, only the latest message of each service is seen
+    latest = {m.which(): m for m in msgs if m.which() in self.sm.services}
+    self.sm.update_msgs(msgs[-1].logMonoTime * 1e-9, list(latest.values()))
+    self.step(pm, msgs)
+
+  @abstractmethod
+  def step(self, pm: ReplayPubMaster, msgs: list[capnp._DynamicStructReader]) -> None:
+    pass
+
+
+class RadardDaemon(InProcessDaemon):
+  def __init__(self):
+    CP = get_car_params()
+    self.sm = messaging.SubMaster(['modelV2', 'carState', 'liveTracks'], poll='modelV2')
+    self.RD = RadarD(CP.radarDelay)
+
+  def step(self, pm, msgs):
+    self.RD.update(self.sm, self.sm['liveTracks'])
+    self.RD.publish(pm)
+
+
+class PlannerdDaemon(InProcessDaemon):
+  def __init__(self):
+    CP = get_car_params()
+    self.sm = messaging.SubMaster(['carControl', 'carState', 'controlsState', 'liveParameters', 'radarState', 'modelV2', 'selfdriveState'],
+                                  poll='modelV2', ignore_avg_freq=['radarState'])
+    self.ldw = LaneDepartureWarning()
+    self.longitudinal_planner = LongitudinalPlanner(CP)
+
+  def step(self, pm, msgs):
+    plannerd.step(self.sm, pm, self.longitudinal_planner, self.ldw)
+
+
+class CalibrationdDaemon(InProcessDaemon):
+  def __init__(self):
+    self.sm = messaging.SubMaster(['cameraOdometry', 'carState', 'carParams'], poll='cameraOdometry')
+    self.calibrator = Calibrator(param_put=True)
+
+  def step(self, pm, msgs):
+    calibrationd.step(self.sm, pm, self.calibrator)
+
+
+class TorquedDaemon(InProcessDaemon):
+  def __init__(self):
+    self.sm = messaging.SubMaster(['carControl', 'carOutput', 'carState', 'liveCalibration', 'livePose'], poll='livePose')
+    self.params = Params()
+    self.estimator = TorqueEstimator(get_car_params())
+
+  def step(self, pm, msgs):
+    torqued.step(self.sm, pm, self.params, self.estimator)
+
+
+class ParamsdDaemon(InProcessDaemon):
+  def __init__(self):
+    self.sm = messaging.SubMaster(['livePose', 'liveCalibration', 'carState'], poll='livePose')
+    debug, replay = (bool(int(os.getenv(k, "0"))) for k in ("DEBUG", "REPLAY"))
+    self.paramsd = ParamsD(get_car_params(), Params(), debug, replay)
+
+  def step(self, pm, msgs):
+    self.paramsd.update(self.sm)
+    if self.sm.updated['livePose']:
+      self.paramsd.publish(self.sm, pm)
+
+
+class LocationdDaemon(InProcessDaemon):
+  def __init__(self):
+    self.sm = messaging.SubMaster(['carState', 'liveCalibration', 'cameraOdometry'], poll='cameraOdometry')
+    debug = bool(int(os.getenv("DEBUG", "0")))
+    self.locationd = LocationD(Params(), debug, self.sm.simulation)
+
+  def step(self, pm, msgs):
+    # sensors are read from separate, non-conflated sockets
+    acc_msgs = [m for m in msgs if m.which() == 'accelerometer']
+    gyro_msgs = [m for m in msgs if m.which() == 'gyroscope']
+
+    self.locationd.update(self.sm, acc_msgs, gyro_msgs)
+    if self.sm.updated['cameraOdometry']:
+      self.locationd.publish(self.sm, pm, acc_msgs, gyro_msgs)
+
+
+IN_PROCESS_DAEMONS: dict[str, type[InProcessDaemon]] = {
+  "radard": RadardDaemon,
+  "plannerd": PlannerdDaemon,
+  "calibrationd": CalibrationdDaemon,
+  "torqued": TorquedDaemon,
+  "paramsd": ParamsdDaemon,
+  "locationd": LocationdDaemon,
+}
+
+
+class InProcessContainer(ProcessContainer):
+  """
+  Drop-in replacement for ProcessContainer that steps a pure-Python daemon in this process,
+  skipping process startup and the fake event handshake for every message.
+  """
+  def __init__(self, cfg: ProcessConfig):
+    assert cfg.proc_name in IN_PROCESS_DAEMONS, f"{cfg.proc_name} can't be replayed in-process"
+    super().__init__(cfg)
+    self.daemon: InProcessDaemon | None = None
+    self.output_pm = ReplayPubMaster(self.cfg.subs)
+
+  def start(
+    self, params_config: dict[str, Any], environ_config: dict[str, Any],
+    all_msgs: LogIterable, frs: dict[str, BaseFrameReader] | None,
+    fingerprint: str | None, capture_output: bool
+  ):
+    assert not capture_output, "output capture is not supported for in-process replay"
+
+    with self.prefix:
+      self._setup_env(params_config, environ_config)
+
+      if self.cfg.config_callback is not None:
+        params = Params()
+        self.cfg.config_callback(params, self.cfg, all_msgs)
+
+      if self.cfg.init_callback is not None:
+        self.cfg.init_callback(None, None, all_msgs, fingerprint)
+
+      self.daemon = IN_PROCESS_DAEMONS[self.cfg.proc_name]()
+
+  def stop(self):
+    with self.prefix:
+      self.daemon = None
+      self.prefix.clean_dirs()
+      self._clean_env()
+
+  def run_step(self, msg: capnp._DynamicStructReader, frs: dict[str, BaseFrameReader] | None) -> list[capnp._DynamicStructReader]:
+    assert self.daemon is not None
+
+    output_msgs = []
+    with self.prefix:
+      end_of_cycle = True
+      if self.cfg.should_recv_callback is not None:
+        end_of_cycle = self.cfg.should_recv_callback(msg, self.cfg, self.cnt)
+
+      self.msg_queue.append(msg)
+      if end_of_cycle:
+        start_cpu, start_wall = time.thread_time(), time.perf_counter()
+        self.daemon.update(self.output_pm, self.msg_queue)
+        if self.step_times is not None:
+          self.step_times.append((time.perf_counter() - start_wall, time.thread_time() - start_cpu))
+        self.msg_queue = []
+
+        # same ordering and timestamps as draining the output sockets of a real process
+        for s in self.cfg.subs:
+          for dat in self.output_pm.drain(s):
+            m = messaging.log_from_bytes(dat).as_builder()
+            m.logMonoTime = msg.logMonoTime + int(self.cfg.processing_time * 1e9)
+            output_msgs.append(m.as_reader())
+        self.cnt += 1
+
+    return output_msgs
+
+
+def replay_process_in_process(cfg: ProcessConfig | list[ProcessConfig], lr: LogIterable, *args, **kwargs) -> list[capnp._DynamicStructReader]:
+  return replay_process(cfg, lr, *args, container_cls=InProcessContainer, **kwargs)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Replay pure-Python daemons in-process and compare timing with process replay")
+  parser.add_argument("process", choices=IN_PROCESS_DAEMONS.keys())
+  parser.add_argument("route", help="The route or segment to replay")
+  parser.add_argument("--compare", action="store_true", help="Also run regular process replay and diff the outputs")
+  args = parser.parse_args()
+
+  cfg = get_process_config(args.process)
+  lr = list(LogReader(args.route))
+
+  st = time.monotonic()
+  log_msgs = replay_process_in_process(cfg, lr)
+  print(f"in-process replay: {len(log_msgs)} msgs in {time.monotonic() - st:.2f}s")
+
+  if args.compare:
+    st = time.monotonic()
+    ref_msgs = replay_process(cfg, lr)
+    print(f"process replay: {len(ref_msgs)} msgs in {time.monotonic() - st:.2f}s")
+
+    diff = compare_logs(ref_msgs, log_msgs, cfg.ignore, tolerance=cfg.tolerance)
+    print(f"{len(diff)} differences")
+    for d in diff:
+      print(d)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import os
 import sys
+import argparse
 from collections import defaultdict
 from typing import Any
 import tempfile
@@ -15,6 +16,7 @@ from openpilot.system.hardware import PC
 from openpilot.tools.lib.openpilotci import get_url
 from openpilot.selfdrive.test.process_replay.compare_logs import compare_logs, format_diff
 from openpilot.selfdrive.test.process_replay.process_replay import get_process_config, replay_process
+from openpilot.selfdrive.test.process_replay.offline_modeld import offline_modeld
 from openpilot.tools.lib.framereader import FrameReader, NumpyFrameReader
 from openpilot.tools.lib.logreader import LogReader, save_log
 from openpilot.tools.lib.github_utils import GithubUtils
@@ -141,7 +143,7 @@ def trim_logs_to_max_frames(logs, max_frames, frs_types, include_all_types):
   return all_msgs
 
 
-def model_replay(lr, frs):
+def model_replay(lr, frs, offline=False):
   # modeld is using frame pairs
   modeld_logs = trim_logs_to_max_frames(lr, MAX_FRAMES, {"roadCameraState", "wideRoadCameraState"}, {"roadEncodeIdx", "wideRoadEncodeIdx", "carParams"})
   dmodeld_logs = trim_logs_to_max_frames(lr, MAX_FRAMES, {"driverCameraState"}, {"driverEncodeIdx", "carParams"})
@@ -160,7 +162,7 @@ def model_replay(lr, frs):
   modeld = get_process_config("modeld")
   dmonitoringmodeld = get_process_config("dmonitoringmodeld")
 
-  modeld_msgs = replay_process(modeld, modeld_logs, frs)
+  modeld_msgs = offline_modeld(modeld_logs, frs) if offline else replay_process(modeld, modeld_logs, frs)
   if isinstance(frs['roadCameraState'], NumpyFrameReader):
     del frs['roadCameraState'].frames
     del frs['wideRoadCameraState'].frames
@@ -194,9 +196,8 @@ def model_replay(lr, frs):
   return msgs
 
 
-def get_frames():
-  regen_cache = "--regen-cache" in sys.argv
-  cache = "--cache" in sys.argv or not PC or regen_cache
+def get_frames(cache=False, regen_cache=False):
+  cache = cache or not PC or regen_cache
   videos = ('fcamera.hevc', 'dcamera.hevc', 'ecamera.hevc')
   cams = ('roadCameraState', 'driverCameraState', 'wideRoadCameraState')
 
@@ -219,17 +220,24 @@ def get_frames():
 
 
 if __name__ == "__main__":
-  update = "--update" in sys.argv or (os.getenv("GIT_BRANCH", "") == 'master')
+  parser = argparse.ArgumentParser(description="Replay the models over the test route and compare to the master outputs")
+  parser.add_argument("--update", action="store_true", help="Upload the outputs as the new reference")
+  parser.add_argument("--cache", action="store_true", help="Decode the frames once and cache them")
+  parser.add_argument("--regen-cache", action="store_true", help="Decode the frames again, even if they are cached")
+  parser.add_argument("--offline", action="store_true", help="Run modeld with the pipelined offline runner instead of the process")
+  args = parser.parse_args()
+
+  update = args.update or (os.getenv("GIT_BRANCH", "") == 'master')
   replay_dir = os.path.dirname(os.path.abspath(__file__))
 
   # load logs
   lr = list(LogReader(get_url(TEST_ROUTE, SEGMENT, "rlog.zst")))
-  frs = get_frames()
+  frs = get_frames(args.cache, args.regen_cache)
 
   log_msgs = []
   # run replays
   if not NO_MODEL:
-    log_msgs += model_replay(lr, frs)
+    log_msgs += model_replay(lr, frs, args.offline)
 
   # get diff
   failed = False
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import capnp
+import numpy as np
+
+import cereal.messaging as messaging
+from msgq.visionipc import VisionIpcClient, VisionIpcServer, VisionBuf
+from opendbc.car.car_helpers import interfaces
+from openpilot.system.hardware import TICI
+from openpilot.selfdrive.modeld.modeld import SM_SERVICES, FrameInputs, FrameMeta, ModelState, ModeldStep
+from openpilot.selfdrive.modeld.models.commonmodel_pyx import CLContext
+from openpilot.selfdrive.test.process_replay.compare_logs import compare_logs
+from openpilot.selfdrive.test.process_replay.inprocess_replay import ReplayPubMaster
+from openpilot.selfdrive.test.process_replay.process_replay import ProcessConfig, get_process_config, replay_process
+from openpilot.selfdrive.test.process_replay.vision_meta import available_streams, meta_from_camera_state
+from openpilot.selfdrive.test.process_replay.regen import setup_data_readers
+from openpilot.tools.lib.framereader import BaseFrameReader
+from openpilot.tools.lib.logreader import LogIterable, save_log
+
+# frames decoded ahead of the model, per camera
+DECODE_AHEAD = 20
+# warped model inputs, one is filled while the model runs on the other
+IMG_SLOTS = 2
+
+
+class FramePrefetcher:
+  """Decodes the frames of one camera in the order they are needed, on a background thread"""
+  def __init__(self, fr: BaseFrameReader, frame_ids: list[int]):
+    self.fr = fr
+    self.frame_ids = deque(frame_ids)
+    self.pending: deque[tuple[int, Future]] = deque()
+    # frame readers aren't thread safe, so each camera gets its own worker
+    self.pool = ThreadPoolExecutor(max_workers=1)
+    self._fill()
+
+  def _decode(self, frame_id: int) -> bytes:
+    return self.fr.get(frame_id, pix_fmt="nv12")[0].flatten().tobytes()
+
+  def _fill(self):
+    while self.frame_ids and len(self.pending) < DECODE_AHEAD:
+      frame_id = self.frame_ids.popleft()
+      self.pending.append((frame_id, self.pool.submit(self._decode, frame_id)))
+
+  def get(self, frame_id: int) -> bytes:
+    expected_id, fut = self.pending.popleft()
+    assert expected_id == frame_id, f"frames requested out of order: {frame_id}, expected {expected_id}"
+    self._fill()
+    return fut.result()
+
+  def close(self):
+    self.pool.shutdown(cancel_futures=True)
+
+
+class FrameWarper:
+  """
+  Warps decoded frames into the model input images on a single background thread.
+  The frames go through a VisionIpc loopback, so the model sees the same buffers as it would from camerad.
+  """
+  def __init__(self, model: ModelState, cl_context: CLContext, frs: dict[str, BaseFrameReader],
+               frame_ids: dict[str, list[int]], main_camera: str, extra_camera: str | None):
+    self.model = model
+    self.main_camera, self.extra_camera = main_camera, extra_camera
+    self.cameras = [c for c in (main_camera, extra_camera) if c is not None]
+    self.prefetchers = {c: FramePrefetcher(frs[c], frame_ids[c]) for c in self.cameras}
+
+    name = f"offline_modeld_{os.getpid()}"
+    self.streams = {c: meta_from_camera_state(c).stream for c in self.cameras}
+    self.server = VisionIpcServer(name)
+    for c in self.cameras:
+      self.server.create_buffers(self.streams[c], 2, frs[c].w, frs[c].h)
+    self.server.start_listener()
+    self.clients = {c: VisionIpcClient(name, self.streams[c], False, cl_context) for c in self.cameras}
+    for client in self.clients.values():
+      while not client.connect(False):
+        time.sleep(0.01)
+
+    self.slots = [{key: np.zeros(model.input_shapes[key], dtype=np.float32) for key in model.frames} for _ in range(IMG_SLOTS)]
+    self.pool = ThreadPoolExecutor(max_workers=1)
+
+  def _recv(self, camera: str, meta: FrameMeta) -> VisionBuf:
+    dat = self.prefetchers[camera].get(meta.frame_id)
+    self.server.send(self.streams[camera], dat, meta.frame_id, meta.timestamp_sof, meta.timestamp_eof)
+    buf = self.clients[camera].recv()
+    assert buf is not None, f"no frame received from {camera}"
+    return buf
+
+  def _warp(self, frame: FrameInputs, slot: int) -> tuple[dict[str, np.ndarray], float]:
+    st = time.perf_counter()
+    buf_main = self._recv(self.main_camera, frame.meta_main)
+    buf_extra = self._recv(self.extra_camera, frame.meta_extra) if self.extra_camera is not None else buf_main
+    self.model.prepare_imgs(buf_main, buf_extra, frame.transform_main, frame.transform_extra, self.slots[slot])
+    return self.slots[slot], time.perf_counter() - st
+
+  def submit(self, frame: FrameInputs, slot: int) -> Future:
+    return self.pool.submit(self._warp, frame, slot)
+
+  def close(self):
+    self.pool.shutdown(cancel_futures=True)
+    for prefetcher in self.prefetchers.values():
+      prefetcher.close()
+
+
+def get_steer_delay(all_msgs: list[capnp._DynamicStructReader], fingerprint: str | None) -> float:
+  if fingerprint is not None:
+    CarInterface, _, _, _ = interfaces[fingerprint]
+    CP = CarInterface.get_non_essential_params(fingerprint)
+  else:
+    CP = next(m.carParams for m in all_msgs if m.which() == "carParams")
+  # same as modeld
+  return CP.steerActuatorDelay + .2
+
+
+def get_cycles(cfg: ProcessConfig, all_msgs: list[capnp._DynamicStructReader]) -> list[list[capnp._DynamicStructReader]]:
+  """Groups the messages into the model runs process replay would trigger"""
+  cycles, queue = [], []
+  for msg in all_msgs:
+    if msg.which() not in cfg.pubs:
+      continue
+    queue.append(msg)
+    if cfg.should_recv_callback(msg, cfg, len(cycles)):
+      cycles.append(queue)
+      queue = []
+  return cycles
+
+
+def frame_meta(msgs: list[capnp._DynamicStructReader], camera: str) -> FrameMeta:
+  camera_state = getattr(next(m for m in reversed(msgs) if m.which() == camera), camera)
+  meta = FrameMeta()
+  meta.frame_id, meta.timestamp_sof, meta.timestamp_eof = camera_state.frameId, camera_state.timestampSof, camera_state.timestampEof
+  return meta
+
+
+def offline_modeld(lr: LogIterable, frs: dict[str, BaseFrameReader], fingerprint: str | None = None) -> list[capnp._DynamicStructReader]:
+  """
+  Runs modeld over a log without the process and realtime handshake of process replay. Frames are decoded in a background pool
+  and warped one frame ahead of the model, so on a CPU machine the replay is bounded by inference.
+  The modelV2, drivingModelData and cameraOdometry outputs match process replay of modeld, except for the execution times.
+  """
+  assert not TICI, "offline modeld runs the ONNX CPU runner"
+
+  cfg = get_process_config("modeld")
+  all_msgs = sorted(lr, key=lambda m: m.logMonoTime)
+  cfg.vision_pubs = [meta.camera_state for meta in available_streams(all_msgs) if meta.camera_state in cfg.vision_pubs]
+  assert len(cfg.vision_pubs) != 0, "no road camera in log"
+  main_camera = "roadCameraState" if "roadCameraState" in cfg.vision_pubs else "wideRoadCameraState"
+  extra_camera = "wideRoadCameraState" if len(cfg.vision_pubs) == 2 else None
+
+  cycles = get_cycles(cfg, all_msgs)
+  metas = [(frame_meta(msgs, main_camera), frame_meta(msgs, extra_camera) if extra_camera is not None else None) for msgs in cycles]
+  frame_ids = {main_camera: [m.frame_id for m, _ in metas]}
+  if extra_camera is not None:
+    frame_ids[extra_camera] = [m.frame_id for _, m in metas]
+
+  cl_context = CLContext()
+  model = ModelState(cl_context)
+  step = ModeldStep(get_steer_delay(all_msgs, fingerprint), main_wide_camera=main_camera == "wideRoadCameraState")
+  sm = messaging.SubMaster(SM_SERVICES)
+  pm = ReplayPubMaster(cfg.subs)
+  warper = FrameWarper(model, cl_context, frs, frame_ids, main_camera, extra_camera)
+
+  log_msgs = []
+  pending: deque[tuple[FrameInputs, Future, int]] = deque()
+
+  def run_model(frame: FrameInputs, imgs_future: Future, log_mono_time: int):
+    model.update_inputs(step.model_inputs(frame))
+    imgs, warp_time = imgs_future.result()
+    if frame.prepare_only:
+      return
+
+    st = time.perf_counter()
+    model_output = model.execute(imgs)
+    step.publish(pm, frame, model_output, warp_time + time.perf_counter() - st)
+
+    # same ordering and timestamps as draining the output sockets of modeld
+    for s in cfg.subs:
+      for dat in pm.drain(s):
+        m = messaging.log_from_bytes(dat).as_builder()
+        m.logMonoTime = log_mono_time + int(cfg.processing_time * 1e9)
+        log_msgs.append(m.as_reader())
+
+  try:
+    for i, (msgs, (meta_main, meta_extra)) in enumerate(zip(cycles, metas, strict=True)):
+      # SubMaster sockets are conflated, only the latest message of each service is seen
+      latest = {m.which(): m for m in msgs if m.which() in sm.services}
+      sm.update_msgs(msgs[-1].logMonoTime * 1e-9, list(latest.values()))
+      frame = step.read_frame(sm, meta_main, meta_extra if meta_extra is not None else meta_main)
+
+      # the desire input depends on the previous output, so the warp of this frame overlaps with the previous model run
+      pending.append((frame, warper.submit(frame, i % IMG_SLOTS), msgs[-1].logMonoTime))
+      if len(pending) == IMG_SLOTS:
+        run_model(*pending.popleft())
+
+    while pending:
+      run_model(*pending.popleft())
+  finally:
+    warper.close()
+
+  return log_msgs
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Run modeld over a segment offline, as fast as the model runs")
+  parser.add_argument("route", help="The source route")
+  parser.add_argument("seg", type=int, help="Segment in source route")
+  parser.add_argument("--fingerprint", help="Use the CarParams of this car instead of the logged ones")
+  parser.add_argument("--out", help="Save the outputs to this log file")
+  parser.add_argument("--compare", action="store_true", help="Also run regular process replay and diff the outputs")
+  args = parser.parse_args()
+
+  lr, frs = setup_data_readers(args.route, args.seg, use_route_meta=False, needs_driver_cam=False)
+  lr = list(lr)
+
+  st = time.monotonic()
+  log_msgs = offline_modeld(lr, frs, args.fingerprint)
+  n_frames = sum(m.which() == "modelV2" for m in log_msgs)
+  print(f"offline modeld: {n_frames} frames in {time.monotonic() - st:.2f}s")
+
+  if args.out:
+    save_log(args.out, log_msgs)
+
+  if args.compare:
+    cfg = get_process_config("modeld")
+    st = time.monotonic()
+    ref_msgs = replay_process(cfg, lr, frs, fingerprint=args.fingerprint)
+    print(f"process replay: {len(ref_msgs)} msgs in {time.monotonic() - st:.2f}s")
+
+    diff = compare_logs(ref_msgs, log_msgs, cfg.ignore, tolerance=cfg.tolerance)
+    print(f"{len(diff)} differences")
+    for d in diff:
+      print(d)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from openpilot.selfdrive.test.process_replay.process_replay import CONFIGS, PROC_REPLAY_DIR, replay_process
+from openpilot.selfdrive.test.process_replay.test_processes import EXCLUDED_PROCS, get_log_data, segments
+from openpilot.tools.lib.logreader import LogReader
+
+BASELINE_FN = os.path.join(PROC_REPLAY_DIR, "latency_baseline.json")
+PERCENTILES = {"p50": 50, "p99": 99, "max": 100}
+# only these are checked, max is too noisy
+CHECKED = ("p50", "p99")
+
+
+def get_step_times(cfg, log_data: dict[str, bytes]) -> list[tuple[float, float]]:
+  step_times = []
+  for dat in log_data.values():
+    store: dict[str, list[tuple[float, float]]] = {}
+    replay_process(cfg, LogReader.from_bytes(dat), disable_progress=True, step_time_store=store)
+    step_times.extend(store[cfg.proc_name])
+  return step_times
+
+
+def latency_stats(step_times: list[tuple[float, float]]) -> dict[str, dict[str, float]]:
+  times = np.array(step_times) * 1e3
+  return {kind: {k: float(np.percentile(times[:, i], p)) for k, p in PERCENTILES.items()} for i, kind in enumerate(("wall", "cpu"))}
+
+
+def find_regressions(stats, baseline, tolerance: float, min_diff: float) -> list[str]:
+  regressions = []
+  for proc, proc_stats in stats.items():
+    if proc not in baseline:
+      continue
+    for kind, kind_stats in proc_stats.items():
+      for k in CHECKED:
+        new, ref = kind_stats[k], baseline[proc][kind][k]
+        if new > ref * (1 + tolerance) and new - ref > min_diff:
+          regressions.append(f"{proc} {kind} {k}: {ref:.3f} ms -> {new:.3f} ms")
+  return regressions
+
+
+def format_stats(stats, baseline) -> str:
+  lines = [f"{'process':<16}{'':<6}" + "".join(f"{k:>20}" for k in PERCENTILES)]
+  for proc, proc_stats in sorted(stats.items()):
+    for kind, kind_stats in proc_stats.items():
+      cols = []
+      for k in PERCENTILES:
+        col = f"{kind_stats[k]:.3f}"
+        if proc in baseline:
+          col += f" ({baseline[proc][kind][k]:.3f})"
+        cols.append(f"{col:>20}")
+      lines.append(f"{proc:<16}{kind:<6}" + "".join(cols))
+  return "\n".join(lines)
+
+
+if __name__ == "__main__":
+  all_cars = {car for car, _ in segments}
+  all_procs = {cfg.proc_name for cfg in CONFIGS if cfg.proc_name not in EXCLUDED_PROCS}
+
+  parser = argparse.ArgumentParser(description="Per-step latency of each process over the process replay segments, in ms")
+  parser.add_argument("--whitelist-procs", type=str, nargs="*", default=all_procs,
+                      help="Whitelist given processes from the benchmark (e.g. controlsd)")
+  parser.add_argument("--whitelist-cars", type=str, nargs="*", default={"HYUNDAI", "TOYOTA", "HONDA", "SUBARU", "FORD"},
+                      help="Whitelist given cars from the benchmark (e.g. HONDA)")
+  parser.add_argument("--tolerance", type=float, default=0.25,
+                      help="Relative increase over the baseline that is flagged as a regression")
+  parser.add_argument("--min-diff", type=float, default=0.05,
+                      help="Increases below this many ms are never flagged")
+  parser.add_argument("--update-baseline", action="store_true",
+                      help=f"Write the results to {os.path.basename(BASELINE_FN)}")
+  args = parser.parse_args()
+
+  tested_segments = [seg for car, seg in segments if car in {c.upper() for c in args.whitelist_cars}]
+  assert len(tested_segments), f"No segments for cars {args.whitelist_cars}, options are {all_cars}"
+
+  log_data = dict(get_log_data(seg) for seg in tested_segments)
+
+  # processes run one at a time, so they don't compete for cores
+  stats = {}
+  for cfg in CONFIGS:
+    if cfg.proc_name in args.whitelist_procs:
+      print(f"Benchmarking {cfg.proc_name}")
+      stats[cfg.proc_name] = latency_stats(get_step_times(cfg, log_data))
+
+  baseline = {}
+  if os.path.exists(BASELINE_FN):
+    with open(BASELINE_FN) as f:
+      baseline = json.load(f)
+  else:
+    print(f"No baseline found at {BASELINE_FN}, create one with --update-baseline")
+
+  print(format_stats(stats, baseline))
+
+  if args.update_baseline:
+    baseline.update(stats)
+    with open(BASELINE_FN, "w") as f:
+      json.dump(baseline, f, indent=2, sort_keys=True)
+    print(f"Updated baseline for {', '.join(sorted(stats))}")
+    sys.exit(0)
+
+  regressions = find_regressions(stats, baseline, args.tolerance, args.min_diff)
+  for r in regressions:
+    print(f"REGRESSION: {r}")
+  sys.exit(int(len(regressions) > 0))
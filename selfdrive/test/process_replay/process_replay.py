@@ -108,6 +108,11 @@ class ReplayContext:
     pm.send(endpoint, dat)
     self.events[endpoint].recv_ready_event.set()
 
+  def clear_events(self):
+    # a killed process can leave any of its events set
+    for event in self.all_recv_called_events + self.all_recv_ready_events:
+      event.clear()
+
   def unlock_sockets(self):
     expected_sets = len(self.events)
     while expected_sets > 0:
@@ -147,9 +152,32 @@ class ProcessConfig:
   unlocked_pubs: list[str] = field(default_factory=list)
 
 
+class ProcessCPUTime:
+  """
+  CPU time of a process in ns, summed over its threads from their scheduler stats.
+  psutil's cpu_times count clock ticks of 10 ms, longer than most steps.
+  Only available on Linux.
+  """
+  def __init__(self, pid: int):
+    self.task_dir = f"/proc/{pid}/task"
+    if not os.path.isdir(self.task_dir):
+      raise RuntimeError(f"CPU time of steps needs the scheduler stats in {self.task_dir}, only available on Linux")
+
+  def get(self) -> int:
+    total = 0
+    for tid in os.listdir(self.task_dir):
+      try:
+        with open(os.path.join(self.task_dir, tid, "schedstat")) as f:
+          total += int(f.read().split()[0])
+      except (FileNotFoundError, ProcessLookupError):
+        pass  # the thread exited since the listing
+    return total
+
+
 class ProcessContainer:
   def __init__(self, cfg: ProcessConfig):
     self.prefix = OpenpilotPrefix(clean_dirs_on_exit=False)
+    self.initial_cfg = copy.deepcopy(cfg)
     self.cfg = copy.deepcopy(cfg)
     self.process = copy.deepcopy(managed_processes[cfg.proc_name])
     self.msg_queue: list[capnp._DynamicStructReader] = []
@@ -160,6 +188,9 @@ class ProcessContainer:
     self.vipc_server: VisionIpcServer | None = None
     self.environ_config: dict[str, Any] | None = None
     self.capture: ProcessOutputCapture | None = None
+    # (wall time, cpu time) of each step, only recorded when set to a list
+    self.step_times: list[tuple[float, float]] | None = None
+    self.cpu_time: ProcessCPUTime | None = None
 
   @property
   def has_empty_queue(self) -> bool:
@@ -251,14 +282,19 @@ class ProcessContainer:
         self.capture = ProcessOutputCapture(self.cfg.proc_name, p.prefix)
 
       self._start_process()
+      self._wait_for_start(all_msgs, fingerprint)
+
+  def _wait_for_start(self, all_msgs: LogIterable, fingerprint: str | None):
+    assert self.rc and self.pm and self.process.proc
+    self.cpu_time = ProcessCPUTime(self.process.proc.pid) if self.step_times is not None else None
 
-      if self.cfg.init_callback is not None:
-        self.cfg.init_callback(self.rc, self.pm, all_msgs, fingerprint)
+    if self.cfg.init_callback is not None:
+      self.cfg.init_callback(self.rc, self.pm, all_msgs, fingerprint)
 
-      # wait for process to startup
-      with Timeout(10, error_msg=f"timed out waiting for process to start: {repr(self.cfg.proc_name)}"):
-        while not all(self.pm.all_readers_updated(s) for s in self.cfg.pubs if s not in self.cfg.ignore_alive_pubs):
-          time.sleep(0)
+    # wait for process to startup
+    with Timeout(10, error_msg=f"timed out waiting for process to start: {repr(self.cfg.proc_name)}"):
+      while not all(self.pm.all_readers_updated(s) for s in self.cfg.pubs if s not in self.cfg.ignore_alive_pubs):
+        time.sleep(0)
 
   def stop(self):
     with self.prefix:
@@ -268,6 +304,48 @@ class ProcessContainer:
       self.prefix.clean_dirs()
       self._clean_env()
 
+  def reset(
+    self, params_config: dict[str, Any], environ_config: dict[str, Any],
+    all_msgs: LogIterable, frs: dict[str, BaseFrameReader] | None,
+    fingerprint: str | None
+  ):
+    """
+    Restarts a started container in a clean state for a new log. Daemon state can't be reset in place, so only the daemon
+    is restarted, the prefix, ReplayContext and output sockets are kept. Containers with vision pubs, or whose pubs depend
+    on the new params, are restarted from scratch.
+    """
+    assert self.rc and self.pm and self.sockets is not None
+    self.msg_queue = []
+    self.cnt = 0
+
+    with self.prefix:
+      self.process.signal(signal.SIGKILL)
+      self.process.stop()
+      self._clean_env()
+      Params().clear_all()
+      self._setup_env(params_config, environ_config)
+
+      cfg = copy.deepcopy(self.initial_cfg)
+      if cfg.config_callback is not None:
+        cfg.config_callback(Params(), cfg, all_msgs)
+      warm = len(cfg.vision_pubs) == 0 and set(cfg.pubs) == set(self.cfg.pubs)
+
+      if warm:
+        self.rc.clear_events()
+        # the readers of the killed daemon never catch up, a new publisher drops them
+        self.pm = messaging.PubMaster(self.cfg.pubs)
+        for sock in self.sockets:
+          messaging.drain_sock_raw(sock)
+
+        self.process.start()
+        self._wait_for_start(all_msgs, fingerprint)
+
+    if not warm:
+      self.stop()
+      self.vipc_server = None
+      self.cfg = copy.deepcopy(self.initial_cfg)
+      self.start(params_config, environ_config, all_msgs, frs, fingerprint, self.capture is not None)
+
   def run_step(self, msg: capnp._DynamicStructReader, frs: dict[str, BaseFrameReader] | None) -> list[capnp._DynamicStructReader]:
     assert self.rc and self.pm and self.sockets and self.process.proc
 
@@ -291,6 +369,10 @@ class ProcessContainer:
         if self.cfg.main_pub and self.cfg.main_pub_drained:
           trigger_empty_recv = next((True for m in self.msg_queue if m.which() == self.cfg.main_pub), False)
 
+        if self.step_times is not None:
+          assert self.cpu_time is not None
+          start_cpu, start_wall = self.cpu_time.get(), time.perf_counter()
+
         for m in self.msg_queue:
           self.pm.send(m.which(), m.as_builder())
           # send frames if needed
@@ -306,6 +388,9 @@ class ProcessContainer:
         self.rc.unlock_sockets()
         self.rc.wait_for_next_recv(trigger_empty_recv)
 
+        if self.step_times is not None:
+          self.step_times.append((time.perf_counter() - start_wall, (self.cpu_time.get() - start_cpu) * 1e-9))
+
         for socket in self.sockets:
           ms = messaging.drain_sock(socket)
           for m in ms:
@@ -651,7 +736,8 @@ def replay_process_with_name(name: str | Iterable[str], lr: LogIterable, *args,
 def replay_process(
   cfg: ProcessConfig | Iterable[ProcessConfig], lr: LogIterable, frs: dict[str, BaseFrameReader] = None,
   fingerprint: str = None, return_all_logs: bool = False, custom_params: dict[str, Any] = None,
-  captured_output_store: dict[str, dict[str, str]] = None, disable_progress: bool = False
+  captured_output_store: dict[str, dict[str, str]] = None, disable_progress: bool = False,
+  container_cls: type[ProcessContainer] = ProcessContainer, step_time_store: dict[str, list[tuple[float, float]]] = None
 ) -> list[capnp._DynamicStructReader]:
   if isinstance(cfg, Iterable):
     cfgs = list(cfg)
@@ -662,7 +748,8 @@ def replay_process(
                          manager_states=True,
                          panda_states=any("pandaStates" in cfg.pubs for cfg in cfgs),
                          camera_states=any(len(cfg.vision_pubs) != 0 for cfg in cfgs))
-  process_logs = _replay_multi_process(cfgs, all_msgs, frs, fingerprint, custom_params, captured_output_store, disable_progress)
+  process_logs = _replay_multi_process(cfgs, all_msgs, frs, fingerprint, custom_params, captured_output_store, disable_progress, container_cls,
+                                      step_time_store)
 
   if return_all_logs:
     keys = {m.which() for m in process_logs}
@@ -678,7 +765,8 @@ def replay_process(
 
 def _replay_multi_process(
   cfgs: list[ProcessConfig], lr: LogIterable, frs: dict[str, BaseFrameReader] | None, fingerprint: str | None,
-  custom_params: dict[str, Any] | None, captured_output_store: dict[str, dict[str, str]] | None, disable_progress: bool
+  custom_params: dict[str, Any] | None, captured_output_store: dict[str, dict[str, str]] | None, disable_progress: bool,
+  container_cls: type[ProcessContainer] = ProcessContainer, step_time_store: dict[str, list[tuple[float, float]]] | None = None
 ) -> list[capnp._DynamicStructReader]:
   if fingerprint is not None:
     params_config = generate_params_config(lr=lr, fingerprint=fingerprint, custom_params=custom_params)
@@ -698,43 +786,16 @@ def _replay_multi_process(
     assert all(st in frs for st in required_vision_pubs), f"frs for this process must contain following vision streams: {required_vision_pubs}"
 
   all_msgs = sorted(lr, key=lambda msg: msg.logMonoTime)
-  log_msgs = []
   try:
     containers = []
     for cfg in cfgs:
-      container = ProcessContainer(cfg)
+      container = container_cls(cfg)
+      if step_time_store is not None:
+        container.step_times = []
       containers.append(container)
       container.start(params_config, env_config, all_msgs, frs, fingerprint, captured_output_store is not None)
 
-    all_pubs = {pub for container in containers for pub in container.pubs}
-    all_subs = {sub for container in containers for sub in container.subs}
-    lr_pubs = all_pubs - all_subs
-    pubs_to_containers = {pub: [container for container in containers if pub in container.pubs] for pub in all_pubs}
-
-    pub_msgs = [msg for msg in all_msgs if msg.which() in lr_pubs]
-    # external queue for messages taken from logs; internal queue for messages generated by processes, which will be republished
-    external_pub_queue: list[capnp._DynamicStructReader] = pub_msgs.copy()
-    internal_pub_queue: list[capnp._DynamicStructReader] = []
-    # heap for maintaining the order of messages generated by processes, where each element: (logMonoTime, index in internal_pub_queue)
-    internal_pub_index_heap: list[tuple[int, int]] = []
-
-    pbar = tqdm(total=len(external_pub_queue), disable=disable_progress)
-    while len(external_pub_queue) != 0 or (len(internal_pub_index_heap) != 0 and not all(c.has_empty_queue for c in containers)):
-      if len(internal_pub_index_heap) == 0 or (len(external_pub_queue) != 0 and external_pub_queue[0].logMonoTime < internal_pub_index_heap[0][0]):
-        msg = external_pub_queue.pop(0)
-        pbar.update(1)
-      else:
-        _, index = heapq.heappop(internal_pub_index_heap)
-        msg = internal_pub_queue[index]
-
-      target_containers = pubs_to_containers[msg.which()]
-      for container in target_containers:
-        output_msgs = container.run_step(msg, frs)
-        for m in output_msgs:
-          if m.which() in all_pubs:
-            internal_pub_queue.append(m)
-            heapq.heappush(internal_pub_index_heap, (m.logMonoTime, len(internal_pub_queue) - 1))
-        log_msgs.extend(output_msgs)
+    log_msgs = replay_containers(containers, all_msgs, frs, disable_progress)
   finally:
     for container in containers:
       container.stop()
@@ -742,6 +803,46 @@ def _replay_multi_process(
         assert container.capture is not None
         out, err = container.capture.read_outerr()
         captured_output_store[container.cfg.proc_name] = {"out": out, "err": err}
+      if step_time_store is not None:
+        step_time_store[container.cfg.proc_name] = container.step_times
+
+  return log_msgs
+
+
+def replay_containers(
+  containers: list[ProcessContainer], all_msgs: list[capnp._DynamicStructReader], frs: dict[str, BaseFrameReader] | None, disable_progress: bool
+) -> list[capnp._DynamicStructReader]:
+  """Replays the log through started containers, all_msgs must be sorted by logMonoTime"""
+  log_msgs = []
+  all_pubs = {pub for container in containers for pub in container.pubs}
+  all_subs = {sub for container in containers for sub in container.subs}
+  lr_pubs = all_pubs - all_subs
+  pubs_to_containers = {pub: [container for container in containers if pub in container.pubs] for pub in all_pubs}
+
+  pub_msgs = [msg for msg in all_msgs if msg.which() in lr_pubs]
+  # external queue for messages taken from logs; internal queue for messages generated by processes, which will be republished
+  external_pub_queue: list[capnp._DynamicStructReader] = pub_msgs.copy()
+  internal_pub_queue: list[capnp._DynamicStructReader] = []
+  # heap for maintaining the order of messages generated by processes, where each element: (logMonoTime, index in internal_pub_queue)
+  internal_pub_index_heap: list[tuple[int, int]] = []
+
+  pbar = tqdm(total=len(external_pub_queue), disable=disable_progress)
+  while len(external_pub_queue) != 0 or (len(internal_pub_index_heap) != 0 and not all(c.has_empty_queue for c in containers)):
+    if len(internal_pub_index_heap) == 0 or (len(external_pub_queue) != 0 and external_pub_queue[0].logMonoTime < internal_pub_index_heap[0][0]):
+      msg = external_pub_queue.pop(0)
+      pbar.update(1)
+    else:
+      _, index = heapq.heappop(internal_pub_index_heap)
+      msg = internal_pub_queue[index]
+
+    target_containers = pubs_to_containers[msg.which()]
+    for container in target_containers:
+      output_msgs = container.run_step(msg, frs)
+      for m in output_msgs:
+        if m.which() in all_pubs:
+          internal_pub_queue.append(m)
+          heapq.heappush(internal_pub_index_heap, (m.logMonoTime, len(internal_pub_queue) - 1))
+      log_msgs.extend(output_msgs)
 
   return log_msgs
 
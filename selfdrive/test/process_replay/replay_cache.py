@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import glob
+import hashlib
+import subprocess
+import dataclasses
+from functools import cache
+from typing import Any
+
+import capnp
+
+from openpilot.common.basedir import BASEDIR
+from openpilot.system.manager.process import NativeProcess, PythonProcess
+from openpilot.system.manager.process_config import managed_processes
+from openpilot.selfdrive.test.process_replay.process_replay import ProcessConfig, FAKEDATA, PROC_REPLAY_DIR
+from openpilot.tools.lib.logreader import LogReader, save_log
+
+CACHE_DIR = os.getenv("REPLAY_CACHE_DIR", os.path.join(FAKEDATA, "cache"))
+
+# the replay harness itself shapes the output of every process
+HARNESS_FILES = ["process_replay.py", "migration.py", "capture.py", "vision_meta.py"]
+# data read at runtime rather than imported: DBCs, fingerprints and torque params, and the params key definitions
+DATA_FILES = ["opendbc/dbc/**/*.dbc", "opendbc/car/**/*.toml", "opendbc/car/**/*.json", "opendbc/car/**/*.yaml", "common/params.cc"]
+
+
+def _hash_files(paths: list[str]) -> str:
+  h = hashlib.sha256()
+  for path in sorted(set(paths)):
+    h.update(os.path.relpath(path, BASEDIR).encode())
+    with open(path, "rb") as f:
+      h.update(f.read())
+  return h.hexdigest()
+
+
+def _stable(v: Any) -> Any:
+  # callback instances and functions have no stable repr, their code is covered by the source hash
+  if isinstance(v, (list, tuple, set)):
+    items = [_stable(x) for x in v]
+    return sorted(items, key=str) if isinstance(v, set) else items
+  elif callable(v) and hasattr(v, "__qualname__"):
+    return f"{v.__module__}.{v.__qualname__}"
+  elif callable(v):
+    return {"type": f"{type(v).__module__}.{type(v).__qualname__}", "state": _stable(vars(v))}
+  elif isinstance(v, dict):
+    return {k: _stable(x) for k, x in v.items()}
+  return v
+
+
+def hash_log(dat: bytes) -> str:
+  return hashlib.sha256(dat).hexdigest()
+
+
+def hash_config(cfg: ProcessConfig) -> str:
+  fields = {f.name: _stable(getattr(cfg, f.name)) for f in dataclasses.fields(cfg)}
+  return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def loaded_source_files(module: str) -> list[str]:
+  """Python and shared object files inside openpilot that get loaded by importing the module"""
+  code = "import importlib, json, sys; importlib.import_module(sys.argv[1]); print(json.dumps([getattr(m, '__file__', None) for m in sys.modules.values()]))"
+  out = subprocess.check_output([sys.executable, "-c", code, module], cwd=BASEDIR, text=True)
+  files = [os.path.realpath(f) for f in json.loads(out.splitlines()[-1]) if f is not None]
+  files = [f for f in files if f.startswith(BASEDIR) and os.path.isfile(f)]
+
+  # libraries loaded through ctypes (e.g. acados solvers) live next to the modules that load them
+  for d in {os.path.dirname(f) for f in files}:
+    files += glob.glob(os.path.join(d, "**", "*.so"), recursive=True)
+  return files
+
+
+def data_files() -> list[str]:
+  return [os.path.realpath(f) for pattern in DATA_FILES for f in glob.glob(os.path.join(BASEDIR, pattern), recursive=True)]
+
+
+@cache
+def hash_process_sources(proc_name: str) -> str:
+  proc = managed_processes[proc_name]
+  if isinstance(proc, PythonProcess):
+    files = loaded_source_files(proc.module)
+  elif isinstance(proc, NativeProcess):
+    files = [os.path.join(BASEDIR, proc.cwd, proc.cmdline[0])]
+  else:
+    raise ValueError(f"Can't hash sources of {proc_name}")
+
+  files += [os.path.join(PROC_REPLAY_DIR, fn) for fn in HARNESS_FILES]
+  files += data_files()
+  return _hash_files(files)
+
+
+def get_cache_key(log_hash: str, cfg: ProcessConfig) -> str:
+  key = "\n".join((log_hash, hash_config(cfg), hash_process_sources(cfg.proc_name)))
+  return hashlib.sha256(key.encode()).hexdigest()
+
+
+class ReplayCache:
+  """Output logs of process replay, addressed by the input log, the process config and the process sources"""
+  def __init__(self, cache_dir: str = CACHE_DIR):
+    self.cache_dir = cache_dir
+
+  def _path(self, key: str) -> str:
+    return os.path.join(self.cache_dir, f"{key}.zst")
+
+  def get(self, key: str) -> list[capnp._DynamicStructReader] | None:
+    path = self._path(key)
+    if not os.path.exists(path):
+      return None
+    return list(LogReader(path, sort_by_time=False))
+
+  def put(self, key: str, log_msgs: list[capnp._DynamicStructReader]) -> None:
+    os.makedirs(self.cache_dir, exist_ok=True)
+    # write then rename, so concurrent workers never see a partial log
+    # keeping the extension save_log compresses by
+    tmp_path = os.path.join(self.cache_dir, f"{key}.{os.getpid()}.tmp.zst")
+    save_log(tmp_path, log_msgs)
+    os.replace(tmp_path, self._path(key))
@@ -0,0 +1,64 @@
+import math
+import numbers
+import dictdiffer
+from hypothesis import given, HealthCheck, Phase, settings
+import hypothesis.strategies as st
+from parameterized import parameterized
+
+from cereal import log
+import cereal.messaging as messaging
+from openpilot.selfdrive.test.fuzzy_generation import FuzzyGenerator
+from openpilot.selfdrive.test.process_replay.compare_logs import EPSILON, compare_logs, remove_ignored_fields
+
+EVENTS = ['carState', 'controlsState', 'modelV2', 'radarState', 'liveParameters']
+
+
+def dictdiffer_compare_logs(log1, log2, ignore_fields, tolerance):
+  # the previous implementation, diffs to_dict of every differing message
+  diff = []
+  for msg1, msg2 in zip(log1, log2, strict=True):
+    msg1 = remove_ignored_fields(msg1, ignore_fields)
+    msg2 = remove_ignored_fields(msg2, ignore_fields)
+    if msg1.to_bytes() == msg2.to_bytes():
+      continue
+
+    def outside_tolerance(d):
+      try:
+        if d[0] == "change":
+          a, b = d[2]
+          if math.isfinite(a) and math.isfinite(b) and isinstance(a, numbers.Number) and isinstance(b, numbers.Number):
+            return abs(a - b) > max(tolerance, tolerance * max(abs(a), abs(b)))
+      except TypeError:
+        pass
+      return True
+
+    dd = dictdiffer.diff(msg1.as_reader().to_dict(verbose=True), msg2.as_reader().to_dict(verbose=True), ignore=ignore_fields)
+    diff.extend(filter(outside_tolerance, dd))
+  return diff
+
+
+class TestCompareLogs:
+  @parameterized.expand([(e,) for e in EVENTS])
+  @given(st.data())
+  @settings(phases=[Phase.generate, Phase.target], max_examples=20, deadline=None,
+            suppress_health_check=[HealthCheck.too_slow, HealthCheck.data_too_large])
+  def test_matches_dictdiffer(self, event, data):
+    log1, log2 = ([log.Event.new_message(**m).as_reader() for m in FuzzyGenerator.get_random_event_msg(data.draw, events=[event])]
+                  for _ in range(2))
+    tolerance = data.draw(st.sampled_from([EPSILON, 1e-5, 1e-2]))
+    ignore_fields = ["logMonoTime"]
+
+    assert repr(compare_logs(log1, log2, ignore_fields, tolerance=tolerance)) == repr(dictdiffer_compare_logs(log1, log2, ignore_fields, tolerance))
+    assert compare_logs(log1, log1, ignore_fields, tolerance=tolerance) == []
+
+  def test_tolerance_and_ignore(self):
+    msgs = []
+    for v_ego, a_ego in ((10., 1.), (10. + 1e-6, 2.)):
+      msg = messaging.new_message('carState')
+      msg.carState.vEgo = v_ego
+      msg.carState.aEgo = a_ego
+      msgs.append(msg.as_reader())
+
+    assert compare_logs([msgs[0]], [msgs[1]], ["logMonoTime", "carState.aEgo"], tolerance=1e-5) == []
+    diff = compare_logs([msgs[0]], [msgs[1]], ["logMonoTime"], tolerance=1e-5)
+    assert diff == [("change", "carState.aEgo", (1., 2.))]
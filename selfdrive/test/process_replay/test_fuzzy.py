@@ -1,12 +1,13 @@
 import copy
 import os
-from hypothesis import given, HealthCheck, Phase, settings
+from hypothesis import given, HealthCheck, Phase, seed, settings
 import hypothesis.strategies as st
 from parameterized import parameterized
 
 from cereal import log
 from opendbc.car.toyota.values import CAR as TOYOTA
 from openpilot.selfdrive.test.fuzzy_generation import FuzzyGenerator
+from openpilot.selfdrive.test.process_replay.migration import migrate_all
 import openpilot.selfdrive.test.process_replay.process_replay as pr
 
 # These processes currently fail because of unrealistic data breaking assumptions
@@ -14,18 +15,53 @@ import openpilot.selfdrive.test.process_replay.process_replay as pr
 # TODO: Make each one testable
 NOT_TESTED = ['selfdrived', 'controlsd', 'card', 'plannerd', 'calibrationd', 'dmonitoringd', 'paramsd', 'dmonitoringmodeld', 'modeld']
 
-TEST_CASES = [(cfg.proc_name, copy.deepcopy(cfg)) for cfg in pr.CONFIGS if cfg.proc_name not in NOT_TESTED]
 MAX_EXAMPLES = int(os.environ.get("MAX_EXAMPLES", "10"))
+# examples of each process are split into shards, which pytest-xdist runs on separate cores
+SHARDS = max(min(int(os.environ.get("FUZZ_SHARDS", os.cpu_count() or 1)), MAX_EXAMPLES), 1)
+FINGERPRINT = TOYOTA.TOYOTA_COROLLA_TSS2
+
+TEST_CASES = [(f"{cfg.proc_name}_{shard}", cfg.proc_name, shard) for cfg in pr.CONFIGS if cfg.proc_name not in NOT_TESTED for shard in range(SHARDS)]
+CONFIGS = {cfg.proc_name: copy.deepcopy(cfg) for cfg in pr.CONFIGS if cfg.proc_name not in NOT_TESTED}
+for cfg in CONFIGS.values():
+  cfg.timeout = 5
+
 
 class TestFuzzProcesses:
+  # one started container per process and xdist worker, restarted between examples
+  containers: dict[str, pr.ProcessContainer] = {}
+
+  @classmethod
+  def teardown_class(cls):
+    for container in cls.containers.values():
+      container.stop()
+    cls.containers.clear()
+
+  def replay(self, proc_name, lr):
+    all_msgs = migrate_all(lr, manager_states=True)
+    params_config = pr.generate_params_config(lr=all_msgs, fingerprint=FINGERPRINT)
+    env_config = pr.generate_environ_config(fingerprint=FINGERPRINT)
+
+    if proc_name not in self.containers:
+      container = pr.ProcessContainer(CONFIGS[proc_name])
+      container.start(params_config, env_config, all_msgs, None, FINGERPRINT, False)
+      self.containers[proc_name] = container
+    else:
+      self.containers[proc_name].reset(params_config, env_config, all_msgs, None, FINGERPRINT)
+
+    # crashes and hangs are still caught in run_step, the next reset cleans up after them
+    return pr.replay_containers([self.containers[proc_name]], all_msgs, None, True)
 
   # TODO: make this faster and increase examples
   @parameterized.expand(TEST_CASES)
-  @given(st.data())
-  @settings(phases=[Phase.generate, Phase.target], max_examples=MAX_EXAMPLES, deadline=1000,
-            suppress_health_check=[HealthCheck.too_slow, HealthCheck.data_too_large])
-  def test_fuzz_process(self, proc_name, cfg, data):
-    msgs = FuzzyGenerator.get_random_event_msg(data.draw, events=cfg.pubs, real_floats=True)
-    lr = [log.Event.new_message(**m).as_reader() for m in msgs]
-    cfg.timeout = 5
-    pr.replay_process(cfg, lr, fingerprint=TOYOTA.TOYOTA_COROLLA_TSS2, disable_progress=True)
+  def test_fuzz_process(self, name, proc_name, shard):
+    # each shard gets its own seed, otherwise a fixed --hypothesis-seed draws the same examples in every shard
+    @seed(shard)
+    @given(st.data())
+    @settings(phases=[Phase.generate, Phase.target], max_examples=-(-MAX_EXAMPLES // SHARDS), deadline=1000,
+              suppress_health_check=[HealthCheck.too_slow, HealthCheck.data_too_large])
+    def fuzz(data):
+      msgs = FuzzyGenerator.get_random_event_msg(data.draw, events=CONFIGS[proc_name].pubs, real_floats=True)
+      lr = [log.Event.new_message(**m).as_reader() for m in msgs]
+      self.replay(proc_name, lr)
+
+    fuzz()
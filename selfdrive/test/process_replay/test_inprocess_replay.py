@@ -0,0 +1,26 @@
+from parameterized import parameterized
+
+from openpilot.selfdrive.test.process_replay.compare_logs import compare_logs
+from openpilot.selfdrive.test.process_replay.inprocess_replay import IN_PROCESS_DAEMONS, replay_process_in_process
+from openpilot.selfdrive.test.process_replay.process_replay import get_process_config, replay_process
+from openpilot.tools.lib.openpilotci import get_url
+from openpilot.tools.lib.logreader import LogReader
+
+TEST_SEGMENT = "regen4CE950B0267|2024-08-30--02-51-30--0"  # TOYOTA.TOYOTA_COROLLA_TSS2
+
+
+class TestInProcessReplay:
+  @classmethod
+  def setup_class(cls):
+    route, sidx = TEST_SEGMENT.rsplit("--", 1)
+    cls.lr = list(LogReader(get_url(route, sidx, "rlog.zst")))
+
+  @parameterized.expand(IN_PROCESS_DAEMONS.keys())
+  def test_matches_process_replay(self, proc_name):
+    cfg = get_process_config(proc_name)
+    ref_msgs = replay_process(cfg, self.lr, disable_progress=True)
+    log_msgs = replay_process_in_process(cfg, self.lr, disable_progress=True)
+
+    assert len(log_msgs) > 0
+    diff = compare_logs(ref_msgs, log_msgs, cfg.ignore, tolerance=cfg.tolerance)
+    assert len(diff) == 0, f"{proc_name} in-process replay differs from process replay: {diff[:5]}"
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import cereal.messaging as messaging
+from openpilot.selfdrive.test.process_replay.offline_modeld import DECODE_AHEAD, FramePrefetcher, frame_meta, get_cycles
+from openpilot.selfdrive.test.process_replay.process_replay import get_process_config
+from openpilot.tools.lib.framereader import BaseFrameReader
+
+
+class FakeFrameReader(BaseFrameReader):
+  def __init__(self):
+    self.decoded: list[int] = []
+
+  def get(self, num, count=1, pix_fmt="yuv420p"):
+    self.decoded.append(num)
+    return np.full((count, 2, 2), num, dtype=np.uint8)
+
+
+def get_msgs(cameras, n_frames, dropped=()):
+  msgs = []
+  def add(service, **kwargs):
+    msg = messaging.new_message(service, logMonoTime=len(msgs) * 1000)
+    for k, v in kwargs.items():
+      setattr(getattr(msg, service), k, v)
+    msgs.append(msg.as_reader())
+
+  add('liveCalibration')
+  for frame_id in range(n_frames):
+    add('carState', vEgo=float(frame_id))
+    for camera in cameras:
+      if (camera, frame_id) not in dropped:
+        add(camera, frameId=frame_id, timestampSof=frame_id, timestampEof=frame_id + 1)
+    # not an input of modeld
+    add('controlsState')
+  return msgs
+
+
+class TestOfflineModeld:
+  def test_prefetch_order(self):
+    fr = FakeFrameReader()
+    frame_ids = list(range(5, 5 + 2 * DECODE_AHEAD))
+    prefetcher = FramePrefetcher(fr, frame_ids)
+    try:
+      for frame_id in frame_ids:
+        assert len(prefetcher.pending) <= DECODE_AHEAD
+        assert prefetcher.get(frame_id) == bytes([frame_id] * 4)
+    finally:
+      prefetcher.close()
+    assert fr.decoded == frame_ids
+
+  def test_prefetch_out_of_order(self):
+    prefetcher = FramePrefetcher(FakeFrameReader(), [1, 2, 3])
+    try:
+      with pytest.raises(AssertionError):
+        prefetcher.get(2)
+    finally:
+      prefetcher.close()
+
+  def test_cycles(self):
+    cameras = ["roadCameraState", "wideRoadCameraState"]
+    cycles = get_cycles(get_process_config("modeld"), get_msgs(cameras, 5))
+
+    # one model run per frame pair, with the inputs received since the previous one
+    assert len(cycles) == 5
+    assert [m.which() for m in cycles[0]] == ["liveCalibration", "carState", *cameras]
+    for frame_id, msgs in enumerate(cycles):
+      assert [m.which() for m in msgs[-3:]] == ["carState", *cameras]
+      assert msgs[-3].carState.vEgo == frame_id
+      assert frame_meta(msgs, "roadCameraState").frame_id == frame_meta(msgs, "wideRoadCameraState").frame_id == frame_id
+
+    # a dropped frame of one camera is run with the next pair, on the latest frames
+    cycles = get_cycles(get_process_config("modeld"), get_msgs(cameras, 5, dropped={("wideRoadCameraState", 2)}))
+    assert len(cycles) == 4
+    assert [m.which() for m in cycles[2]] == ["carState", "roadCameraState", "carState", *cameras]
+    assert frame_meta(cycles[2], "roadCameraState").frame_id == frame_meta(cycles[2], "wideRoadCameraState").frame_id == 3
+
+  def test_cycles_single_camera(self):
+    cfg = get_process_config("modeld")
+    cfg.vision_pubs = ["roadCameraState"]
+    cycles = get_cycles(cfg, get_msgs(["roadCameraState"], 5))
+    assert len(cycles) == 5
+    for frame_id, msgs in enumerate(cycles):
+      assert msgs[-1].which() == "roadCameraState"
+      meta = frame_meta(msgs, "roadCameraState")
+      assert (meta.frame_id, meta.timestamp_sof, meta.timestamp_eof) == (frame_id, frame_id, frame_id + 1)
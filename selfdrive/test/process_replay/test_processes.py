@@ -13,6 +13,7 @@ from openpilot.tools.lib.openpilotci import get_url, upload_file
 from openpilot.selfdrive.test.process_replay.compare_logs import compare_logs, format_diff
 from openpilot.selfdrive.test.process_replay.process_replay import CONFIGS, PROC_REPLAY_DIR, FAKEDATA, replay_process, \
                                                                    check_most_messages_valid
+from openpilot.selfdrive.test.process_replay.replay_cache import ReplayCache, get_cache_key, hash_log
 from openpilot.tools.lib.filereader import FileReader
 from openpilot.tools.lib.logreader import LogReader, save_log
 
@@ -68,11 +69,11 @@ EXCLUDED_PROCS = {"modeld", "dmonitoringmodeld"}
 
 
 def run_test_process(data):
-  segment, cfg, args, cur_log_fn, ref_log_path, lr_dat = data
+  segment, cfg, args, cur_log_fn, ref_log_path, lr_dat, cache_key = data
   res = None
   if not args.upload_only:
     lr = LogReader.from_bytes(lr_dat)
-    res, log_msgs = test_process(cfg, lr, segment, ref_log_path, cur_log_fn, args.ignore_fields, args.ignore_msgs)
+    res, log_msgs = test_process(cfg, lr, segment, ref_log_path, cur_log_fn, args.ignore_fields, args.ignore_msgs, cache_key)
     # save logs so we can upload when updating refs
     save_log(cur_log_fn, log_msgs)
 
@@ -90,7 +91,7 @@ def get_log_data(segment):
     return (segment, f.read())
 
 
-def test_process(cfg, lr, segment, ref_log_path, new_log_path, ignore_fields=None, ignore_msgs=None):
+def test_process(cfg, lr, segment, ref_log_path, new_log_path, ignore_fields=None, ignore_msgs=None, cache_key=None):
   if ignore_fields is None:
     ignore_fields = []
   if ignore_msgs is None:
@@ -98,10 +99,17 @@ def test_process(cfg, lr, segment, ref_log_path, new_log_path, ignore_fields=Non
 
   ref_log_msgs = list(LogReader(ref_log_path))
 
-  try:
-    log_msgs = replay_process(cfg, lr, disable_progress=True)
-  except Exception as e:
-    raise Exception("failed on segment: " + segment) from e
+  # same input log, config and process sources give the same output, skip the replay
+  replay_cache = ReplayCache()
+  log_msgs = replay_cache.get(cache_key) if cache_key is not None else None
+  if log_msgs is None:
+    try:
+      log_msgs = replay_process(cfg, lr, disable_progress=True)
+    except Exception as e:
+      raise Exception("failed on segment: " + segment) from e
+
+    if cache_key is not None:
+      replay_cache.put(cache_key, log_msgs)
 
   if not check_most_messages_valid(log_msgs):
     return f"Route did not have enough valid messages: {new_log_path}", log_msgs
@@ -142,6 +150,8 @@ if __name__ == "__main__":
                       help="Updates reference logs using current commit")
   parser.add_argument("--upload-only", action="store_true",
                       help="Skips testing processes and uploads logs from previous test run")
+  parser.add_argument("--no-cache", action="store_true",
+                      help="Always replay, instead of reusing outputs of unchanged processes and segments")
   parser.add_argument("-j", "--jobs", type=int, default=max(cpu_count - 2, 1),
                       help="Max amount of parallel jobs")
   args = parser.parse_args()
@@ -183,6 +193,7 @@ if __name__ == "__main__":
       p1 = pool.map(get_log_data, download_segments)
       for segment, lr in tqdm(p1, desc="Getting Logs", total=len(download_segments)):
         log_data[segment] = lr
+      log_hashes = {segment: hash_log(dat) for segment, dat in log_data.items()}
 
     pool_args: Any = []
     for car_brand, segment in segments:
@@ -205,7 +216,8 @@ if __name__ == "__main__":
           ref_log_path = ref_log_fn if os.path.exists(ref_log_fn) else BASE_URL + os.path.basename(ref_log_fn)
 
         dat = None if args.upload_only else log_data[segment]
-        pool_args.append((segment, cfg, args, cur_log_fn, ref_log_path, dat))
+        cache_key = None if (args.upload_only or args.no_cache) else get_cache_key(log_hashes[segment], cfg)
+        pool_args.append((segment, cfg, args, cur_log_fn, ref_log_path, dat, cache_key))
 
         log_paths[segment][cfg.proc_name]['ref'] = ref_log_path
         log_paths[segment][cfg.proc_name]['new'] = cur_log_fn
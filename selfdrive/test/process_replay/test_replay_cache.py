@@ -0,0 +1,29 @@
+import os
+
+import cereal.messaging as messaging
+from openpilot.common.basedir import BASEDIR
+from openpilot.selfdrive.test.process_replay.replay_cache import ReplayCache, data_files
+
+
+class TestReplayCache:
+  def test_put_get(self, tmp_path):
+    msgs = []
+    for i in range(10):
+      msg = messaging.new_message('carState')
+      msg.logMonoTime = i
+      msg.carState.vEgo = float(i)
+      msgs.append(msg.as_reader())
+
+    cache = ReplayCache(str(tmp_path))
+    assert cache.get("key") is None
+    cache.put("key", msgs)
+    cached = cache.get("key")
+    assert cached is not None
+    assert [m.as_builder().to_bytes() for m in cached] == [m.as_builder().to_bytes() for m in msgs]
+    assert [p.name for p in tmp_path.iterdir()] == ["key.zst"]
+
+  def test_data_files(self):
+    files = {os.path.relpath(f, os.path.realpath(BASEDIR)) for f in data_files()}
+    assert "common/params.cc" in files
+    assert any(f.endswith(".dbc") for f in files)
+    assert any(f.endswith(".toml") for f in files)
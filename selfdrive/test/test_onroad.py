@@ -347,6 +347,8 @@ class TestOnroad:
       result += f"'{s}' execution time: min  {min(ts):.5f}s\n"
       result += f"'{s}' execution time: max  {max(ts):.5f}s\n"
       result += f"'{s}' execution time: mean {np.mean(ts):.5f}s\n"
+      failed = sum(getattr(m, s).solverStatus != 0 for m in self.msgs[s])
+      result += f"'{s}' failed solves: {failed}/{len(ts)}\n"
     result += "------------------------------------------------\n"
     print(result)
 
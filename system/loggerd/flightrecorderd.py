@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+import os
+import mmap
+import time
+import struct
+import argparse
+import datetime
+import threading
+from collections import deque
+
+import numpy as np
+import zstandard as zstd
+
+import cereal.messaging as messaging
+from openpilot.common.file_helpers import LOG_COMPRESSION_LEVEL
+from openpilot.common.swaglog import cloudlog
+from openpilot.system.hardware.hw import Paths
+
+# ring buffer size of each recorded service in bytes, enough for about RECORD_SECONDS of messages
+BUDGETS = {
+  'carState': 2 * 1024 * 1024,
+  'carControl': 1024 * 1024,
+  'carOutput': 512 * 1024,
+  'controlsState': 2 * 1024 * 1024,
+  'selfdriveState': 512 * 1024,
+  'onroadEvents': 256 * 1024,
+  'longitudinalPlan': 1024 * 1024,
+  'radarState': 512 * 1024,
+  'modelV2': 8 * 1024 * 1024,
+  'livePose': 1024 * 1024,
+  'liveParameters': 256 * 1024,
+  'pandaStates': 512 * 1024,
+  'deviceState': 256 * 1024,
+  'can': 8 * 1024 * 1024,
+  'sendcan': 4 * 1024 * 1024,
+}
+RECORD_SECONDS = 30.
+# onroadEvents with any of these types trigger a dump
+TRIGGER_EVENT_TYPES = ('softDisable', 'immediateDisable')
+# a triggered dump is written this long after the trigger, so it also has the aftermath
+POST_TRIGGER_SECONDS = 5.
+# no more than one triggered dump in this long
+TRIGGER_COOLDOWN_SECONDS = 60.
+
+HEADER_SIZE = 16  # head and tail, logical offsets of the next write and the oldest intact record
+RECORD_HEADER = struct.Struct('<I')
+WRAP = 0xFFFFFFFF
+
+
+def get_shm_path() -> str:
+  shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else "/tmp"
+  return os.path.join(shm_dir, "flight_recorder" + os.environ.get("OPENPILOT_PREFIX", ""))
+
+
+def get_dump_dir() -> str:
+  return os.path.join(Paths.log_root(), "flight_recorder")
+
+
+class ServiceRing:
+  """
+  Ring buffer of the serialized messages of one service, records are 8 byte aligned [length, message].
+  Offsets in the header are logical and only grow, the oldest intact record is moved forward before
+  anything is overwritten, so a reader that checks it after copying the buffer never parses a torn record.
+  """
+  def __init__(self, buf: memoryview, size: int):
+    assert size % 8 == 0
+    self.header = np.ndarray(2, dtype=np.uint64, buffer=buf[:HEADER_SIZE])
+    self.data = buf[HEADER_SIZE:HEADER_SIZE + size]
+    self.size = size
+    # logical offsets of the records in the buffer, only known to the writer
+    self.starts: deque[int] = deque()
+
+  def write(self, dat: bytes) -> None:
+    rec_size = (RECORD_HEADER.size + len(dat) + 7) & ~7
+    if rec_size > self.size:
+      return
+
+    head = int(self.header[0])
+    pos = head % self.size
+    # doesn't fit before the end, skip the rest of the buffer
+    wrap_pos = pos if pos + rec_size > self.size else None
+    if wrap_pos is not None:
+      head += self.size - pos
+      pos = 0
+
+    while self.starts and self.starts[0] < head + rec_size - self.size:
+      self.starts.popleft()
+    self.header[1] = self.starts[0] if self.starts else head
+
+    if wrap_pos is not None:
+      RECORD_HEADER.pack_into(self.data, wrap_pos, WRAP)
+    RECORD_HEADER.pack_into(self.data, pos, len(dat))
+    self.data[pos + RECORD_HEADER.size:pos + RECORD_HEADER.size + len(dat)] = dat
+    self.starts.append(head)
+    self.header[0] = head + rec_size
+
+  def read(self) -> list[bytes]:
+    head = int(self.header[0])
+    data = bytes(self.data)
+    tail = int(self.header[1])
+
+    msgs = []
+    pos = tail
+    while pos < head:
+      off = pos % self.size
+      n, = RECORD_HEADER.unpack_from(data, off)
+      if n == WRAP:
+        pos += self.size - off
+        continue
+      msgs.append(data[off + RECORD_HEADER.size:off + RECORD_HEADER.size + n])
+      pos += (RECORD_HEADER.size + n + 7) & ~7
+    return msgs
+
+
+class FlightRecorder:
+  """The ring buffers of all recorded services, in one shared memory file that outlives the recorder"""
+  def __init__(self, budgets: dict[str, int], path: str | None = None, create: bool = False):
+    self.path = path or get_shm_path()
+    size = sum(HEADER_SIZE + b for b in budgets.values())
+
+    if create:
+      # a file of a different layout can't be read, start over
+      if not os.path.isfile(self.path) or os.path.getsize(self.path) != size:
+        with open(self.path, "wb") as f:
+          f.truncate(size)
+    assert os.path.getsize(self.path) == size, "flight recorder buffer doesn't match the budgets"
+
+    with open(self.path, "r+b" if create else "rb") as f:
+      self.mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_WRITE if create else mmap.ACCESS_READ)
+    buf = memoryview(self.mm)
+
+    self.rings: dict[str, ServiceRing] = {}
+    offset = 0
+    for s, budget in budgets.items():
+      self.rings[s] = ServiceRing(buf[offset:offset + HEADER_SIZE + budget], budget)
+      offset += HEADER_SIZE + budget
+    if create:
+      # resume after the records of a previous run, they stay readable until they're overwritten
+      for ring in self.rings.values():
+        ring.starts.extend(self._record_starts(ring))
+
+  @staticmethod
+  def _record_starts(ring: ServiceRing) -> list[int]:
+    starts = []
+    pos, head = int(ring.header[1]), int(ring.header[0])
+    while pos < head:
+      off = pos % ring.size
+      n, = RECORD_HEADER.unpack_from(ring.data, off)
+      if n == WRAP:
+        pos += ring.size - off
+        continue
+      starts.append(pos)
+      pos += (RECORD_HEADER.size + n + 7) & ~7
+    return starts
+
+  def write(self, s: str, dat: bytes) -> None:
+    self.rings[s].write(dat)
+
+  def snapshot(self) -> dict[str, list[bytes]]:
+    return {s: ring.read() for s, ring in self.rings.items()}
+
+
+def dump(snapshot: dict[str, list[bytes]], fn: str, seconds: float = RECORD_SECONDS) -> int:
+  """Writes the last seconds of a snapshot as a log file, returns the number of messages"""
+  msgs = []
+  for dats in snapshot.values():
+    for dat in dats:
+      msgs.append((messaging.log_from_bytes(dat).logMonoTime, dat))
+  msgs.sort(key=lambda m: m[0])
+  if len(msgs):
+    start_time = msgs[-1][0] - int(seconds * 1e9)
+    msgs = [m for m in msgs if m[0] >= start_time]
+
+  dat = b"".join(dat for _, dat in msgs)
+  if fn.endswith(".zst"):
+    dat = zstd.compress(dat, LOG_COMPRESSION_LEVEL)
+  os.makedirs(os.path.dirname(os.path.abspath(fn)), exist_ok=True)
+  with open(fn, "wb") as f:
+    f.write(dat)
+  return len(msgs)
+
+
+def get_dump_fn(reason: str) -> str:
+  return os.path.join(get_dump_dir(), f"{datetime.datetime.now().strftime('%Y-%m-%d--%H-%M-%S')}--{reason}.zst")
+
+
+def is_trigger(dat: bytes) -> bool:
+  return any(getattr(e, et) for e in messaging.log_from_bytes(dat).onroadEvents for et in TRIGGER_EVENT_TYPES)
+
+
+def main() -> None:
+  recorder = FlightRecorder(BUDGETS, create=True)
+  poller = messaging.Poller()
+  socks = {s: messaging.sub_sock(s, poller=poller, conflate=False) for s in BUDGETS}
+
+  dump_time: float | None = None
+  last_trigger = -TRIGGER_COOLDOWN_SECONDS
+  while True:
+    poller.poll(100)
+    for s, sock in socks.items():
+      for dat in messaging.drain_sock_raw(sock):
+        recorder.write(s, dat)
+        if s == 'onroadEvents' and time.monotonic() - last_trigger > TRIGGER_COOLDOWN_SECONDS and is_trigger(dat):
+          last_trigger = time.monotonic()
+          dump_time = last_trigger + POST_TRIGGER_SECONDS
+          cloudlog.event("flight recorder triggered", events=[str(e.name) for e in messaging.log_from_bytes(dat).onroadEvents])
+
+    if dump_time is not None and time.monotonic() > dump_time:
+      dump_time = None
+      # copying the buffers is fast, parsing and compressing runs in the background
+      fn = get_dump_fn("disengage")
+      threading.Thread(target=dump, args=(recorder.snapshot(), fn), daemon=True).start()
+      cloudlog.event("flight recorder dump", fn=fn)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Record the last seconds of selected services in shared memory, or dump them to a log file")
+  parser.add_argument("--dump", nargs="?", const="", default=None, metavar="FILE",
+                      help=f"Output log file, defaults to a new file in {get_dump_dir()}")
+  parser.add_argument("--seconds", type=float, default=RECORD_SECONDS)
+  args = parser.parse_args()
+
+  if args.dump is None:
+    main()
+  else:
+    fn = args.dump or get_dump_fn("manual")
+    n = dump(FlightRecorder(BUDGETS).snapshot(), fn, args.seconds)
+    print(f"Wrote {n} messages to {fn}")
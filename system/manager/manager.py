@@ -46,9 +46,8 @@ def manager_init() -> None:
     params.put_bool("RecordFront", True)
 
   # set unset params
-  for k, v in default_params:
-    if params.get(k) is None:
-      params.put(k, v)
+  values = params.get_many([k for k, _ in default_params])
+  params.put_many({k: v for k, v in default_params if values[k] is None})
 
   # Create folders needed for msgq
   try:
@@ -60,16 +59,17 @@ def manager_init() -> None:
 
   # set params
   serial = HARDWARE.get_serial()
-  params.put("Version", build_metadata.openpilot.version)
-  params.put("TermsVersion", terms_version)
-  params.put("TrainingVersion", training_version)
-  params.put("GitCommit", build_metadata.openpilot.git_commit)
-  params.put("GitCommitDate", build_metadata.openpilot.git_commit_date)
-  params.put("GitBranch", build_metadata.channel)
-  params.put("GitRemote", build_metadata.openpilot.git_origin)
-  params.put_bool("IsTestedBranch", build_metadata.tested_channel)
-  params.put_bool("IsReleaseBranch", build_metadata.release_channel)
-  params.put("HardwareSerial", serial)
+  with params.transaction() as tx:
+    tx.put("Version", build_metadata.openpilot.version)
+    tx.put("TermsVersion", terms_version)
+    tx.put("TrainingVersion", training_version)
+    tx.put("GitCommit", build_metadata.openpilot.git_commit)
+    tx.put("GitCommitDate", build_metadata.openpilot.git_commit_date)
+    tx.put("GitBranch", build_metadata.channel)
+    tx.put("GitRemote", build_metadata.openpilot.git_origin)
+    tx.put_bool("IsTestedBranch", build_metadata.tested_channel)
+    tx.put_bool("IsReleaseBranch", build_metadata.release_channel)
+    tx.put("HardwareSerial", serial)
 
   # set dongle id
   reg_res = register(show_spinner=True)
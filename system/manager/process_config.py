@@ -45,6 +45,10 @@ def long_maneuver(started: bool, params: Params, CP: car.CarParams) -> bool:
 def not_long_maneuver(started: bool, params: Params, CP: car.CarParams) -> bool:
   return started and not params.get_bool("LongitudinalManeuverMode")
 
+def flight_recorder(started: bool, params: Params, CP: car.CarParams) -> bool:
+  # a recorder reading every service would take the frames of the daemon a fake event locks a service for
+  return started and params.get_bool("FlightRecorderEnabled") and os.getenv("CEREAL_FAKE") is None
+
 def qcomgps(started: bool, params: Params, CP: car.CarParams) -> bool:
   return started and not ublox_available()
 
@@ -107,6 +111,7 @@ procs = [
   PythonProcess("updated", "system.updated.updated", only_offroad, enabled=not PC),
   PythonProcess("uploader", "system.loggerd.uploader", always_run),
   PythonProcess("statsd", "system.statsd", always_run),
+  PythonProcess("flightrecorderd", "system.loggerd.flightrecorderd", flight_recorder),
 
   # debug procs
   NativeProcess("bridge", "cereal/messaging", ["./bridge"], notcar),
@@ -298,6 +298,31 @@ cdef class AcadosOcpSolverCython:
         return out
 
 
+    def get_all(self, str field_):
+        """
+        Get the last solution of the solver at all shooting nodes in one call.
+
+            :param field: string in ['x', 'u']
+            :returns: array with one row per stage, N+1 rows for 'x' and N rows for 'u'
+        """
+        if field_ not in ['x', 'u']:
+            raise Exception('AcadosOcpSolverCython.get_all(): {} is an invalid argument.\
+                    \n Possible values are {}.'.format(field_, ['x', 'u']))
+
+        field = field_.encode('utf-8')
+        cdef int n_stages = self.N + 1 if field_ == 'x' else self.N
+        cdef int dims = acados_solver_common.ocp_nlp_dims_get_from_attr(self.nlp_config,
+            self.nlp_dims, self.nlp_out, 0, field)
+
+        cdef cnp.ndarray[cnp.float64_t, ndim=2] out = np.zeros((n_stages, dims))
+        cdef int stage
+        for stage in range(n_stages):
+            acados_solver_common.ocp_nlp_out_get(self.nlp_config, \
+                self.nlp_dims, self.nlp_out, stage, field, <void *> &out[stage, 0])
+
+        return out
+
+
     def print_statistics(self):
         """
         prints statistics of previous solver run as a table:
@@ -587,6 +612,47 @@ cdef class AcadosOcpSolverCython:
                     self.nlp_solver, stage, field, <void *> value.data)
         return
 
+    def set_all(self, str field_, values_):
+        """
+        Set numerical data of all shooting nodes in one call.
+
+            :param field: string in ['x', 'p', 'yref']
+            :param values: array with one row per stage 0..N, rows have the dimension of the
+                           stages, except the terminal 'yref' which uses the start of its row
+        """
+        if not isinstance(values_, np.ndarray):
+            raise Exception(f"set_all: value must be numpy array, got {type(values_)}.")
+        if field_ not in ['x', 'p', 'yref']:
+            raise Exception('AcadosOcpSolverCython.set_all(): {} is not a valid argument.\
+                \nPossible values are {}.'.format(field_, ['x', 'p', 'yref']))
+        if values_.ndim != 2 or values_.shape[0] != self.N + 1:
+            raise Exception('AcadosOcpSolverCython.set_all(): values must have one row per stage, '
+                'expected {} rows, got shape {}.'.format(self.N + 1, values_.shape))
+
+        field = field_.encode('utf-8')
+        cdef cnp.ndarray[cnp.float64_t, ndim=2] values = np.ascontiguousarray(values_, dtype=np.float64)
+        cdef int stage, dims
+        for stage in range(self.N + 1):
+            if field_ == 'p':
+                assert acados_solver.acados_update_params(self.capsule, stage, <double *> &values[stage, 0], values.shape[1]) == 0
+                continue
+
+            dims = acados_solver_common.ocp_nlp_dims_get_from_attr(self.nlp_config,
+                self.nlp_dims, self.nlp_out, stage, field)
+            # the terminal cost can have fewer outputs, its yref is the start of the row
+            if dims != values.shape[1] and not (field_ == 'yref' and stage == self.N and dims < values.shape[1]):
+                msg = 'AcadosOcpSolverCython.set_all(): mismatching dimension for field "{}" '.format(field_)
+                msg += 'with dimension {} at stage {} (you have {})'.format(dims, stage, values.shape[1])
+                raise Exception(msg)
+
+            if field_ == 'x':
+                acados_solver_common.ocp_nlp_out_set(self.nlp_config,
+                    self.nlp_dims, self.nlp_out, stage, field, <void *> &values[stage, 0])
+            else:
+                acados_solver_common.ocp_nlp_cost_model_set(self.nlp_config,
+                    self.nlp_dims, self.nlp_in, stage, field, <void *> &values[stage, 0])
+        return
+
     def cost_set(self, int stage, str field_, value_):
         """
         Set numerical data in the cost module of the solver.
@@ -686,7 +752,7 @@ cdef class AcadosOcpSolverCython:
         """
         Set options of the solver.
 
-            :param field: string, e.g. 'print_level', 'rti_phase', 'initialize_t_slacks', 'step_length', 'alpha_min', 'alpha_reduction', 'qp_warm_start', 'line_search_use_sufficient_descent', 'full_step_dual', 'globalization_use_SOC', 'qp_tol_stat', 'qp_tol_eq', 'qp_tol_ineq', 'qp_tol_comp', 'qp_tau_min', 'qp_mu0'
+            :param field: string, e.g. 'print_level', 'rti_phase', 'initialize_t_slacks', 'step_length', 'alpha_min', 'alpha_reduction', 'qp_warm_start', 'qp_iter_max', 'line_search_use_sufficient_descent', 'full_step_dual', 'globalization_use_SOC', 'qp_tol_stat', 'qp_tol_eq', 'qp_tol_ineq', 'qp_tol_comp', 'qp_tau_min', 'qp_mu0'
 
             :param value: of type int, float, string
 
@@ -698,7 +764,7 @@ cdef class AcadosOcpSolverCython:
             - qp_mu0: for HPIPM QP solvers: initial value for complementarity slackness
             - warm_start_first_qp: indicates if first QP in SQP is warm_started
         """
-        int_fields = ['print_level', 'rti_phase', 'initialize_t_slacks', 'qp_warm_start', 'line_search_use_sufficient_descent', 'full_step_dual', 'globalization_use_SOC', 'warm_start_first_qp']
+        int_fields = ['print_level', 'rti_phase', 'initialize_t_slacks', 'qp_warm_start', 'qp_iter_max', 'line_search_use_sufficient_descent', 'full_step_dual', 'globalization_use_SOC', 'warm_start_first_qp']
         double_fields = ['step_length', 'tol_eq', 'tol_stat', 'tol_ineq', 'tol_comp', 'alpha_min', 'alpha_reduction', 'eps_sufficient_descent',
         'qp_tol_stat', 'qp_tol_eq', 'qp_tol_ineq', 'qp_tol_comp', 'qp_tau_min', 'qp_mu0']
         string_fields = ['globalization']
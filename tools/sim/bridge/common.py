@@ -1,17 +1,24 @@
+import capnp
 import signal
 import threading
 import functools
+import time
 import numpy as np
 
 from collections import namedtuple
 from enum import Enum
 from multiprocessing import Process, Queue, Value
 from abc import ABC, abstractmethod
+from collections.abc import Callable
+
+import cereal.messaging as messaging
 
 from opendbc.car.honda.values import CruiseButtons
 from openpilot.common.params import Params
-from openpilot.common.realtime import Ratekeeper
+from openpilot.common.realtime import DT_CTRL, Ratekeeper
 from openpilot.selfdrive.test.helpers import set_params_enabled
+from openpilot.selfdrive.test.process_replay.process_replay import ProcessConfig, ReplayContext
+from openpilot.system.manager.process_config import managed_processes
 from openpilot.tools.sim.lib.common import SimulatorState, World
 from openpilot.tools.sim.lib.simulated_car import SimulatedCar
 from openpilot.tools.sim.lib.simulated_sensors import SimulatedSensors
@@ -34,10 +41,39 @@ def rk_loop(function, hz, exit_event: threading.Event):
     rk.keep_time()
 
 
+# openpilot has to be launched with the same fake prefix, see launch_openpilot.sh
+LOCKSTEP_PREFIX = "simbridge"
+# the outputs of openpilot a lockstep step waits for, see SimulatorBridge.lockstep_wait
+LOCKSTEP_OUTPUTS = ["carControl", "modelV2", "livePose"]
+LOCKSTEP_STARTUP_TIMEOUT_MS = 50
+# fake events pair a socket with a single reader: the daemon each locked service is handed to, and its other readers,
+# which would take the frames of the step and have to be blocked in launch_openpilot.sh
+LOCKSTEP_READERS = {"can": "card"}
+LOCKSTEP_BLOCKED_READERS = {"can": ["flightrecorderd"]}
+# modeld is disabled in this tree, the camera frames aren't waited for without it
+MODELD_RUNS = "modeld" in managed_processes
+
+
+def log_mono_time(msg) -> int:
+  return msg.logMonoTime
+
+
+def model_frame_id(msg) -> int:
+  return msg.modelV2.frameId
+
+
+def lockstep_context() -> ReplayContext:
+  # same fake event synchronisation as card in process replay: card blocks in recv("can") until the bridge hands it
+  # the next step, and its drain of can ends on an empty recv. Fake events pair a socket with a single reader, so
+  # the services read by several daemons aren't locked, the bridge waits for what openpilot computes from them instead
+  cfg = ProcessConfig(LOCKSTEP_PREFIX, pubs=list(LOCKSTEP_READERS), subs=[], ignore=[], main_pub="can", main_pub_drained=True)
+  return ReplayContext(cfg)
+
+
 class SimulatorBridge(ABC):
   TICKS_PER_FRAME = 5
 
-  def __init__(self, dual_camera, high_quality):
+  def __init__(self, dual_camera, high_quality, lockstep=False):
     set_params_enabled()
     self.params = Params()
     self.params.put_bool("ExperimentalLongitudinalEnabled", True)
@@ -46,6 +82,10 @@ class SimulatorBridge(ABC):
 
     self.dual_camera = dual_camera
     self.high_quality = high_quality
+    self.lockstep = lockstep
+    self.rc: ReplayContext | None = None
+    self.lockstep_socks: dict[str, messaging.SubSocket] = {}
+    self.lockstep_seen: set[str] = set()
 
     self._exit_event: threading.Event | None = None
     self._threads = []
@@ -79,6 +119,10 @@ class SimulatorBridge(ABC):
     if self._exit_event is not None:
       self._exit_event.set()
 
+    if self.rc is not None:
+      self.rc.close_context()
+      self.rc = None
+
     if self.world is not None:
       self.world.close(reason)
 
@@ -94,6 +138,31 @@ State:
 Ignition: {self.simulator_state.ignition} Engaged: {self.simulator_state.is_engaged}
     """)
 
+  def lockstep_wait(self, service: str, get_step: Callable[[capnp._DynamicStructReader], int], step: int) -> capnp._DynamicStructReader | None:
+    """
+    Blocks until openpilot published the output of the current step on service, the first message with get_step(msg) >= step, and returns it.
+    Until the daemon publishing it first shows up the wait gives up after LOCKSTEP_STARTUP_TIMEOUT_MS, so openpilot can start.
+    """
+    sock = self.lockstep_socks[service]
+    while True:
+      msg = messaging.recv_one(sock)
+      if msg is None:
+        if service not in self.lockstep_seen:
+          return None
+        continue
+      self.lockstep_seen.add(service)
+      if get_step(msg) >= step:
+        return msg
+
+  def check_lockstep_readers(self) -> None:
+    msg = messaging.recv_one_or_none(self.manager_sock)
+    if msg is None:
+      return
+    running = {p.name for p in msg.managerState.processes if p.running}
+    for service, readers in LOCKSTEP_BLOCKED_READERS.items():
+      assert not running.intersection(readers), \
+        f"{service} is locked for {LOCKSTEP_READERS[service]}, but {sorted(running.intersection(readers))} also read it, block them"
+
   @abstractmethod
   def spawn_world(self, q: Queue) -> World:
     pass
@@ -101,18 +170,26 @@ Ignition: {self.simulator_state.ignition} Engaged: {self.simulator_state.is_enga
   def _run(self, q: Queue):
     self.world = self.spawn_world(q)
 
-    self.simulated_car = SimulatedCar()
+    if self.lockstep:
+      self.rc = lockstep_context()
+      self.rc.open_context()
+      self.lockstep_socks = {s: messaging.sub_sock(s, timeout=LOCKSTEP_STARTUP_TIMEOUT_MS) for s in LOCKSTEP_OUTPUTS}
+      self.manager_sock = messaging.sub_sock('managerState', conflate=True)
+
+    self.simulated_car = SimulatedCar(self.rc)
     self.simulated_sensors = SimulatedSensors(self.dual_camera)
 
     self._exit_event = threading.Event()
 
-    self.simulated_car_thread = threading.Thread(target=rk_loop, args=(functools.partial(self.simulated_car.update, self.simulator_state),
-                                                                        100, self._exit_event))
-    self.simulated_car_thread.start()
+    # in lockstep mode the car and cameras are stepped from the main loop instead
+    if not self.lockstep:
+      self.simulated_car_thread = threading.Thread(target=rk_loop, args=(functools.partial(self.simulated_car.update, self.simulator_state),
+                                                                          100, self._exit_event))
+      self.simulated_car_thread.start()
 
-    self.simulated_camera_thread = threading.Thread(target=rk_loop, args=(functools.partial(self.simulated_sensors.send_camera_images, self.world),
-                                                                        20, self._exit_event))
-    self.simulated_camera_thread.start()
+      self.simulated_camera_thread = threading.Thread(target=rk_loop, args=(functools.partial(self.simulated_sensors.send_camera_images, self.world),
+                                                                          20, self._exit_event))
+      self.simulated_camera_thread.start()
 
     # Simulation tends to be slow in the initial steps. This prevents lagging later
     for _ in range(20):
@@ -167,7 +244,17 @@ Ignition: {self.simulator_state.ignition} Engaged: {self.simulator_state.is_enga
       steer_manual = steer_manual * -40
 
       # Update openpilot on current sensor state
-      self.simulated_sensors.update(self.simulator_state, self.world)
+      if self.lockstep:
+        self.check_lockstep_readers()
+        # can goes out last: selfdrived and controlsd read everything else of the step when handling its carState
+        step_sent = time.monotonic_ns()
+        self.simulated_sensors.update(self.simulator_state, self.world, self.rk.frame * DT_CTRL)
+        self.simulated_car.update(self.simulator_state)
+        # don't advance simulated time until openpilot computed the carControl of this step
+        if self.simulator_state.valid:
+          self.lockstep_wait("carControl", log_mono_time, step_sent)
+      else:
+        self.simulated_sensors.update(self.simulator_state, self.world)
 
       self.simulated_car.sm.update(0)
       self.simulator_state.is_engaged = self.simulated_car.sm['selfdriveState'].active
@@ -196,6 +283,14 @@ Ignition: {self.simulator_state.ignition} Engaged: {self.simulator_state.is_enga
       if self.rk.frame % self.TICKS_PER_FRAME == 0:
         self.world.tick()
         self.world.read_cameras()
+        if self.lockstep:
+          self.simulated_sensors.send_camera_images(self.world)
+        if self.lockstep and MODELD_RUNS:
+          # modeld has to run on this frame and locationd on its cameraOdometry, which also takes in the IMU of the step
+          frame_id = self.simulated_sensors.camerad.frame_road_id - 1
+          model = self.lockstep_wait("modelV2", model_frame_id, frame_id)
+          if model is not None:
+            self.lockstep_wait("livePose", log_mono_time, model.logMonoTime + 1)
 
       # don't print during test, so no print/IO Block between OP and metadrive processes
       if not self.test_run and self.rk.frame % 25 == 0:
@@ -203,4 +298,7 @@ Ignition: {self.simulator_state.ignition} Engaged: {self.simulator_state.is_enga
 
       self.started.value = True
 
-      self.rk.keep_time()
+      if self.lockstep:
+        self.rk.monitor_time()
+      else:
+        self.rk.keep_time()
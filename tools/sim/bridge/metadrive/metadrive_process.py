@@ -11,7 +11,7 @@ from metadrive.engine.core.image_buffer import ImageBuffer
 from metadrive.envs.metadrive_env import MetaDriveEnv
 from metadrive.obs.image_obs import ImageObservation
 
-from openpilot.common.realtime import Ratekeeper
+from openpilot.common.realtime import DT_CTRL, Ratekeeper
 
 from openpilot.tools.sim.lib.common import vec3
 from openpilot.tools.sim.lib.camerad import W, H
@@ -50,7 +50,7 @@ def apply_metadrive_patches(arrive_dest_done=True):
 
 def metadrive_process(dual_camera: bool, config: dict, camera_array, wide_camera_array, image_lock,
                       controls_recv: Connection, simulation_state_send: Connection, vehicle_state_send: Connection,
-                      exit_event, op_engaged, test_duration, test_run):
+                      exit_event, op_engaged, test_duration, test_run, lockstep=False):
   arrive_dest_done = config.pop("arrive_dest_done", True)
   apply_metadrive_patches(arrive_dest_done)
 
@@ -95,6 +95,10 @@ def metadrive_process(dual_camera: bool, config: dict, camera_array, wide_camera
 
   rk = Ratekeeper(100, None)
 
+  # in lockstep mode each bridge step advances the simulation by one frame
+  def sim_time():
+    return rk.frame * DT_CTRL if lockstep else time.monotonic()
+
   steer_ratio = 8
   vc = [0,0]
 
@@ -107,9 +111,16 @@ def metadrive_process(dual_camera: bool, config: dict, camera_array, wide_camera
     )
     vehicle_state_send.send(vehicle_state)
 
+    if lockstep:
+      while not controls_recv.poll(0.1):
+        if exit_event.is_set():
+          return
+
     if controls_recv.poll(0):
       while controls_recv.poll(0):
         steer_angle, gas, should_reset = controls_recv.recv()
+        if lockstep:
+          break  # exactly one simulation frame per bridge step
 
       steer_metadrive = steer_angle * 1 / (env.vehicle.MAX_STEERING * steer_ratio)
       steer_metadrive = np.clip(steer_metadrive, -1, 1)
@@ -122,11 +133,11 @@ def metadrive_process(dual_camera: bool, config: dict, camera_array, wide_camera
 
     is_engaged = op_engaged.is_set()
     if is_engaged and start_time is None:
-      start_time = time.monotonic()
+      start_time = sim_time()
 
     if rk.frame % 5 == 0:
       _, _, terminated, _, _ = env.step(vc)
-      timeout = True if start_time is not None and time.monotonic() - start_time >= test_duration else False
+      timeout = True if start_time is not None and sim_time() - start_time >= test_duration else False
       lane_idx_curr, on_lane = get_current_lane_info(env.vehicle)
       out_of_lane = lane_idx_curr != lane_idx_prev or not on_lane
       lane_idx_prev = lane_idx_curr
@@ -151,4 +162,7 @@ def metadrive_process(dual_camera: bool, config: dict, camera_array, wide_camera
       road_image[...] = get_cam_as_rgb("rgb_road")
       image_lock.release()
 
-    rk.keep_time()
+    if lockstep:
+      rk.monitor_time()
+    else:
+      rk.keep_time()
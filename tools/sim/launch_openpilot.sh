@@ -6,7 +6,13 @@ export SIMULATION="1"
 export SKIP_FW_QUERY="1"
 export FINGERPRINT="HONDA_CIVIC_2022"
 
-export BLOCK="${BLOCK},camerad,loggerd,encoderd,micd,logmessaged"
+if [[ "$LOCKSTEP" ]]; then
+  # must match LOCKSTEP_PREFIX in bridge/common.py
+  export CEREAL_FAKE="1"
+  export CEREAL_FAKE_PREFIX="simbridge"
+fi
+
+export BLOCK="${BLOCK},camerad,loggerd,encoderd,micd,logmessaged,flightrecorderd"
 if [[ "$CI" ]]; then
   # TODO: offscreen UI should work
   export BLOCK="${BLOCK},ui"
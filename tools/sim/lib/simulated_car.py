@@ -13,8 +13,9 @@ class SimulatedCar:
   """Simulates a honda civic 2022 (panda state + can messages) to OpenPilot"""
   packer = CANPacker("honda_civic_ex_2022_can_generated")
 
-  def __init__(self):
+  def __init__(self, rc=None):
     self.pm = messaging.PubMaster(['can', 'pandaStates'])
+    self.rc = rc  # ReplayContext synchronising can with openpilot in lockstep mode
     self.sm = messaging.SubMaster(['carControl', 'controlsState', 'carParams', 'selfdriveState'])
     self.cp = self.get_car_can_parser()
     self.idx = 0
@@ -78,7 +79,12 @@ class SimulatedCar:
     msg.append(self.packer.make_can_msg("ACC_HUD", 2, {}))
     msg.append(self.packer.make_can_msg("LKAS_HUD", 2, {}))
 
-    self.pm.send('can', can_list_to_can_capnp(msg))
+    if self.rc is not None:
+      self.rc.send_sync(self.pm, 'can', can_list_to_can_capnp(msg))
+      # an empty recv ends card's drain of can, it then publishes the carState of this step and comes back to recv
+      self.rc.wait_for_next_recv(True)
+    else:
+      self.pm.send('can', can_list_to_can_capnp(msg))
 
   def send_panda_state(self, simulator_state):
     self.sm.update(0)
@@ -101,11 +107,14 @@ class SimulatedCar:
 
   def update(self, simulator_state: SimulatorState):
     try:
-      self.send_can_messages(simulator_state)
-
-      if self.idx % 50 == 0: # only send panda states at 2hz
+      # panda states go first, so card and selfdrived have them when handling the can of the same step.
+      # In lockstep mode card waits for one after its first can on startup, so they go every step until it's up
+      card_starting = self.rc is not None and not self.sm.seen['carParams']
+      if self.idx % 50 == 0 or card_starting: # only send panda states at 2hz
         self.send_panda_state(simulator_state)
 
+      self.send_can_messages(simulator_state)
+
       self.idx += 1
     except Exception:
       traceback.print_exc()
@@ -108,8 +108,10 @@ class SimulatedSensors:
       yuv = self.camerad.rgb_to_yuv(world.wide_road_image)
       self.camerad.cam_send_yuv_wide_road(yuv)
 
-  def update(self, simulator_state: 'SimulatorState', world: 'World'):
-    now = time.time()
+  def update(self, simulator_state: 'SimulatorState', world: 'World', now: float | None = None):
+    # now is the simulated time in lockstep mode, wall time otherwise
+    if now is None:
+      now = time.time()
     self.send_imu_message(simulator_state)
     self.send_gps_message(simulator_state)
 
@@ -0,0 +1,70 @@
+import os
+import re
+import threading
+
+from cereal import car, messaging
+from openpilot.common.basedir import BASEDIR
+from openpilot.common.params import Params
+from openpilot.common.prefix import OpenpilotPrefix
+from openpilot.system.manager.process_config import managed_processes
+from openpilot.tools.sim.bridge.common import LOCKSTEP_BLOCKED_READERS, LOCKSTEP_READERS, lockstep_context
+
+SIM_DIR = os.path.join(BASEDIR, "tools/sim")
+
+
+def get_blocked() -> set[str]:
+  with open(os.path.join(SIM_DIR, "launch_openpilot.sh")) as f:
+    return {p for block in re.findall(r'export BLOCK="\$\{BLOCK\},([\w,]+)"', f.read()) for p in block.split(",")}
+
+
+class TestLockstep:
+  def test_readers(self):
+    blocked = get_blocked()
+    for service, reader in LOCKSTEP_READERS.items():
+      assert reader in managed_processes and reader not in blocked
+      for p in LOCKSTEP_BLOCKED_READERS.get(service, []):
+        assert p in managed_processes and p in blocked, f"{p} reads {service}, which lockstep locks for {reader}"
+
+  def test_flight_recorder_not_run(self, monkeypatch):
+    assert "flightrecorderd" in get_blocked()
+
+    with OpenpilotPrefix():
+      params = Params()
+      CP = car.CarParams.new_message()
+      should_run = managed_processes['flightrecorderd'].should_run
+      assert not should_run(True, params, CP)
+      params.put_bool("FlightRecorderEnabled", True)
+      assert should_run(True, params, CP)
+
+      monkeypatch.setenv("CEREAL_FAKE", "1")
+      assert not should_run(True, params, CP)
+
+  def test_step(self, monkeypatch):
+    # a lockstep step hands card exactly the can of the step, even with the flight recorder enabled
+    monkeypatch.setenv("CEREAL_FAKE", "1")
+    with OpenpilotPrefix():
+      params = Params()
+      params.put_bool("FlightRecorderEnabled", True)
+      recorder = managed_processes['flightrecorderd']
+      if recorder.should_run(True, params, car.CarParams.new_message()):
+        recorder.start()
+
+      rc = lockstep_context()
+      rc.open_context()
+      try:
+        pm = messaging.PubMaster(['can'])
+        can_sock = messaging.sub_sock('can', timeout=20)
+        received: list[list[int]] = []
+
+        def card():
+          while True:
+            received.append([messaging.log_from_bytes(dat).logMonoTime for dat in messaging.drain_sock_raw(can_sock, wait_for_one=True)])
+
+        threading.Thread(target=card, daemon=True).start()
+        for step in range(1, 51):
+          rc.send_sync(pm, 'can', messaging.new_message('can', 1, logMonoTime=step).to_bytes())
+          rc.wait_for_next_recv(True)
+          assert received == [[i] for i in range(1, step + 1)]
+      finally:
+        rc.close_context()
+        recorder.stop()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+import argparse
+import concurrent.futures
+import math
+import os
+import re
+import time
+from collections import defaultdict
+from typing import Any
+
+import numpy as np
+from tabulate import tabulate
+
+from openpilot.selfdrive.locationd.calibrationd import Calibrator
+from openpilot.selfdrive.locationd.locationd import LocationEstimator
+from openpilot.selfdrive.locationd.models.car_kf import States
+from openpilot.selfdrive.locationd.paramsd import ParamsLearner
+from openpilot.tools.lib.logreader import LogReader
+
+# the inputs of calibrationd, locationd and paramsd, their outputs are recomputed
+INPUT_SERVICES = {'carState', 'cameraOdometry', 'accelerometer', 'gyroscope'}
+CALIBRATION_DECIMATION = 5  # calibrationd publishes on every 5th cameraOdometry
+
+POSE_FIELDS = {
+  'orientation': 'orientationNED',
+  'velocity': 'velocityDevice',
+  'angular_velocity': 'angularVelocityDevice',
+  'acceleration': 'accelerationDevice',
+}
+PARAMS_STATES = {
+  'steer_ratio': States.STEER_RATIO,
+  'stiffness': States.STIFFNESS,
+  'angle_offset': States.ANGLE_OFFSET,
+  'angle_offset_fast': States.ANGLE_OFFSET_FAST,
+  'road_roll': States.ROAD_ROLL,
+}
+
+
+class Reestimator:
+  """
+  The calibration, pose and vehicle params estimators of one route, chained in-process like their daemons are onroad:
+  liveCalibration goes to the pose and params estimators and livePose to the params one.
+  Every output is kept as a row of columns.
+  """
+  def __init__(self, CP):
+    self.calibrator = Calibrator(param_put=False)
+    self.calibrator.not_car = CP.notCar
+    self.pose = LocationEstimator(debug=False)
+    self.learner = ParamsLearner(CP, CP.steerRatio, 1.0, 0.0)
+    self.cam_odom_frames = 0
+    self.columns: dict[str, defaultdict[str, list[float]]] = {k: defaultdict(list) for k in ('calibration', 'pose', 'params')}
+
+  def handle_msg(self, msg) -> None:
+    which = msg.which()
+    t = msg.logMonoTime * 1e-9
+    data = getattr(msg, which)
+    # locationd and paramsd drop invalid inputs
+    if which == 'carState':
+      self.calibrator.handle_v_ego(data.vEgo)
+      if msg.valid:
+        self.pose.handle_log(t, which, data)
+        self.learner.handle_log(t, which, data)
+
+    elif which in ('accelerometer', 'gyroscope'):
+      if msg.valid:
+        self.pose.handle_log(t, which, data)
+
+    elif which == 'cameraOdometry':
+      self.calibrator.handle_cam_odom(data.trans, data.rot, data.wideFromDeviceEuler, data.transStd,
+                                      data.roadTransformTrans, data.roadTransformTransStd)
+      if self.cam_odom_frames % CALIBRATION_DECIMATION == 0:
+        live_calib = self.calibrator.get_msg(True).as_reader().liveCalibration
+        self.pose.handle_log(t, 'liveCalibration', live_calib)
+        self.learner.handle_log(t, 'liveCalibration', live_calib)
+        self.add_calibration(t, live_calib)
+      self.cam_odom_frames += 1
+
+      if msg.valid:
+        self.pose.handle_log(t, which, data)
+      live_pose = self.pose.get_msg(True, True, True).as_reader().livePose
+      self.learner.handle_log(t, 'livePose', live_pose)
+      self.add_pose(t, live_pose)
+      self.add_params(t)
+
+  def add_calibration(self, t: float, live_calib) -> None:
+    cols = self.columns['calibration']
+    cols['t'].append(t)
+    for i, axis in enumerate(('roll', 'pitch', 'yaw')):
+      cols[axis].append(live_calib.rpyCalib[i])
+      cols[f'{axis}_spread'].append(live_calib.rpyCalibSpread[i])
+    cols['height'].append(live_calib.height[0])
+    cols['valid_blocks'].append(live_calib.validBlocks)
+    cols['cal_perc'].append(live_calib.calPerc)
+    cols['cal_status'].append(live_calib.calStatus.raw)
+
+  def add_pose(self, t: float, live_pose) -> None:
+    cols = self.columns['pose']
+    cols['t'].append(t)
+    for name, field in POSE_FIELDS.items():
+      meas = getattr(live_pose, field)
+      for axis in ('x', 'y', 'z'):
+        cols[f'{name}_{axis}'].append(getattr(meas, axis))
+        cols[f'{name}_{axis}_std'].append(getattr(meas, f'{axis}Std'))
+    cols['posenet_ok'].append(live_pose.posenetOK)
+
+  def add_params(self, t: float) -> None:
+    cols = self.columns['params']
+    x, std = self.learner.kf.x, np.sqrt(self.learner.kf.P.diagonal())
+    cols['t'].append(t)
+    for name, state in PARAMS_STATES.items():
+      cols[name].append(x[state].item())
+      cols[f'{name}_std'].append(std[state].item())
+    cols['active'].append(self.learner.active)
+
+  def get_arrays(self) -> dict[str, np.ndarray]:
+    """The outputs as estimator/column arrays, the times in float64 and the rest in float32"""
+    return {f'{estimator}/{name}': np.array(values, dtype=np.float64 if name == 't' else np.float32)
+            for estimator, cols in self.columns.items() for name, values in cols.items()}
+
+
+def load_outputs(fn: str) -> dict[str, dict[str, np.ndarray]]:
+  """The columns of each estimator, as written by reestimate_route"""
+  out: defaultdict[str, dict[str, np.ndarray]] = defaultdict(dict)
+  with np.load(fn) as f:
+    for key in f.files:
+      estimator, name = key.split('/', 1)
+      out[estimator][name] = f[key]
+  return dict(out)
+
+
+def get_output_fn(out_dir: str, route: str) -> str:
+  return os.path.join(out_dir, re.sub(r'[^\w-]', '_', route) + '.npz')
+
+
+def reestimate_route(route: str, out_dir: str) -> dict[str, Any]:
+  """Runs the estimators over a route and writes their outputs, returns the stats of the run and the final estimates"""
+  st = time.monotonic()
+  reestimator = None
+  pending: list[Any] = []
+  count, t_start, t_end = 0, math.inf, 0.
+  for msg in LogReader(route, sort_by_time=True):
+    which = msg.which()
+    if which == 'carParams' and reestimator is None:
+      reestimator = Reestimator(msg.carParams)
+      for m in pending:
+        reestimator.handle_msg(m)
+      pending.clear()
+    if which not in INPUT_SERVICES:
+      continue
+
+    # the inputs before the first carParams wait for it
+    if reestimator is None:
+      pending.append(msg)
+    else:
+      reestimator.handle_msg(msg)
+    count += 1
+    t_start, t_end = min(t_start, msg.logMonoTime * 1e-9), msg.logMonoTime * 1e-9
+  assert reestimator is not None, f"{route} has no carParams"
+
+  np.savez_compressed(get_output_fn(out_dir, route), **reestimator.get_arrays())
+  calibration, params = reestimator.columns['calibration'], reestimator.columns['params']
+  return {
+    'duration': t_end - t_start,
+    'wall_time': time.monotonic() - st,
+    'msgs': count,
+    'calibration': [math.degrees(calibration[axis][-1]) if len(calibration['t']) else math.nan for axis in ('roll', 'pitch', 'yaw')],
+    'steer_ratio': params['steer_ratio'][-1] if len(params['t']) else math.nan,
+    'stiffness': params['stiffness'][-1] if len(params['t']) else math.nan,
+    'angle_offset': math.degrees(params['angle_offset'][-1]) if len(params['t']) else math.nan,
+  }
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Re-estimate the calibration, pose and vehicle params of routes in-process, as fast as the CPUs allow",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("routes", nargs="+", help="The routes or segments to re-estimate")
+  parser.add_argument("--out", default="reestimated", help="Directory of the outputs, an .npz of columns per route, read with load_outputs")
+  parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+  args = parser.parse_args()
+
+  os.makedirs(args.out, exist_ok=True)
+  st = time.monotonic()
+  results: dict[str, dict[str, Any]] = {}
+  with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+    futures = {pool.submit(reestimate_route, route, args.out): route for route in args.routes}
+    for future in concurrent.futures.as_completed(futures):
+      try:
+        results[futures[future]] = future.result()
+      except Exception as e:
+        print(f"{futures[future]} failed: {e!r}")
+  elapsed = time.monotonic() - st
+
+  rows = []
+  for route in args.routes:
+    if route in results:
+      r = results[route]
+      rows.append([route, r['duration'], r['wall_time'], r['duration'] / r['wall_time'], r['msgs'], *r['calibration'],
+                   r['steer_ratio'], r['stiffness'], r['angle_offset']])
+  print(tabulate(rows, ["route", "route (s)", "wall (s)", "x realtime", "msgs", "roll (deg)", "pitch (deg)", "yaw (deg)",
+                        "steer ratio", "stiffness", "angle offset (deg)"], tablefmt="simple_grid", floatfmt=".2f"))
+  print(f"{len(results)}/{len(args.routes)} routes in {elapsed:.1f} s, {sum(r['duration'] for r in results.values()) / elapsed:.0f}x realtime")
+  print(f"outputs in {args.out}")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+import argparse
+import concurrent.futures
+import itertools
+import os
+from typing import Any
+
+import numpy as np
+from tabulate import tabulate
+
+import cereal.messaging as messaging
+from cereal import log
+from openpilot.common.realtime import DT_MDL
+from openpilot.selfdrive.controls.lib import longitudinal_planner
+from openpilot.selfdrive.controls.lib.longitudinal_mpc_lib import long_mpc
+from openpilot.selfdrive.controls.lib.longitudinal_planner import LongitudinalPlanner
+from openpilot.tools.lib.logreader import LogReader
+
+PLANNER_SERVICES = ['carControl', 'carState', 'controlsState', 'liveParameters', 'radarState', 'modelV2', 'selfdriveState']
+
+# module constants read at runtime, the ones that are also baked into the generated solver can't be swept
+TUNABLES = {
+  'X_EGO_OBSTACLE_COST': long_mpc,
+  'X_EGO_COST': long_mpc,
+  'V_EGO_COST': long_mpc,
+  'A_EGO_COST': long_mpc,
+  'J_EGO_COST': long_mpc,
+  'A_CHANGE_COST': long_mpc,
+  'DANGER_ZONE_COST': long_mpc,
+  'LEAD_DANGER_FACTOR': long_mpc,
+  'CRUISE_MIN_ACCEL': long_mpc,
+  'CRUISE_MAX_ACCEL': long_mpc,
+  'ALLOW_THROTTLE_THRESHOLD': longitudinal_planner,
+}
+DEFAULTS = {name: getattr(module, name) for name, module in TUNABLES.items()}
+PERSONALITIES = log.LongitudinalPersonality.schema.enumerants
+PERSONALITY_NAMES = {v: k for k, v in PERSONALITIES.items()}
+
+# planner inputs of every route, set once per worker
+_routes: list[list[Any]] = []
+
+
+def load_routes(dats: list[list[bytes]]) -> None:
+  global _routes
+  _routes = [[messaging.log_from_bytes(dat) for dat in route] for route in dats]
+
+
+def replay(msgs: list[Any], personality: int | None) -> dict[str, list[float]]:
+  """Runs a fresh planner over the recorded inputs of one route, open loop"""
+  CP = next(m.carParams for m in msgs if m.which() == 'carParams')
+  planner = LongitudinalPlanner(CP)
+  sm = messaging.SubMaster(PLANNER_SERVICES, poll='modelV2', ignore_avg_freq=['radarState'])
+
+  out: dict[str, list[float]] = {'a_target': [], 'time_gap': [], 'solve_time': [], 'failed': []}
+  pending: dict[str, Any] = {}
+  for msg in msgs:
+    if msg.which() not in PLANNER_SERVICES:
+      continue
+    pending[msg.which()] = msg
+    if msg.which() != 'modelV2':
+      continue
+
+    sm.update_msgs(msg.logMonoTime * 1e-9, list(pending.values()))
+    pending.clear()
+    if personality is not None:
+      selfdrive_state = sm['selfdriveState'].as_builder()
+      selfdrive_state.personality = personality
+      sm.data['selfdriveState'] = selfdrive_state.as_reader()
+
+    planner.update(sm)
+    out['a_target'].append(float(planner.output_a_target))
+    out['solve_time'].append(planner.mpc.solve_time)
+    out['failed'].append(planner.mpc.solution_status != 0)
+
+    lead = sm['radarState'].leadOne
+    if lead.status:
+      # the closest the plan gets to the lead, in seconds at the current speed
+      gap = np.min(planner.mpc.process_lead(lead)[:, 0] - planner.mpc.x_sol[:, 0])
+      out['time_gap'].append(gap / max(sm['carState'].vEgo, 1.))
+  return out
+
+
+def evaluate(params: dict[str, Any]) -> dict[str, float]:
+  """Metrics of one parameter set over all routes"""
+  params = dict(params)
+  personality = params.pop('personality', None)
+  for name, value in (DEFAULTS | params).items():
+    setattr(TUNABLES[name], name, value)
+
+  jerk, a_target, time_gap, solve_time, failed = [], [], [], [], 0
+  for msgs in _routes:
+    out = replay(msgs, personality)
+    a_target += out['a_target']
+    jerk += list(np.diff(out['a_target']) / DT_MDL)
+    time_gap += out['time_gap']
+    solve_time += out['solve_time']
+    failed += sum(out['failed'])
+
+  jerk_abs = np.abs(jerk)
+  return {
+    'jerk rms': float(np.sqrt(np.mean(np.square(jerk)))),
+    'jerk p99': float(np.percentile(jerk_abs, 99)),
+    'accel rms': float(np.sqrt(np.mean(np.square(a_target)))),
+    'time gap p5 (s)': float(np.percentile(time_gap, 5)) if len(time_gap) else float('nan'),
+    'time gap p50 (s)': float(np.percentile(time_gap, 50)) if len(time_gap) else float('nan'),
+    'solve p50 (ms)': float(np.percentile(solve_time, 50) * 1e3),
+    'solve p99 (ms)': float(np.percentile(solve_time, 99) * 1e3),
+    'failed solves': failed,
+  }
+
+
+def get_param_sets(sweeps: list[str]) -> list[dict[str, Any]]:
+  """NAME=v1,v2,... arguments to the cartesian product of their values, the defaults come first"""
+  axes = []
+  for sweep in sweeps:
+    name, values = sweep.split('=')
+    if name == 'personality':
+      axes.append([(name, PERSONALITIES[v]) for v in values.split(',')])
+    else:
+      assert name in TUNABLES, f"{name} can't be swept, choose from: personality, {', '.join(TUNABLES)}"
+      axes.append([(name, float(v)) for v in values.split(',')])
+  return [{}] + [dict(p) for p in itertools.product(*axes)]
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Replay the recorded planner inputs of routes through the longitudinal planner, once per parameter set",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("routes", nargs="+", help="The routes or segments to replay")
+  parser.add_argument("--sweep", action="append", default=[], metavar="NAME=v1,v2,...",
+                      help=f"Values of a parameter, repeat for a grid. Parameters: personality, {', '.join(TUNABLES)}")
+  parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+  args = parser.parse_args()
+
+  services = set(PLANNER_SERVICES) | {'carParams'}
+  dats = [[m.as_builder().to_bytes() for m in LogReader(r, sort_by_time=True) if m.which() in services] for r in args.routes]
+  param_sets = get_param_sets(args.sweep)
+  print(f"{len(param_sets)} parameter sets over {sum(len(d) for d in dats)} messages")
+
+  with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs, initializer=load_routes, initargs=(dats,)) as pool:
+    results = list(pool.map(evaluate, param_sets))
+
+  names = list(dict.fromkeys(k for p in param_sets for k in p))
+  header = names + list(results[0])
+  rows = []
+  for params, result in zip(param_sets, results, strict=True):
+    values = [params.get(n, 'default') for n in names]
+    values = [PERSONALITY_NAMES[v] if n == 'personality' and v != 'default' else v for n, v in zip(names, values, strict=True)]
+    rows.append(values + list(result.values()))
+  print(tabulate(rows, header, tablefmt="simple_grid", floatfmt=".3f"))
@@ -0,0 +1,112 @@
+import numpy as np
+
+import cereal.messaging as messaging
+from cereal import log
+from openpilot.selfdrive.locationd.calibrationd import HEIGHT_INIT, INPUTS_NEEDED
+from openpilot.tools.lib.logreader import save_log
+from openpilot.tools.tuning.reestimate_params import CALIBRATION_DECIMATION, Reestimator, get_output_fn, load_outputs, reestimate_route
+
+SPEED = 20.0  # m/s
+STEER_RATIO = 15.0
+DURATION = 30  # s, enough cameraOdometry for a valid calibration
+CAM_ODOM_FRAMES = DURATION * 20
+
+
+def get_car_params():
+  msg = messaging.new_message('carParams', valid=True)
+  CP = msg.carParams
+  CP.mass = 1500.
+  CP.wheelbase = 2.7
+  CP.centerToFront = 1.35
+  CP.rotationalInertia = 2500.
+  CP.tireStiffnessFront = 200000.
+  CP.tireStiffnessRear = 200000.
+  CP.steerRatio = STEER_RATIO
+  return msg
+
+
+def get_drive(car_params_after: int = 10) -> list:
+  """Driving straight and level at a constant speed, the carParams comes after the first inputs like in a real route"""
+  msgs = []
+  for i in range(DURATION * 100):
+    t = 10**9 + i * 10**7
+    if i == car_params_after:
+      msgs.append(get_car_params())
+      msgs[-1].logMonoTime = t
+
+    msgs.append(messaging.new_message('carState', valid=True, logMonoTime=t))
+    msgs[-1].carState.vEgo = SPEED
+
+    msgs.append(messaging.new_message('accelerometer', valid=True, logMonoTime=t))
+    msgs[-1].accelerometer.init('acceleration')
+    msgs[-1].accelerometer.acceleration.v = [9.81, 0., 0.]
+    msgs[-1].accelerometer.source = log.SensorEventData.SensorSource.lsm6ds3
+    msgs[-1].accelerometer.timestamp = t
+
+    msgs.append(messaging.new_message('gyroscope', valid=True, logMonoTime=t))
+    msgs[-1].gyroscope.init('gyroUncalibrated')
+    msgs[-1].gyroscope.gyroUncalibrated.v = [0., 0., 0.]
+    msgs[-1].gyroscope.source = log.SensorEventData.SensorSource.lsm6ds3
+    msgs[-1].gyroscope.timestamp = t
+
+    if i % 5 == 0:
+      msgs.append(messaging.new_message('cameraOdometry', valid=True, logMonoTime=t))
+      cam_odom = msgs[-1].cameraOdometry
+      cam_odom.trans = [SPEED, 0., 0.]
+      cam_odom.rot = [0., 0., 0.]
+      cam_odom.wideFromDeviceEuler = [0., 0., 0.]
+      cam_odom.transStd = [0.01, 0.01, 0.01]
+      cam_odom.rotStd = [0.01, 0.01, 0.01]
+      cam_odom.roadTransformTrans = [0., 0., HEIGHT_INIT.item()]
+      cam_odom.roadTransformTransStd = [1e-3, 1e-3, 1e-3]
+  return [m.as_reader() for m in msgs]
+
+
+class TestReestimateParams:
+  def test_reestimate_route(self, tmp_path):
+    route = str(tmp_path / "rlog.zst")
+    save_log(route, get_drive())
+    stats = reestimate_route(route, str(tmp_path))
+    assert stats['msgs'] == DURATION * 100 * 3 + CAM_ODOM_FRAMES
+    out = load_outputs(get_output_fn(str(tmp_path), route))
+    assert set(out) == {'calibration', 'pose', 'params'}
+
+    # one liveCalibration per 5 cameraOdometry, one livePose and params row per cameraOdometry
+    calibration, pose, params = out['calibration'], out['pose'], out['params']
+    assert len(calibration['t']) == CAM_ODOM_FRAMES // CALIBRATION_DECIMATION
+    assert len(pose['t']) == len(params['t']) == CAM_ODOM_FRAMES
+    np.testing.assert_allclose(pose['t'], 1 + np.arange(CAM_ODOM_FRAMES) * 0.05)
+    assert all(len(col) == len(cols['t']) for cols in out.values() for col in cols.values())
+
+    assert calibration['valid_blocks'][-1] >= INPUTS_NEEDED
+    assert calibration['cal_status'][-1] == log.LiveCalibrationData.Status.calibrated
+    np.testing.assert_allclose([calibration[axis][-1] for axis in ('roll', 'pitch', 'yaw')], 0., atol=1e-3)
+    np.testing.assert_allclose(calibration['height'][-1], HEIGHT_INIT.item(), atol=1e-3)
+    np.testing.assert_allclose(stats['calibration'], 0., atol=0.1)
+
+    assert all(np.isfinite(col).all() for col in pose.values())
+    np.testing.assert_allclose(pose['velocity_x'][-1], SPEED, atol=1.)
+    assert pose['posenet_ok'][-1]
+
+    assert params['active'].all()
+    np.testing.assert_allclose(params['steer_ratio'][-1], STEER_RATIO, atol=1.)
+    assert stats['steer_ratio'] == params['steer_ratio'][-1]
+
+  def test_outputs_round_trip(self, tmp_path):
+    drive = get_drive(car_params_after=0)
+    reestimator = Reestimator(drive[0].carParams)
+    for msg in drive[1:1000]:
+      reestimator.handle_msg(msg)
+    arrays = reestimator.get_arrays()
+
+    fn = get_output_fn(str(tmp_path), "a2a0ccea32023010|2023-07-27--13-01-19/3")
+    assert fn == str(tmp_path / "a2a0ccea32023010_2023-07-27--13-01-19_3.npz")
+    np.savez_compressed(fn, **arrays)
+    out = load_outputs(fn)
+
+    assert {f'{estimator}/{name}' for estimator, cols in out.items() for name in cols} == set(arrays)
+    for estimator, cols in out.items():
+      for name, col in cols.items():
+        assert col.dtype == (np.float64 if name == 't' else np.float32)
+        np.testing.assert_array_equal(col, arrays[f'{estimator}/{name}'])
+        np.testing.assert_array_equal(col, np.array(reestimator.columns[estimator][name], dtype=col.dtype))